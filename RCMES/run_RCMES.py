@@ -29,6 +29,7 @@ import ocw.utils as utils
 import ocw.dataset_processor as dsp
 from ocw.dataset import Bounds
 from ocw.dataset_loader import DatasetLoader
+from ocw.regrid_weights import RegridWeightsCache
 from metrics_and_plots import *
 
 def load_datasets_from_config(extra_opts, *loader_opts):
@@ -176,6 +177,11 @@ else:
 # used for GCMs in which case it should be set to False to save time.
 boundary_check = config['regrid'].get('boundary_check', True)
 
+# Interpolation weights are shared by all datasets on the same native grid.
+# Optionally, they are also stored in a directory and reused in later runs.
+weights_cache = RegridWeightsCache(
+    cache_dir=config['regrid'].get('weights_cache_dir', None))
+
 # number of target datasets (usually models, but can also be obs / reanalysis)
 ntarget = len(target_datasets)
 print('Dataset loading completed')
@@ -187,11 +193,13 @@ for target_name in target_names:
 """ Step 3: Spatial regriding of the datasets """
 print('Regridding datasets: {}'.format(config['regrid']))
 if not config['regrid']['regrid_on_reference']:
-    reference_dataset = dsp.spatial_regrid(reference_dataset, new_lat, new_lon)
+    reference_dataset = dsp.spatial_regrid(reference_dataset, new_lat, new_lon,
+                                           weights_cache=weights_cache)
     print('Reference dataset has been regridded')
 for i, dataset in enumerate(target_datasets):
     target_datasets[i] = dsp.spatial_regrid(dataset, new_lat, new_lon,
-                                           boundary_check=boundary_check)
+                                           boundary_check=boundary_check,
+                                           weights_cache=weights_cache)
     print('{} has been regridded'.format(target_names[i]))
 print('Propagating missing data information')
 datasets = dsp.mask_missing_data([reference_dataset]+target_datasets)
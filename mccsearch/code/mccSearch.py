@@ -41,6 +41,7 @@ import matplotlib.colors as mcolors
 from matplotlib.ticker import FuncFormatter, FormatStrFormatter
 
 import ocw.plotter as plotter
+from ocw.regrid_weights import RegridWeightsCache
 
 #----------------------- GLOBAL VARIABLES --------------------------
 # --------------------- User defined variables ---------------------
@@ -78,6 +79,8 @@ MAXIMUM_DURATION = 24#max number of framce the MCC can last for
 edgeWeight = [1,2,3] #weights for the graph edges
 #graph object fo the CEs meeting the criteria
 CLOUD_ELEMENT_GRAPH = nx.DiGraph()
+#regridding weights shared by every TRMM to MERG regrid
+REGRID_WEIGHTS_CACHE = RegridWeightsCache()
 #graph meeting the CC criteria
 PRUNED_GRAPH = nx.DiGraph()
 #------------------------ End GLOBAL VARS -------------------------
@@ -2342,7 +2345,8 @@ def do_regrid(q, lat, lon, lat2, lon2, order=1, mdi=-999999999):
     This function has been moved to the ocw/dataset_processor module
     """
     from ocw import dataset_processor
-    q2 = dataset_processor._rcmes_spatial_regrid(q, lat, lon, lat2, lon2, order=1)
+    q2 = dataset_processor._rcmes_spatial_regrid(q, lat, lon, lat2, lon2, order=1,
+                                                 weights_cache=REGRID_WEIGHTS_CACHE)
 
     return q2
 #******************************************************************
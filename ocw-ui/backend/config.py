@@ -24,3 +24,7 @@ WORK_DIR = '/tmp/ocw/'
 # Any directory under this will be visible to the frontend when loading
 # a local model file.
 PATH_LEADER = '/usr/local/ocw'
+
+# SQLite file caching the metadata of the local files the backend is asked
+# about. ':memory:' keeps the cache for the life of the process only.
+CATALOG_PATH = ':memory:'
@@ -0,0 +1,365 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+'''
+Classes:
+    Catalog - Index of the metadata of local NetCDF files.
+'''
+
+from fnmatch import fnmatch
+import logging
+import os
+import sqlite3
+import threading
+
+import netCDF4
+import numpy
+import numpy.ma as ma
+
+import ocw.utils as utils
+from ocw.data_source.local import (LAT_NAMES, LON_NAMES, TIME_NAMES,
+                                   _get_netcdf_variable_name)
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    mtime REAL NOT NULL,
+    lat_name TEXT,
+    lon_name TEXT,
+    time_name TEXT,
+    lat_min REAL,
+    lat_max REAL,
+    lon_min REAL,
+    lon_max REAL,
+    start_time TEXT,
+    end_time TEXT,
+    calendar TEXT
+);
+CREATE TABLE IF NOT EXISTS variables (
+    path TEXT NOT NULL REFERENCES files(path) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    dimensions TEXT NOT NULL,
+    units TEXT,
+    PRIMARY KEY (path, name)
+);
+CREATE INDEX IF NOT EXISTS variables_name ON variables (name);
+'''
+
+_FILE_COLUMNS = ('path', 'mtime', 'lat_name', 'lon_name', 'time_name',
+                 'lat_min', 'lat_max', 'lon_min', 'lon_max',
+                 'start_time', 'end_time', 'calendar')
+
+
+def _time_string(time):
+    ''' Format a datetime or cftime datetime so that times of any calendar
+    sort as strings.
+    '''
+    return '%04d-%02d-%02d %02d:%02d:%02d' % (time.year, time.month, time.day,
+                                              time.hour, time.minute,
+                                              time.second)
+
+
+def _guess_name(netcdf, valid_var_names, netcdf_var):
+    ''' Guess a coordinate variable name, returning None when it can't be. '''
+    if netcdf_var is None:
+        return None
+    try:
+        return _get_netcdf_variable_name(valid_var_names, netcdf, netcdf_var)
+    except ValueError:
+        return None
+
+
+_BOUNDS_SUFFIXES = ('_bnds', '_bounds')
+_GEOGRAPHIC_LAT_NAMES = ('lat', 'lats', 'latitude', 'latitudes')
+_GEOGRAPHIC_LON_NAMES = ('lon', 'lons', 'longitude', 'longitudes')
+
+
+def _data_variable(netcdf):
+    ''' Guess the main variable of a file.
+
+    Coordinates and cell bounds such as time_bnds are skipped. Variables
+    along a time dimension are preferred, then those with the most
+    dimensions.
+    '''
+    coordinate_names = set(name.decode() for name in
+                           LAT_NAMES + LON_NAMES + TIME_NAMES)
+    time_names = set(name.decode() for name in TIME_NAMES)
+    bounds_names = set(getattr(variable, 'bounds', None)
+                       for variable in netcdf.variables.values())
+
+    data_var = None
+    best_rank = None
+    for name, variable in netcdf.variables.items():
+        lower = name.lower()
+        if (variable.ndim < 2 or lower in coordinate_names or
+                name in bounds_names or lower.endswith(_BOUNDS_SUFFIXES)):
+            continue
+        has_time = any(dimension.lower() in time_names
+                       for dimension in variable.dimensions)
+        rank = (has_time, variable.ndim)
+        if best_rank is None or rank > best_rank:
+            data_var, best_rank = name, rank
+
+    if data_var is None and netcdf.variables:
+        data_var = next(iter(netcdf.variables))
+    return data_var
+
+
+def _coordinate_name(netcdf, geographic_names, valid_var_names, data_var):
+    ''' Find the latitude or longitude variable of the main variable.
+
+    True geographic coordinates, such as the 2D lat and lon of a rotated
+    pole grid, are preferred to grid indices such as rlat, rlon, x and y.
+    '''
+    if data_var is not None:
+        dimensions = set(netcdf.variables[data_var].dimensions)
+        for name, variable in netcdf.variables.items():
+            if (name.lower() in geographic_names and
+                    set(variable.dimensions) <= dimensions):
+                return name
+    return _guess_name(netcdf, valid_var_names, data_var)
+
+
+def _value_range(values):
+    values = ma.masked_invalid(values)
+    if values.count() == 0:
+        return None, None
+    return float(values.min()), float(values.max())
+
+
+class Catalog(object):
+    '''Index of the metadata of local NetCDF files.
+
+    Each file is opened once to record its variables, dimensions, lat/lon
+    extent, time range and calendar in an SQLite database. A file is only
+    read again when its modification time changes, so a catalog stored on
+    disk answers repeated queries about a directory without touching the
+    NetCDF files.
+    '''
+
+    def __init__(self, path=':memory:'):
+        '''Default Catalog constructor.
+
+        :param path: (Optional) The SQLite database file to store the catalog
+            in. By default the catalog only lives in memory.
+        :type path: :mod:`string`
+        '''
+        self._path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute('PRAGMA foreign_keys = ON')
+        self._connection.executescript(_SCHEMA)
+
+    def __repr__(self):
+        return 'Catalog(path={})'.format(self._path)
+
+    def close(self):
+        '''Close the SQLite database.'''
+        self._connection.close()
+
+    def scan(self, directory, pattern='*.nc', recursive=True):
+        '''Index the files in a directory.
+
+        Only files which are new or have been modified since they were last
+        indexed are read. Files that were indexed under the directory but no
+        longer exist are removed from the catalog. Files that can't be read
+        as NetCDF are skipped.
+
+        :param directory: The directory to scan.
+        :type directory: :mod:`string`
+
+        :param pattern: (Optional) Glob pattern of the file names to index.
+        :type pattern: :mod:`string`
+
+        :param recursive: (Optional) Whether to also scan the subdirectories.
+        :type recursive: :class:`bool`
+
+        :returns: The paths of the files that were (re)indexed.
+        :rtype: :class:`list` of :mod:`string`
+        '''
+        directory = os.path.abspath(directory)
+        paths = set()
+        for root, dirs, names in os.walk(directory):
+            paths.update(os.path.join(root, name) for name in names
+                         if fnmatch(name, pattern))
+            if not recursive:
+                break
+
+        def in_scan(path):
+            if recursive:
+                inside = path.startswith(os.path.join(directory, ''))
+            else:
+                inside = os.path.dirname(path) == directory
+            return inside and fnmatch(os.path.basename(path), pattern)
+
+        with self._lock:
+            indexed = dict((path, mtime) for path, mtime in
+                           self._connection.execute(
+                               'SELECT path, mtime FROM files')
+                           if in_scan(path))
+
+        updated = []
+        for path in sorted(paths):
+            if indexed.get(path) == os.path.getmtime(path):
+                continue
+            try:
+                self.add(path)
+            except (IOError, RuntimeError) as error:
+                logger.warning('Unable to index %s: %s', path, error)
+                continue
+            updated.append(path)
+
+        vanished = [(path,) for path in indexed if path not in paths]
+        if vanished:
+            with self._lock, self._connection:
+                self._connection.executemany(
+                    'DELETE FROM files WHERE path = ?', vanished)
+        return updated
+
+    def add(self, path):
+        '''Read the metadata of a NetCDF file into the catalog.
+
+        :param path: The NetCDF file to index.
+        :type path: :mod:`string`
+
+        :raises IOError: If the file can't be opened as NetCDF.
+        '''
+        path = os.path.abspath(path)
+        mtime = os.path.getmtime(path)
+        netcdf = netCDF4.Dataset(path, mode='r')
+        try:
+            variables = [(path, name, ','.join(variable.dimensions),
+                          getattr(variable, 'units', None))
+                         for name, variable in netcdf.variables.items()]
+            data_var = _data_variable(netcdf)
+
+            record = dict.fromkeys(_FILE_COLUMNS)
+            record['path'] = path
+            record['mtime'] = mtime
+            record['lat_name'] = _coordinate_name(
+                netcdf, _GEOGRAPHIC_LAT_NAMES, LAT_NAMES, data_var)
+            record['lon_name'] = _coordinate_name(
+                netcdf, _GEOGRAPHIC_LON_NAMES, LON_NAMES, data_var)
+            record['time_name'] = _guess_name(netcdf, TIME_NAMES, data_var)
+
+            if record['lat_name'] is not None:
+                lats = netcdf.variables[record['lat_name']][:]
+                record['lat_min'], record['lat_max'] = _value_range(lats)
+            if record['lon_name'] is not None:
+                lons = netcdf.variables[record['lon_name']][:]
+                # Change 0 - 360 degree values to be -180 to 180
+                lons = numpy.where(lons > 180, lons - 360, lons)
+                record['lon_min'], record['lon_max'] = _value_range(lons)
+            if record['time_name'] is not None:
+                try:
+                    offsets, calendar = utils.decode_time_offsets(
+                        netcdf, record['time_name'])
+                except (AttributeError, ValueError) as error:
+                    logger.warning('Unable to decode the times of %s: %s',
+                                   path, error)
+                else:
+                    if offsets.size:
+                        start, end = utils.offsets_to_times(
+                            [offsets.min(), offsets.max()], calendar)
+                        record['start_time'] = _time_string(start)
+                        record['end_time'] = _time_string(end)
+                    record['calendar'] = calendar
+        finally:
+            netcdf.close()
+
+        with self._lock, self._connection:
+            self._connection.execute('DELETE FROM files WHERE path = ?',
+                                     (path,))
+            self._connection.execute(
+                'INSERT INTO files ({}) VALUES ({})'.format(
+                    ', '.join(_FILE_COLUMNS), ', '.join('?' * len(_FILE_COLUMNS))),
+                [record[column] for column in _FILE_COLUMNS])
+            self._connection.executemany(
+                'INSERT INTO variables VALUES (?, ?, ?, ?)', variables)
+
+    def get(self, path):
+        '''Get the metadata of a file, indexing it first if it is new or has
+        been modified.
+
+        :param path: The NetCDF file.
+        :type path: :mod:`string`
+
+        :returns: The file metadata. The 'variables' key maps each variable
+            name to a dictionary of its 'dimensions' and 'units'. Times are
+            strings in the form 'YYYY-MM-DD HH:MM:SS'. Values that couldn't be
+            determined are None.
+        :rtype: :class:`dict`
+
+        :raises IOError: If the file can't be opened as NetCDF.
+        '''
+        path = os.path.abspath(path)
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT {} FROM files WHERE path = ?'.format(
+                    ', '.join(_FILE_COLUMNS)), (path,)).fetchone()
+        if row is None or row[1] != os.path.getmtime(path):
+            self.add(path)
+            return self.get(path)
+
+        record = dict(zip(_FILE_COLUMNS, row))
+        with self._lock:
+            rows = self._connection.execute(
+                'SELECT name, dimensions, units FROM variables '
+                'WHERE path = ? ORDER BY rowid', (path,)).fetchall()
+        record['variables'] = dict(
+            (name, {'dimensions': tuple(dimensions.split(',')) if dimensions
+                    else (), 'units': units})
+            for name, dimensions, units in rows)
+        return record
+
+    def find(self, variable, bounds=None):
+        '''Find the indexed files which contain a variable.
+
+        :param variable: The name of the variable.
+        :type variable: :mod:`string`
+
+        :param bounds: (Optional) Only files overlapping these bounds are
+            returned. Only the rectangular extent and the times of the bounds
+            are used. Files whose extent is unknown along a bounded axis are
+            left out.
+        :type bounds: :class:`dataset.Bounds`
+
+        :returns: The sorted paths of the matching files.
+        :rtype: :class:`list` of :mod:`string`
+        '''
+        query = ('SELECT files.path FROM files JOIN variables '
+                 'ON files.path = variables.path WHERE variables.name = ?')
+        params = [variable]
+        if bounds is not None:
+            if hasattr(bounds, 'lat_min'):
+                query += (' AND lat_max >= ? AND lat_min <= ?'
+                          ' AND lon_max >= ? AND lon_min <= ?')
+                params.extend([bounds.lat_min, bounds.lat_max,
+                               bounds.lon_min, bounds.lon_max])
+            if bounds.start is not None:
+                query += ' AND end_time >= ?'
+                params.append(_time_string(bounds.start))
+            if bounds.end is not None:
+                query += ' AND start_time <= ?'
+                params.append(_time_string(bounds.end))
+        query += ' ORDER BY files.path'
+
+        with self._lock:
+            return [row[0] for row in
+                    self._connection.execute(query, params)]
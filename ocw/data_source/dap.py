@@ -15,13 +15,24 @@
 # specific language governing permissions and limitations
 # under the License.
 
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import time
+
 from pydap.client import open_url
-from netcdftime import utime
 import numpy as np
 from ocw.dataset import Dataset
+import ocw.utils as utils
+from ocw.data_source.local import _index_range, _spatial_bounds_selection
+
+logger = logging.getLogger(__name__)
+
+# Largest number of bytes fetched by a single request
+MAX_REQUEST_BYTES = 64 * 1024 * 1024
 
 
-def load(url, variable, name=''):
+def load(url, variable, name='', bounds=None, max_workers=4, retries=3,
+         max_request_bytes=MAX_REQUEST_BYTES):
     '''Load a Dataset from an OpenDAP URL
 
     :param url: The OpenDAP URL for the dataset of interest.
@@ -33,10 +44,27 @@ def load(url, variable, name=''):
     :param name: (Optional) A name for the loaded dataset.
     :type name: :mod:`string`
 
+    :param bounds: (Optional) Only the times and grid points within these
+        bounds are requested. They are sent to the server as index
+        constraints, so the rest of the variable is never transferred.
+    :type bounds: :class:`dataset.Bounds`
+
+    :param max_workers: (Optional) Number of requests made at the same time.
+    :type max_workers: :class:`int`
+
+    :param retries: (Optional) Number of times a failed request is retried,
+        waiting twice as long before each new attempt.
+    :type retries: :class:`int`
+
+    :param max_request_bytes: (Optional) Requests for more values than this
+        are split along the time axis.
+    :type max_request_bytes: :class:`int`
+
     :returns: A :class:`dataset.Dataset` containing the dataset pointed to by
         the OpenDAP URL.
 
     :raises: ServerError
+    :raises ValueError: If the bounds do not overlap the dataset.
     '''
     # Grab the dataset information and pull the appropriate variable
     d = open_url(url)
@@ -47,49 +75,126 @@ def load(url, variable, name=''):
     # but conventions aren't always followed and all dimensions aren't always present so
     # see if we can make some educated deductions before defaulting to just pulling the first three
     # columns.
-    temp_dimensions = map(lambda x: x.lower(), dataset.dimensions)
+    temp_dimensions = [x.lower() for x in dataset.dimensions]
 
     dataset_dimensions = dataset.dimensions
-    time = dataset_dimensions[temp_dimensions.index(
-        'time') if 'time' in temp_dimensions else 0]
-    lat = dataset_dimensions[temp_dimensions.index(
-        'lat') if 'lat' in temp_dimensions else 1]
-    lon = dataset_dimensions[temp_dimensions.index(
-        'lon') if 'lon' in temp_dimensions else 2]
+    time_axis = temp_dimensions.index('time') if 'time' in temp_dimensions else 0
+    lat_axis = temp_dimensions.index('lat') if 'lat' in temp_dimensions else 1
+    lon_axis = temp_dimensions.index('lon') if 'lon' in temp_dimensions else 2
+    time = dataset_dimensions[time_axis]
+    lat = dataset_dimensions[lat_axis]
+    lon = dataset_dimensions[lon_axis]
 
     # Time is given to us in some units since an epoch. We need to convert
     # these values to datetime objects. Note that we use the main object's
     # time object and not the dataset specific reference to it. We need to
     # grab the 'units' from it and it fails on the dataset specific object.
-    times = np.array(convert_times_to_datetime(d[time]))
+    offsets, calendar = utils.decode_time_variable_offsets(d[time])
 
     lats = np.array(dataset[lat][:])
     lons = np.array(dataset[lon][:])
-    values = np.array(dataset[:])
+
+    index = [slice(None)] * len(dataset_dimensions)
+    if bounds is not None:
+        index[time_axis], index[lat_axis], index[lon_axis] = _bounds_index(
+            offsets, calendar, lats, lons, bounds)
+    time_index, lat_index, lon_index = (index[time_axis], index[lat_axis],
+                                        index[lon_axis])
+
+    values = _get_values(dataset, index, time_axis, max_workers, retries,
+                         max_request_bytes)
 
     origin = {
         'source': 'dap',
         'url': url
     }
 
-    return Dataset(lats, lons, times, values, variable,
-                   name=name, origin=origin)
+    return Dataset(lats[lat_index], lons[lon_index],
+                   utils.offsets_to_times(offsets[time_index], calendar),
+                   values, variable, name=name, origin=origin)
+
+
+def _bounds_index(offsets, calendar, lats, lons, bounds):
+    '''Translate Bounds into slices along the time, lat and lon axes.
+
+    :raises ValueError: If no time or grid point is within the bounds.
+    '''
+    inside = np.ones(offsets.shape, dtype=bool)
+    if bounds.start is not None:
+        inside &= offsets >= utils.times_to_offsets([bounds.start],
+                                                    calendar)[0]
+    if bounds.end is not None:
+        inside &= offsets <= utils.times_to_offsets([bounds.end], calendar)[0]
+
+    # Bounds are given in [-180, 180] but servers often use [0, 360)
+    lons = np.where(lons > 180, lons - 360, lons)
+    selection = _spatial_bounds_selection(lats, lons, bounds)
+    return (_index_range(inside), selection.get('lat', slice(None)),
+            selection.get('lon', slice(None)))
+
+
+def _get_values(dataset, index, time_axis, max_workers, retries,
+                max_request_bytes):
+    '''Request the hyperslab of a variable, in chunks along the time axis.
+
+    :param dataset: The remote variable.
+    :type dataset: pydap.model.GridType
+
+    :param index: A slice for each dimension of the variable.
+    :type index: :class:`list` of :class:`slice`
+
+    :returns: The values of the hyperslab.
+    :rtype: :class:`numpy.ndarray`
+    '''
+    shape = [len(range(*axis_index.indices(size)))
+             for axis_index, size in zip(index, dataset.shape)]
+    step_bytes = np.dtype(dataset.dtype).itemsize * int(
+        np.prod(shape[:time_axis] + shape[time_axis + 1:]))
+    steps_per_request = max(1, max_request_bytes // max(step_bytes, 1))
+
+    time_range = range(*index[time_axis].indices(dataset.shape[time_axis]))
+    chunks = []
+    for start in range(0, len(time_range), steps_per_request):
+        chunk = list(index)
+        chunk_range = time_range[start:start + steps_per_request]
+        chunk[time_axis] = slice(chunk_range[0], chunk_range[-1] + 1)
+        chunks.append(tuple(chunk))
+
+    def fetch(chunk):
+        return _fetch(dataset, chunk, retries)
+
+    if len(chunks) == 1:
+        return fetch(chunks[0])
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return np.concatenate(list(executor.map(fetch, chunks)),
+                              axis=time_axis)
+
+
+def _fetch(dataset, index, retries):
+    '''Request a hyperslab, retrying with exponential backoff.'''
+    for attempt in range(retries + 1):
+        try:
+            return np.array(dataset[index])
+        except Exception as error:
+            if attempt == retries:
+                raise
+            delay = 2 ** attempt
+            logger.warning('Request for %s failed (%s), retrying in %d s',
+                           index, error, delay)
+            time.sleep(delay)
 
 
 def convert_times_to_datetime(time):
     '''Convert the OpenDAP time object's values to datetime objects
 
     The time values are stored as some unit since an epoch. These need to be
-    converted into datetime objects for the OCW Dataset object.
+    converted into datetime objects for the OCW Dataset object. The values
+    are decoded together with integer arithmetic, in the calendar given by
+    the variable's calendar attribute.
 
     :param time: The time object's values to convert
     :type time: pydap.model.BaseType
 
-    :returns: list of converted time values as datetime objects
+    :returns: Array of converted time values as datetime objects
     '''
-    units = time.units
-    # parse the time units string into a useful object.
-    # NOTE: This assumes a 'standard' calendar. It's possible (likely?) that
-    #   users will want to customize this in the future.
-    parsed_time = utime(units)
-    return [parsed_time.num2date(x) for x in time[:]]
+    return utils.offsets_to_times(*utils.decode_time_variable_offsets(time))
@@ -17,13 +17,14 @@
 # under the License.
 #
 
-import os
-import urllib2
+try:
+    from urllib2 import HTTPError
+except ImportError:
+    from urllib.error import HTTPError
 
 from ocw.esgf.constants import DEFAULT_ESGF_SEARCH
-from ocw.esgf.download import download
+from ocw.esgf.download import download_files
 from ocw.esgf.logon import logon
-from ocw.esgf.search import SearchClient
 import ocw.data_source.local as local
 
 from bs4 import BeautifulSoup
@@ -38,6 +39,7 @@ def load_dataset(dataset_id,
                  elevation_index=0,
                  name='',
                  save_path='/tmp',
+                 max_workers=4,
                  **additional_constraints):
     ''' Load an ESGF dataset.
 
@@ -65,8 +67,14 @@ def load_dataset(dataset_id,
     :type name: :mod:`string`
 
     :param save_path: (Optional) Path to where downloaded files should be saved.
+        Files already there with the checksum published by ESGF are not
+        downloaded again.
     :type save_path: :mod:`string`
 
+    :param max_workers: (Optional) The number of files downloaded at the same
+        time.
+    :type max_workers: :class:`int`
+
     :param additional_constraints: (Optional) Additional key,value pairs to
         pass as constraints to the search wrapper. These can be anything found
         on the ESGF metadata page for a dataset.
@@ -82,16 +90,16 @@ def load_dataset(dataset_id,
                                             dataset_id=dataset_id,
                                             variable=variable_name)
 
-    datasets = []
-    for url, var in download_data:
-        _download_files([url],
-                        esgf_username,
-                        esgf_password,
-                        download_directory=save_path)
+    file_save_paths = _download_files(download_data,
+                                      esgf_username,
+                                      esgf_password,
+                                      download_directory=save_path,
+                                      max_workers=max_workers)
 
-        file_save_path = os.path.join(save_path, url.split('/')[-1])
+    datasets = []
+    for file_save_path, file_data in zip(file_save_paths, download_data):
         datasets.append(local.load_file(file_save_path,
-                                        var,
+                                        file_data['variable'],
                                         name=name,
                                         elevation_index=elevation_index))
 
@@ -107,7 +115,12 @@ def load_dataset(dataset_id,
 
 
 def _get_file_download_data(dataset_id, variable, url=DEFAULT_ESGF_SEARCH):
-    ''''''
+    ''' Search ESGF for the files of a dataset variable.
+
+    :returns: A :class:`list` of :class:`dict` with the 'url' and 'variable'
+        of each file, and its 'size', 'checksum' and 'checksum_type' when the
+        search service publishes them.
+    '''
     url += '?type=File&dataset_id={}&variable={}'
     url = url.format(dataset_id, variable)
 
@@ -120,25 +133,51 @@ def _get_file_download_data(dataset_id, variable, url=DEFAULT_ESGF_SEARCH):
         err = "esgf.load_dataset: No files found for specified dataset."
         raise ValueError(err)
 
-    # Split out URLs for dataset download along with variable names for each
-    # of those files.
-    url_groups = xml.response.result.findAll('arr', {'name': 'url'})
-    variable_groups = xml.response.result.findAll('arr', {'name': 'variable'})
-
-    urls = [group.findAll('str')[0].string.split('|')[0]
-            for group in url_groups]
-    variables = [group.findAll('str')[0].string
-                 for group in variable_groups]
-
-    return zip(urls, variables)
-
-
-def _download_files(file_urls, username, password, download_directory='/tmp'):
-    ''''''
+    # Split out URLs for dataset download along with variable names, sizes
+    # and checksums for each of those files.
+    download_data = []
+    for doc in xml.response.result.findAll('doc'):
+        file_data = {
+            'url': _first_value(doc, 'arr', 'url').split('|')[0],
+            'variable': _first_value(doc, 'arr', 'variable'),
+            'checksum': _first_value(doc, 'arr', 'checksum'),
+            'checksum_type': _first_value(doc, 'arr', 'checksum_type'),
+            'size': _first_value(doc, 'long', 'size')
+        }
+        if file_data['size'] is not None:
+            file_data['size'] = int(file_data['size'])
+        download_data.append(file_data)
+
+    return download_data
+
+
+def _first_value(doc, tag, name):
+    ''' The first value of a field of a search result document, or None. '''
+    field = doc.find(tag, {'name': name})
+    if field is None:
+        return None
+    if tag == 'arr':
+        field = field.find('str')
+    return field.string
+
+
+def _download_files(download_data, username, password,
+                    download_directory='/tmp', max_workers=4):
+    ''' Log on to ESGF and download the files found by
+    :func:`_get_file_download_data`, returning their local paths.
+    '''
     try:
         logon(username, password)
-    except urllib2.HTTPError:
+    except HTTPError:
         raise ValueError('esgf._download_files: Invalid login credentials')
 
-    for url in file_urls:
-        download(url, toDirectory=download_directory)
+    files = []
+    for file_data in download_data:
+        checksum_type = file_data.get('checksum_type') or 'SHA256'
+        files.append({'url': file_data['url'],
+                      'size': file_data.get('size'),
+                      'checksum': file_data.get('checksum'),
+                      'checksum_type': checksum_type})
+
+    return download_files(files, toDirectory=download_directory,
+                          max_workers=max_workers)
@@ -16,14 +16,18 @@
 # under the License.
 
 import calendar
+from concurrent.futures import ThreadPoolExecutor
 from datetime import timedelta, datetime
+import logging
+import time
 from time import strptime
 from glob import glob
 import re
 import string
 import os
+import threading
 
-from ocw.dataset import Dataset
+from ocw.dataset import Dataset, LazyDataset
 import ocw.utils as utils
 
 import netCDF4
@@ -35,6 +39,13 @@ LAT_NAMES = [b'y', b'rlat', b'rlats', b'lat', b'lats', b'latitude', b'latitudes'
 LON_NAMES = [b'x', b'rlon', b'rlons', b'lon', b'lons', b'longitude', b'longitudes']
 TIME_NAMES = [b'time', b'times', b'date', b'dates', b'julian']
 
+try:
+    _STRING_TYPES = (basestring,)
+except NameError:
+    _STRING_TYPES = (str,)
+
+logger = logging.getLogger(__name__)
+
 
 def _get_netcdf_variable_name(valid_var_names, netcdf, netcdf_var):
     ''' Determine if one of a set of variable names are in a NetCDF Dataset.
@@ -178,6 +189,115 @@ def load_WRF_2d_files(file_path=None,
     return Dataset(lats, lons, times, values, variable_name, units=variable_unit, name=name)
 
 
+def _get_level_axis(netcdf, variable_name, lat_name, lon_name, time_name):
+    ''' Determine the axis of the elevation dimension of a 4D variable.
+
+    The elevation dimension is the one dimension of the variable that the
+    lat, lon and time variables do not use.
+
+    :returns: The axis number of the elevation dimension. When it cannot be
+        determined from the dimension names the second axis is assumed.
+    :rtype: :class:`int`
+    '''
+    coordinate_dims = set()
+    for name in (lat_name, lon_name, time_name):
+        coordinate_dims.update(netcdf.variables[name].dimensions)
+
+    dims = netcdf.variables[variable_name].dimensions
+    level_axes = [axis for axis, dim in enumerate(dims)
+                  if dim not in coordinate_dims]
+    if len(level_axes) == 1:
+        return level_axes[0]
+    return 1
+
+
+def _bounds_selection(dataset, bounds):
+    ''' Translate Bounds into index ranges of a Dataset.
+
+    Only the coordinates of the Dataset are used, so the values of a
+    :class:`dataset.LazyDataset` are not read. The temporal bounds are used
+    when they are set and the spatial bounds when the Bounds have them. For
+    curvilinear grids the ranges cover every grid point within the bounds.
+
+    :param dataset: The Dataset to select from.
+    :type dataset: :class:`dataset.Dataset`
+
+    :param bounds: The Bounds to translate.
+    :type bounds: :class:`dataset.Bounds`
+
+    :returns: The slices along the time, lat and lon axes as a dictionary
+        of keyword arguments for :meth:`dataset.LazyDataset.select`.
+    :rtype: :class:`dict`
+
+    :raises ValueError: When no time or grid point is within the bounds.
+    '''
+    selection = {}
+    if bounds.start is not None or bounds.end is not None:
+        selection['time'] = _index_range(_times_within_bounds(dataset, bounds))
+    selection.update(_spatial_bounds_selection(dataset.lats, dataset.lons,
+                                               bounds))
+    return selection
+
+
+def _times_within_bounds(dataset, bounds):
+    ''' Find the times of a Dataset within the temporal Bounds.
+
+    :returns: A boolean mask over the times of the Dataset.
+    :rtype: :class:`numpy.ndarray`
+    '''
+    offsets = dataset.time_offsets
+    inside = numpy.ones(offsets.shape, dtype=bool)
+    if bounds.start is not None:
+        inside &= offsets >= utils.times_to_offsets(
+            [bounds.start], dataset.calendar)[0]
+    if bounds.end is not None:
+        inside &= offsets <= utils.times_to_offsets(
+            [bounds.end], dataset.calendar)[0]
+    return inside
+
+
+def _spatial_bounds_selection(lats, lons, bounds):
+    ''' Translate the spatial Bounds into lat and lon index ranges.
+
+    :param lats: The 1D or 2D latitudes of the grid.
+    :type lats: :class:`numpy.ndarray`
+
+    :param lons: The 1D or 2D longitudes of the grid.
+    :type lons: :class:`numpy.ndarray`
+
+    :param bounds: The Bounds to translate.
+    :type bounds: :class:`dataset.Bounds`
+
+    :returns: The lat and lon slices as a dictionary, which is empty when
+        the Bounds have no spatial bounds.
+    :rtype: :class:`dict`
+
+    :raises ValueError: When no grid point is within the bounds.
+    '''
+    if not hasattr(bounds, 'lat_min'):
+        return {}
+
+    lats_inside = (lats >= bounds.lat_min) & (lats <= bounds.lat_max)
+    lons_inside = (lons >= bounds.lon_min) & (lons <= bounds.lon_max)
+    if lats.ndim == 2:
+        inside = lats_inside & lons_inside
+        lats_inside = inside.any(axis=1)
+        lons_inside = inside.any(axis=0)
+    return {'lat': _index_range(lats_inside),
+            'lon': _index_range(lons_inside)}
+
+
+def _index_range(inside):
+    ''' Get the slice that covers every True element of a 1D mask.
+
+    :raises ValueError: When no element is True.
+    '''
+    indices = numpy.nonzero(inside)[0]
+    if not indices.size:
+        raise ValueError('The bounds do not overlap the dataset.')
+    return slice(int(indices[0]), int(indices[-1]) + 1)
+
+
 def load_file(file_path,
               variable_name,
               variable_unit=None,
@@ -185,7 +305,9 @@ def load_file(file_path,
               name='',
               lat_name=None,
               lon_name=None,
-              time_name=None):
+              time_name=None,
+              lazy=False,
+              bounds=None):
     ''' Load a NetCDF file into a Dataset.
 
     :param file_path: Path to the NetCDF file to load.
@@ -202,8 +324,9 @@ def load_file(file_path,
         datasets will have readins at different height/elevation levels. OCW
         expects 3D data so a single layer needs to be stripped out when loading.
         By default, the first elevation layer is used. If desired you may
-        specify the elevation value to use.
-    :type elevation_index: :class:`int`
+        specify the elevation value to use. A list of elevation indices
+        returns 4D values with the elevation axis after the time axis.
+    :type elevation_index: :class:`int` or :class:`list`
 
     :param name: (Optional) A name for the loaded dataset.
     :type name: :mod:`string`
@@ -220,13 +343,22 @@ def load_file(file_path,
         dataset.
     :type time_name: :mod:`string`
 
+    :param lazy: (Optional) If True, keep the file open and return a
+        :class:`dataset.LazyDataset` that reads values only when they are
+        accessed. Subsets of it read only the selected hyperslab.
+    :type lazy: :class:`bool`
+
+    :param bounds: (Optional) Only the part of the variable within these
+        bounds is read from the file. See :func:`_bounds_selection`.
+    :type bounds: :class:`dataset.Bounds`
+
     :returns: An OCW Dataset object with the requested variable's data from
         the NetCDF file.
     :rtype: :class:`dataset.Dataset`
 
-    :raises ValueError: When the specified file path cannot be loaded by ndfCDF4
-        or when the lat/lon/time variable name cannot be determined
-        automatically.
+    :raises ValueError: When the specified file path cannot be loaded by ndfCDF4,
+        when the lat/lon/time variable name cannot be determined
+        automatically or when the bounds do not overlap the file.
     '''
 
     try:
@@ -243,58 +375,64 @@ def load_file(file_path,
         )
         raise ValueError(err)
 
-    if lat_name is None:
-        lat_name = _get_netcdf_variable_name(LAT_NAMES, netcdf, variable_name)
-    if lon_name is None:
-        lon_name = _get_netcdf_variable_name(LON_NAMES, netcdf, variable_name)
-    if time_name is None:
-        time_name = _get_netcdf_variable_name(
-            TIME_NAMES, netcdf, variable_name)
-
-    lats = netcdf.variables[lat_name][:]
-    lons = netcdf.variables[lon_name][:]
-    time_raw_values = netcdf.variables[time_name][:]
-    times = utils.decode_time_values(netcdf, time_name)
-    times = numpy.array(times)
-    values = ma.array(netcdf.variables[variable_name][:])
-    variable_unit = netcdf.variables[variable_name].units
-
-    # If the values are 4D then we need to strip out the elevation index
-    if len(values.shape) == 4:
-        # Determine the set of possible elevation dimension names excluding
-        # the list of names that are used for the lat, lon, and time values.
-        dims = netcdf.variables[variable_name].dimensions
-        dimension_names = [dim_name.encode() for dim_name in dims]
-        lat_lon_time_var_names = [lat_name, lon_name, time_name]
-
-        elev_names = set(dimension_names) - set(lat_lon_time_var_names)
-
-        # Grab the index value for the elevation values
-        #level_index = dimension_names.index(elev_names.pop())
-        level_index = 1
-
-        # Strip out the elevation values so we're left with a 3D array.
-        if level_index == 0:
-            values = values[elevation_index, :, :, :]
-        elif level_index == 1:
-            values = values[:, elevation_index, :, :]
-        elif level_index == 2:
-            values = values[:, :, elevation_index, :]
-        else:  # pragma: no cover
-            values = values[:, :, :, elevation_index]
-
-    origin = {
-        'source': 'local',
-        'path': file_path,
-        'lat_name': lat_name,
-        'lon_name': lon_name,
-        'time_name': time_name
-    }
-    if elevation_index != 0:
-        origin['elevation_index'] = elevation_index
-
-    return Dataset(lats, lons, times, values, variable=variable_name,
-                   units=variable_unit, name=name, origin=origin)
+    keep_open = False
+    try:
+        if lat_name is None:
+            lat_name = _get_netcdf_variable_name(LAT_NAMES, netcdf,
+                                                 variable_name)
+        if lon_name is None:
+            lon_name = _get_netcdf_variable_name(LON_NAMES, netcdf,
+                                                 variable_name)
+        if time_name is None:
+            time_name = _get_netcdf_variable_name(
+                TIME_NAMES, netcdf, variable_name)
+
+        lats = netcdf.variables[lat_name][:]
+        lons = netcdf.variables[lon_name][:]
+        times = utils.decode_time_values(netcdf, time_name)
+        times = numpy.array(times)
+        variable = netcdf.variables[variable_name]
+        variable_unit = variable.units
+
+        origin = {
+            'source': 'local',
+            'path': file_path,
+            'lat_name': lat_name,
+            'lon_name': lon_name,
+            'time_name': time_name
+        }
+        if elevation_index != 0:
+            origin['elevation_index'] = elevation_index
+
+        if variable.ndim < 3:
+            return Dataset(lats, lons, times, ma.array(variable[:]),
+                           variable=variable_name, units=variable_unit,
+                           name=name, origin=origin)
+
+        fixed_indices = None
+        if variable.ndim == 4:
+            level_axis = _get_level_axis(netcdf, variable_name, lat_name,
+                                         lon_name, time_name)
+            fixed_indices = {level_axis: elevation_index}
+
+        # Reading through a LazyDataset keeps it to one indexed read of the
+        # requested levels and bounds.
+        dataset = LazyDataset(lats, lons, times, variable,
+                              variable=variable_name, units=variable_unit,
+                              name=name, origin=origin,
+                              fixed_indices=fixed_indices)
+        if bounds is not None:
+            dataset = dataset.select(**_bounds_selection(dataset, bounds))
+        if lazy:
+            # The LazyDataset reads from the open file, so it must stay open
+            keep_open = True
+            return dataset
+        return Dataset(dataset.lats, dataset.lons, dataset.times,
+                       dataset.values, variable=variable_name,
+                       units=variable_unit, name=name, origin=origin)
+    finally:
+        if not keep_open:
+            netcdf.close()
 
 
 def load_multiple_files(file_path,
@@ -303,7 +441,8 @@ def load_multiple_files(file_path,
                         variable_unit=None,
                         lat_name=None,
                         lon_name=None,
-                        time_name=None):
+                        time_name=None,
+                        bounds=None):
     ''' load multiple netcdf files with common filename pattern and return an array of OCW datasets
 
     :param file_path: directory name and common file name patterns where the NetCDF files to load are stored.
@@ -329,6 +468,9 @@ def load_multiple_files(file_path,
     :param time_name: (Optional) The time variable name to extract from the
         dataset.
     :type time_name: :mod:`string`
+    :param bounds: (Optional) Only the part of each file within these bounds
+        is read.
+    :type bounds: :class:`dataset.Bounds`
     :returns: An array of OCW Dataset objects
     :rtype: :class:`list`
     '''
@@ -357,7 +499,8 @@ def load_multiple_files(file_path,
     datasets = []
     for ifile, filename in enumerate(data_filenames):
         datasets.append(load_file(filename, variable_name, variable_unit, name=data_name[ifile],
-                                  lat_name=lat_name, lon_name=lon_name, time_name=time_name))
+                                  lat_name=lat_name, lon_name=lon_name, time_name=time_name,
+                                  bounds=bounds))
 
     return datasets
 
@@ -365,88 +508,156 @@ def load_multiple_files(file_path,
 def load_WRF_2d_files_RAIN(file_path=None,
                            filename_pattern=None,
                            filelist=None,
-                           name=''):
+                           name='',
+                           bounds=None,
+                           temporal_resolution='hourly',
+                           bucket_mm=None):
     ''' Load multiple WRF (or nuWRF) original output files containing 2D \
         fields such as precipitation and surface variables into a Dataset. \
     The dataset can be spatially subset.
 
+    The accumulated RAINC + RAINNC is converted to rates by differencing
+    consecutive times within each yearly restart cycle. The first file of
+    every cycle is treated as spin-up and only provides the starting
+    accumulation. Only one file is held in memory at a time.
+
     :param file_path: Directory to the NetCDF file to load.
     :type file_path: :mod:`string`
 
     :param filename_pattern: Path to the NetCDF file to load.
     :type filename_pattern: :mod:`string`
 
+    :param filelist: A list of filenames
+    :type filelist: :mod:`string`
+
     :param name: (Optional) A name for the loaded dataset.
     :type name: :mod:`string`
 
+    :param bounds: (Optional) Only the spatial window within these bounds is
+        read from each file.
+    :type bounds: :class:`dataset.Bounds`
+
+    :param temporal_resolution: (Optional) 'hourly' for rates in mm/hr or
+        'daily' for totals in mm/day.
+    :type temporal_resolution: :mod:`string`
+
+    :param bucket_mm: (Optional) Bucket size of the I_RAINC and I_RAINNC
+        reset counters. By default the BUCKET_MM attribute of each file is
+        used, and the counters are ignored when it is missing.
+    :type bucket_mm: :class:`float`
+
     :returns: An OCW Dataset object with the requested variable's data from \
         the NetCDF file.
     :rtype: :class:`dataset.Dataset`
 
-    :raises ValueError:
+    :raises ValueError: When the temporal resolution is invalid.
     '''
-
-    if not filelist:
-        WRF_files = []
-        for pattern in filename_pattern:
-            WRF_files.extend(glob(file_path + pattern))
-        WRF_files.sort()
-    else:
-        WRF_files = [line.rstrip('\n') for line in open(filelist)]
-
-    file_object_first = netCDF4.Dataset(WRF_files[0])
-    lats = file_object_first.variables['XLAT'][0, :]
-    lons = file_object_first.variables['XLONG'][0, :]
-
+    if temporal_resolution not in ('hourly', 'daily'):
+        raise ValueError("temporal_resolution must be either 'hourly' or "
+                         "'daily'.")
+
+    WRF_files = _list_granule_files(file_path, filename_pattern, filelist)
+    file_times = _parse_granule_times(
+        WRF_files, r'\d{4}-\d{2}-\d{2}_\d{2}:\d{2}:\d{2}', '%Y-%m-%d_%H:%M:%S')
+
+    with netCDF4.Dataset(WRF_files[0]) as file_object_first:
+        lats = file_object_first.variables['XLAT'][0, :]
+        lons = file_object_first.variables['XLONG'][0, :]
+    window = {'lat': slice(None), 'lon': slice(None)}
+    if bounds is not None:
+        window.update(_spatial_bounds_selection(lats, lons, bounds))
+    lats = lats[window['lat'], window['lon']]
+    lons = lons[window['lat'], window['lon']]
+
+    # First pass: the hourly times of every file outside the spin-up
     times = []
-    nfile = len(WRF_files)
+    reads = []
     for ifile, file in enumerate(WRF_files):
-        print('Reading file ' + str(ifile + 1) + '/' + str(nfile), file)
-        file_object = netCDF4.Dataset(file)
-        time_struct_parsed = strptime(file[-19:], "%Y-%m-%d_%H:%M:%S")
-        for ihour in range(24):
-            times.append(
-                datetime(*time_struct_parsed[:6]) + timedelta(hours=ihour))
-        if ifile == 0:
-            values0 = file_object.variables['RAINC'][
-                :] + file_object.variables['RAINNC'][:]
-        else:
-            values0 = numpy.concatenate((values0, file_object.variables['RAINC'][
-                                        :] + file_object.variables['RAINNC'][:]))
-        file_object.close()
+        with netCDF4.Dataset(file) as file_object:
+            ntimes = len(file_object.dimensions['Time'])
+        spin_up = ifile == 0 or file_times[ifile].year != file_times[
+            ifile - 1].year
+        if not spin_up:
+            times.extend(file_times[ifile] + timedelta(hours=ihour)
+                         for ihour in range(ntimes))
+        reads.append((file, spin_up, ntimes))
+
     times = numpy.array(times)
-    years = numpy.array([d.year for d in times])
-    ncycle = numpy.unique(years).size
-    print('ncycle=', ncycle)
-    nt, ny, nx = values0.shape
-    values = numpy.zeros([nt - ncycle * 24, ny, nx])
-    times2 = []
-    nt2 = nt / ncycle
-    # remove the first day in each year
-    nt3 = nt2 - 24
-    t_index = 0
-    for icycle in numpy.arange(ncycle):
-        for it in numpy.arange(nt3) + 24:
-            values[t_index, :] = values0[icycle * nt2 + it, :] - \
-                values0[icycle * nt2 + it - 1, :]
-            times2.append(times[icycle * nt2 + it])
-            t_index = t_index + 1
+    if temporal_resolution == 'hourly':
+        codes = numpy.arange(len(times))
+        variable_unit = 'mm/hr'
+    else:
+        days, codes = numpy.unique(
+            numpy.array(times, dtype='datetime64[s]').astype('datetime64[D]'),
+            return_inverse=True)
+        times = days.astype('datetime64[s]').astype(object)
+        variable_unit = 'mm/day'
+    values = numpy.zeros((len(times),) + lats.shape, dtype=numpy.float32)
+
+    # Second pass: difference the accumulated rain of each file against the
+    # last accumulation of the file before it
+    position = 0
+    previous = None
+    for file, spin_up, ntimes in reads:
+        accumulated = _read_WRF_accumulated_rain(file, window, bucket_mm)
+        if not spin_up:
+            rain = numpy.diff(accumulated, axis=0, prepend=previous)
+            file_codes = codes[position:position + ntimes]
+            bins, first = numpy.unique(file_codes, return_index=True)
+            values[bins] += numpy.add.reduceat(rain, first, axis=0)
+            position += ntimes
+        previous = accumulated[-1:]
+
     variable_name = 'PREC'
-    variable_unit = 'mm/hr'
-    times2 = numpy.array(times2)
-    return Dataset(lats, lons, times2, values, variable_name, units=variable_unit, name=name)
+    return Dataset(lats, lons, times, values, variable_name, units=variable_unit, name=name)
+
+
+def _read_WRF_accumulated_rain(file, window, bucket_mm=None):
+    ''' Read the total accumulated rain of a WRF output file.
+
+    :param file: Path to the WRF output file.
+    :type file: :mod:`string`
+
+    :param window: The lat and lon slices to read.
+    :type window: :class:`dict`
+
+    :param bucket_mm: (Optional) Bucket size of the reset counters.
+    :type bucket_mm: :class:`float`
+
+    :returns: RAINC + RAINNC, including the bucket resets, with shape
+        (times, lats, lons).
+    :rtype: :class:`numpy.ndarray`
+    '''
+    key = (slice(None), window['lat'], window['lon'])
+    with netCDF4.Dataset(file) as file_object:
+        if bucket_mm is None:
+            bucket_mm = getattr(file_object, 'BUCKET_MM', 0.)
+        rain = None
+        for variable_name in ('RAINC', 'RAINNC'):
+            field = ma.filled(file_object.variables[variable_name][key], 0.)
+            if rain is None:
+                rain = field.astype(numpy.float32)
+            else:
+                rain += field
+            counter_name = 'I_' + variable_name
+            if bucket_mm > 0 and counter_name in file_object.variables:
+                rain += bucket_mm * ma.filled(
+                    file_object.variables[counter_name][key], 0)
+    return rain
 
 
 def load_dataset_from_multiple_netcdf_files(variable_name,
                                             lat_name=None, lon_name=None, time_name=None,
                                             name='', file_list=None, file_path=None, filename_pattern=None,
-                                            mask_file=None, mask_variable=None, mask_value=0):
+                                            mask_file=None, mask_variable=None, mask_value=0,
+                                            bounds=None, max_workers=1):
     ''' Load multiple netCDF files from the same source \
         (an observation or a model) into a Dataset. \
     The dataset can be spatially subset.
 
-    :param filelist: A text file including a list of filenames
-    :type filelist: :mod:`string`
+    :param file_list: A text file including a list of filenames, or the
+        list of filenames itself.
+    :type file_list: :mod:`string` or :class:`list`
 
     :param variable_name: The variable name to load from the NetCDF file.
     :type variable_name: :mod:`string`
@@ -481,6 +692,16 @@ def load_dataset_from_multiple_netcdf_files(variable_name,
     :param mask_value: an index for spatial subsetting a dataset
     :type mask_value: :class:`int`
 
+    :param bounds: (Optional) Only the part of the files within these bounds
+        is read. Files with no times within the bounds are skipped and the
+        mask indices refer to the bounded grid.
+    :type bounds: :class:`dataset.Bounds`
+
+    :param max_workers: (Optional) Number of threads reading the files. The \
+        netCDF4 library releases the GIL while reading, but more than one \
+        worker is only safe when netCDF-C and HDF5 are built thread-safe.
+    :type max_workers: :class:`int`
+
     :returns: An OCW Dataset object with the requested variable's data from \
         the NetCDF file.
     :rtype: :class:`dataset.Dataset`
@@ -491,44 +712,226 @@ def load_dataset_from_multiple_netcdf_files(variable_name,
     if not file_list:
         for pattern in filename_pattern:
             nc_files.extend(glob(file_path + pattern))
-    else:
+    elif isinstance(file_list, _STRING_TYPES):
         nc_files = [line.rstrip('\n') for line in open(file_list)]
+    else:
+        nc_files = list(file_list)
 
     nc_files.sort()
 
-    dataset0 = load_file(nc_files[0], variable_name, lat_name=lat_name,
-                         lon_name=lon_name, time_name=time_name)
-    if dataset0.lons.ndim == 1 and dataset0.lats.ndim == 1:
-        lons, lats = numpy.meshgrid(dataset0.lons, dataset0.lats)
-    elif dataset0.lons.ndim == 2 and dataset0.lats.ndim == 2:
-        lons = dataset0.lons
-        lats = dataset0.lats
+    load_kwargs = {'lat_name': lat_name, 'lon_name': lon_name,
+                   'time_name': time_name, 'lazy': True}
+    temporal_bounds = bounds is not None and (bounds.start is not None or
+                                              bounds.end is not None)
+
+    # First pass: only the coordinates of each file are read to find the
+    # times to keep and the size of the output.
+    selection = {}
+    reads = []
+    times = []
+    for file in nc_files:
+        file_object0 = load_file(file, variable_name, **load_kwargs)
+        if not reads:
+            if bounds is not None:
+                selection = _spatial_bounds_selection(
+                    file_object0.lats, file_object0.lons, bounds)
+            grid = file_object0.select(**selection)
+        time_selection = slice(None)
+        if temporal_bounds:
+            inside = _times_within_bounds(file_object0, bounds)
+            if not inside.any():
+                file_object0.close()
+                continue
+            time_selection = _index_range(inside)
+        file_times = file_object0.times[time_selection]
+        if not reads:
+            # One value is enough to find the type of the unpacked values
+            dtype = grid.select(time=slice(0, 1), lat=slice(0, 1),
+                                lon=slice(0, 1)).values.dtype
+        reads.append((file, time_selection, len(times), len(file_times)))
+        times.extend(file_times)
+        file_object0.close()
+    if not reads:
+        raise ValueError('The bounds do not overlap any of the files.')
+
+    if grid.lons.ndim == 1 and grid.lats.ndim == 1:
+        lons, lats = numpy.meshgrid(grid.lons, grid.lats)
+    elif grid.lons.ndim == 2 and grid.lats.ndim == 2:
+        lons = grid.lons
+        lats = grid.lats
+    grid_shape = lats.shape
 
     if mask_file:
         mask_dataset = load_file(mask_file, mask_variable)
-        y_index, x_index = numpy.where(mask_dataset.values == mask_value)
-
-    times = []
-    for ifile, file in enumerate(nc_files):
-        file_object0 = load_file(file, variable_name, lat_name=lat_name,
-                                 lon_name=lon_name, time_name=time_name)
-        values0 = file_object0.values
-        times.extend(file_object0.times)
+        mask_values = mask_dataset.values
+        if selection:
+            mask_values = mask_values[..., selection['lat'], selection['lon']]
+        y_index, x_index = numpy.where(mask_values == mask_value)
+        grid_shape = y_index.shape
+
+    data_values = ma.masked_all((len(times),) + grid_shape, dtype=dtype)
+
+    # Second pass: every file fills its own part of the output
+    def read(file, time_selection, start, count):
+        read_start = time.time()
+        file_object0 = load_file(file, variable_name, **load_kwargs)
+        values0 = file_object0.select(time=time_selection, **selection).values
+        file_object0.close()
         if mask_file:
             values0 = values0[:, y_index, x_index]
-        if ifile == 0:
-            data_values = values0
-        else:
-            data_values = numpy.concatenate((data_values, values0))
+        data_values[start:start + count] = values0
+        logger.debug('Read %s in %.3f s', file, time.time() - read_start)
+
+    total_start = time.time()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for future in [executor.submit(read, *args) for args in reads]:
+            future.result()
+    logger.info('Read %d files in %.3f s', len(reads),
+                time.time() - total_start)
+
     times = numpy.array(times)
     return Dataset(lats, lons, times, data_values, variable_name, name=name)
 
 
+GRANULE_TIME_UNITS = {'hourly': 'h', 'daily': 'D', 'monthly': 'M'}
+
+
+def _parse_granule_times(files, pattern, time_format):
+    ''' Parse the time of each granule from its file name.
+
+    :param files: The granule file paths.
+    :type files: :class:`list`
+
+    :param pattern: Regular expression matching the time in a file name.
+    :type pattern: :mod:`string`
+
+    :param time_format: The :func:`datetime.strptime` format of the matched
+        time.
+    :type time_format: :mod:`string`
+
+    :returns: The time of each granule.
+    :rtype: :class:`list` of :class:`datetime.datetime`
+
+    :raises ValueError: When the time of a granule cannot be found.
+    '''
+    times = []
+    for file in files:
+        match = re.search(pattern, os.path.basename(file))
+        if match is None:
+            raise ValueError("Unable to find a time in the granule file name "
+                             "'%s'." % file)
+        times.append(datetime.strptime(match.group(0), time_format))
+    return times
+
+
+def _stack_granules(files, times, read_granule, grid_shape,
+                    dtype=numpy.float32, max_workers=1,
+                    temporal_resolution=None, how='mean'):
+    ''' Stack single time granules into one array of values.
+
+    The output is allocated once and every granule is written to its place
+    in it. With a temporal resolution the granules are accumulated into
+    the time bins directly, so the full stack of granules is never held in
+    memory.
+
+    :param files: The granule file paths.
+    :type files: :class:`list`
+
+    :param times: The time of each granule.
+    :type times: :class:`list` of :class:`datetime.datetime`
+
+    :param read_granule: Function reading the values of a granule file as a
+        2D masked array of shape grid_shape.
+    :type read_granule: :func:`callable`
+
+    :param grid_shape: The shape of the values of a granule.
+    :type grid_shape: :func:`tuple`
+
+    :param dtype: (Optional) Type of the stacked values.
+    :type dtype: :class:`numpy.dtype`
+
+    :param max_workers: (Optional) Number of threads reading granules.
+    :type max_workers: :class:`int`
+
+    :param temporal_resolution: (Optional) 'hourly', 'daily' or 'monthly' to
+        aggregate the granules into time bins of that length.
+    :type temporal_resolution: :mod:`string`
+
+    :param how: (Optional) 'mean' or 'sum' of the granules in a time bin.
+        Grid points without any valid value in a bin are masked.
+    :type how: :mod:`string`
+
+    :returns: The times and the values as a tuple in the form (times, values)
+    :rtype: :func:`tuple` of (:class:`numpy.ndarray`,
+        :class:`numpy.ma.MaskedArray`)
+
+    :raises ValueError: When the temporal resolution or how is invalid.
+    '''
+    grid_shape = tuple(grid_shape)
+    if temporal_resolution is None:
+        values = ma.masked_all((len(files),) + grid_shape, dtype=dtype)
+
+        def fill(index):
+            values[index] = read_granule(files[index])
+    else:
+        if temporal_resolution not in GRANULE_TIME_UNITS:
+            raise ValueError("temporal_resolution must be one of %s." %
+                             sorted(GRANULE_TIME_UNITS))
+        if how not in ('mean', 'sum'):
+            raise ValueError("how must be either 'mean' or 'sum'.")
+        unit = GRANULE_TIME_UNITS[temporal_resolution]
+        bins, codes = numpy.unique(
+            numpy.array(times, dtype='datetime64[s]').astype(
+                'datetime64[%s]' % unit), return_inverse=True)
+        sums = numpy.zeros((len(bins),) + grid_shape)
+        counts = numpy.zeros((len(bins),) + grid_shape, dtype=numpy.int32)
+        lock = threading.Lock()
+
+        def fill(index):
+            granule = read_granule(files[index])
+            valid = ~ma.getmaskarray(granule)
+            with lock:
+                sums[codes[index]] += ma.filled(granule, 0.)
+                counts[codes[index]] += valid
+
+    total_start = time.time()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for future in [executor.submit(fill, index)
+                       for index in range(len(files))]:
+            future.result()
+    logger.info('Read %d granules in %.3f s', len(files),
+                time.time() - total_start)
+
+    if temporal_resolution is None:
+        return numpy.array(times), values
+
+    if how == 'mean':
+        sums /= numpy.maximum(counts, 1)
+    times = bins.astype('datetime64[s]').astype(object)
+    return times, ma.array(sums, mask=counts == 0)
+
+
+def _list_granule_files(file_path, filename_pattern, filelist):
+    ''' List the sorted granule files from patterns or a file list. '''
+    if not filelist:
+        files = []
+        for pattern in filename_pattern:
+            files.extend(glob(file_path + pattern))
+    else:
+        files = [line.rstrip('\n') for line in open(filelist)]
+    files.sort()
+    return files
+
+
 def load_NLDAS_forcingA_files(file_path=None,
                               filename_pattern=None,
                               filelist=None,
                               variable_name='APCPsfc_110_SFC_acc1h',
-                              name=''):
+                              name='',
+                              bounds=None,
+                              temporal_resolution=None,
+                              how='mean',
+                              max_workers=1):
     ''' Load multiple NLDAS2 forcingAWRF files containing 2D fields such \
         as precipitation and surface variables into a Dataset. The dataset \
         can be spatially subset.
@@ -548,44 +951,49 @@ def load_NLDAS_forcingA_files(file_path=None,
     :param name: (Optional) A name for the loaded dataset.
     :type name: :mod:`string`
 
+    :param bounds: (Optional) Only the spatial window within these bounds is
+        read from each file.
+    :type bounds: :class:`dataset.Bounds`
+
+    :param temporal_resolution: (Optional) 'hourly', 'daily' or 'monthly' to
+        aggregate the hourly granules while they are read.
+    :type temporal_resolution: :mod:`string`
+
+    :param how: (Optional) 'mean' or 'sum' of the granules in each time bin.
+    :type how: :mod:`string`
+
+    :param max_workers: (Optional) Number of threads reading the files.
+    :type max_workers: :class:`int`
+
     :returns: An OCW Dataset object with the requested variable's data from \
         the NetCDF file.
     :rtype: :class:`dataset.Dataset`
 
     :raises ValueError:
     '''
-
-    if not filelist:
-        NLDAS_files = []
-        for pattern in filename_pattern:
-            NLDAS_files.extend(glob(file_path + pattern))
-    else:
-        NLDAS_files = [line.rstrip('\n') for line in open(filelist)]
-
-    NLDAS_files.sort()
-
-    file_object_first = netCDF4.Dataset(NLDAS_files[0])
-    lats = file_object_first.variables['lat_110'][:]
-    lons = file_object_first.variables['lon_110'][:]
-    lons, lats = numpy.meshgrid(lons, lats)
-
-    times = []
-    nfile = len(NLDAS_files)
-    for ifile, file in enumerate(NLDAS_files):
-        print('Reading file ' + str(ifile + 1) + '/' + str(nfile), file)
-        file_object = netCDF4.Dataset(file)
-        time_struct_parsed = strptime(file[-20:-7], "%Y%m%d.%H%M")
-        times.append(datetime(*time_struct_parsed[:6]))
-
-        values0 = file_object.variables[variable_name][:]
-        values0 = numpy.expand_dims(values0, axis=0)
-        if ifile == 0:
-            values = values0
-            variable_unit = file_object.variables[variable_name].units
-        else:
-            values = numpy.concatenate((values, values0))
-        file_object.close()
-    times = numpy.array(times)
+    NLDAS_files = _list_granule_files(file_path, filename_pattern, filelist)
+    times = _parse_granule_times(NLDAS_files, r'\d{8}\.\d{4}', '%Y%m%d.%H%M')
+
+    with netCDF4.Dataset(NLDAS_files[0]) as file_object_first:
+        lats = file_object_first.variables['lat_110'][:]
+        lons = file_object_first.variables['lon_110'][:]
+        variable_unit = file_object_first.variables[variable_name].units
+        dtype = file_object_first.variables[variable_name].dtype
+    window = {'lat': slice(None), 'lon': slice(None)}
+    if bounds is not None:
+        window.update(_spatial_bounds_selection(lats, lons, bounds))
+    lons, lats = numpy.meshgrid(lons[window['lon']], lats[window['lat']])
+
+    def read_granule(file):
+        with netCDF4.Dataset(file) as file_object:
+            return ma.array(file_object.variables[variable_name][
+                window['lat'], window['lon']])
+
+    times, values = _stack_granules(NLDAS_files, times, read_granule,
+                                    lats.shape, dtype=dtype,
+                                    max_workers=max_workers,
+                                    temporal_resolution=temporal_resolution,
+                                    how=how)
     return Dataset(lats, lons, times, values, variable_name, units=variable_unit, name=name)
 
 
@@ -593,7 +1001,11 @@ def load_GPM_IMERG_files(file_path=None,
                          filename_pattern=None,
                          filelist=None,
                          variable_name='precipitationCal',
-                         name='GPM_IMERG'):
+                         name='GPM_IMERG',
+                         bounds=None,
+                         temporal_resolution=None,
+                         how='mean',
+                         max_workers=1):
     ''' Load multiple GPM Level 3 IMEGE files containing calibrated \
         precipitation and generate an OCW Dataset obejct.
 
@@ -612,44 +1024,54 @@ def load_GPM_IMERG_files(file_path=None,
     :param name: (Optional) A name for the loaded dataset.
     :type name: :mod:`string`
 
+    :param bounds: (Optional) Only the spatial window within these bounds is
+        read from each file.
+    :type bounds: :class:`dataset.Bounds`
+
+    :param temporal_resolution: (Optional) 'hourly', 'daily' or 'monthly' to
+        aggregate the half-hourly granules while they are read. The values
+        stay in mm/hr with how='mean'; a daily mean rate times 24 is the
+        daily total.
+    :type temporal_resolution: :mod:`string`
+
+    :param how: (Optional) 'mean' or 'sum' of the granules in each time bin.
+    :type how: :mod:`string`
+
+    :param max_workers: (Optional) Number of threads reading the files. h5py
+        serializes its own calls, so threads mostly overlap the rest of the
+        work on each granule.
+    :type max_workers: :class:`int`
+
     :returns: An OCW Dataset object with the requested variable's data from \
         the HDF file.
     :rtype: :class:`dataset.Dataset`
 
     :raises ValueError:
     '''
-
-    if not filelist:
-        GPM_files = []
-        for pattern in filename_pattern:
-            GPM_files.extend(glob(file_path + pattern))
-    else:
-        GPM_files = [line.rstrip('\n') for line in open(filelist)]
-
-    GPM_files.sort()
-
-    file_object_first = h5py.File(GPM_files[0])
-    lats = file_object_first['Grid']['lat'][:]
-    lons = file_object_first['Grid']['lon'][:]
-
-    lons, lats = numpy.meshgrid(lons, lats)
+    GPM_files = _list_granule_files(file_path, filename_pattern, filelist)
+    times = _parse_granule_times(GPM_files, r'\d{8}-S\d{6}', '%Y%m%d-S%H%M%S')
+
+    with h5py.File(GPM_files[0], 'r') as file_object_first:
+        lats = file_object_first['Grid']['lat'][:]
+        lons = file_object_first['Grid']['lon'][:]
+        dtype = file_object_first['Grid'][variable_name].dtype
+    window = {'lat': slice(None), 'lon': slice(None)}
+    if bounds is not None:
+        window.update(_spatial_bounds_selection(lats, lons, bounds))
+    lons, lats = numpy.meshgrid(lons[window['lon']], lats[window['lat']])
 
     variable_unit = "mm/hr"
 
-    times = []
-    nfile = len(GPM_files)
-    for ifile, file in enumerate(GPM_files):
-        print('Reading file ' + str(ifile + 1) + '/' + str(nfile), file)
-        file_object = h5py.File(file)
-        time_struct_parsed = strptime(file[-39:-23], "%Y%m%d-S%H%M%S")
-        times.append(datetime(*time_struct_parsed[:6]))
-        values0 = numpy.transpose(ma.masked_less(
-            file_object['Grid'][variable_name][:], 0.))
-        values0 = numpy.expand_dims(values0, axis=0)
-        if ifile == 0:
-            values = values0
-        else:
-            values = numpy.concatenate((values, values0))
-        file_object.close()
-    times = numpy.array(times)
+    def read_granule(file):
+        # The granules are stored as (lon, lat)
+        with h5py.File(file, 'r') as file_object:
+            values = file_object['Grid'][variable_name][
+                window['lon'], window['lat']]
+        return numpy.transpose(ma.masked_less(values, 0.))
+
+    times, values = _stack_granules(GPM_files, times, read_granule,
+                                    lats.shape, dtype=dtype,
+                                    max_workers=max_workers,
+                                    temporal_resolution=temporal_resolution,
+                                    how=how)
     return Dataset(lats, lons, times, values, variable_name, units=variable_unit, name=name)
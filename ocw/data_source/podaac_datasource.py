@@ -15,32 +15,45 @@
 # specific language governing permissions and limitations
 # under the License.
 
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import os
+import shutil
+import tempfile
+import time
+
 from podaac.podaac import Podaac
 from podaac.podaac_utils import PodaacUtils
 import numpy as np
 from ocw.dataset import Dataset
+from ocw.dataset_cache import DatasetCache
+import ocw.utils as utils
 from netCDF4 import Dataset as netcdf_dataset
-from netcdftime import utime
-import os
+
+logger = logging.getLogger(__name__)
+
+# Seconds to wait for a subset job before giving up
+SUBSET_TIMEOUT = 60 * 60
+
+# Seconds a cached granule stays valid. Level 4 datasets publish a new
+# granule every day, and extract_l4_granule always fetches the latest one.
+CACHE_TTL = 24 * 60 * 60
 
 
 def convert_times_to_datetime(time):
     '''Convert the time object's values to datetime objects
 
     The time values are stored as some unit since an epoch. These need to be
-    converted into datetime objects for the OCW Dataset object.
+    converted into datetime objects for the OCW Dataset object. The values
+    are decoded together, in the calendar given by the variable's calendar
+    attribute.
 
     :param time: The time object's values to convert
-    :type time: pydap.model.BaseType
+    :type time: netCDF4.Variable
 
-    :returns: list of converted time values as datetime objects
+    :returns: Array of converted time values as datetime objects
     '''
-    units = time.units
-    # parse the time units string into a useful object.
-    # NOTE: This assumes a 'standard' calendar. It's possible (likely?) that
-    # users will want to customize this in the future.
-    parsed_time = utime(units)
-    return [parsed_time.num2date(x) for x in time[:]]
+    return utils.offsets_to_times(*utils.decode_time_variable_offsets(time))
 
 
 def list_available_extract_granule_dataset_ids():
@@ -53,27 +66,101 @@ def list_available_extract_granule_dataset_ids():
     podaac_utils = PodaacUtils()
     return podaac_utils.list_available_extract_granule_dataset_ids()
 
-def subset_granule(input_file_path=''):
+
+def wait_for_subset(token, timeout=SUBSET_TIMEOUT, poll_interval=1,
+                    max_poll_interval=60):
+    '''Wait for a granule subset job to finish.
+
+    The job status is polled with exponential backoff, starting at
+    poll_interval seconds and doubling up to max_poll_interval seconds.
+
+    :param token: The request tracking token of the subset job.
+    :type token: :mod:`string`
+
+    :param timeout: (Optional) Seconds to wait for the job to finish.
+    :type timeout: :class:`float`
+
+    :param poll_interval: (Optional) Seconds before the first poll.
+    :type poll_interval: :class:`float`
+
+    :param max_poll_interval: (Optional) Longest wait between two polls.
+    :type max_poll_interval: :class:`float`
+
+    :returns: The final status of the job.
+    :rtype: :mod:`string`
+
+    :raises RuntimeError: If the job fails or doesn't finish in time.
+    '''
+    podaac = Podaac()
+    deadline = time.time() + timeout
+    delay = poll_interval
+    while True:
+        status = podaac.subset_status(token)
+        if status == 'done':
+            return status
+        if 'error' in str(status).lower():
+            raise RuntimeError("Granule subset job '%s' failed with status "
+                               "'%s'." % (token, status))
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            raise RuntimeError("Granule subset job '%s' did not finish "
+                               "within %s seconds." % (token, timeout))
+        logger.debug("Granule subset job '%s' is %s", token, status)
+        time.sleep(min(delay, remaining))
+        delay = min(delay * 2, max_poll_interval)
+
+
+def subset_granule(input_file_path='', timeout=SUBSET_TIMEOUT,
+                   poll_interval=1, max_poll_interval=60):
     '''Subset Granule service allows users to Submit subset jobs. \
         Use of this service should be preceded by a Granule Search in \
         order to identify and generate a list of granules to be subsetted.
 
+    The call returns once the job is done. See :func:`wait_for_subset` for
+    the polling parameters and :func:`subset_granule_async` for a variant
+    which returns immediately.
+
     :param input_file_path: path to a json file which contains the \
         the request that you want to send to PO.DAAC
     :type input_file_path: :mod:`string`
 
-    :returns: a token on successful request reception. This can be \
-        further used to check the status of the request.
+    :param timeout: (Optional) Seconds to wait for the job to finish.
+    :type timeout: :class:`float`
+
+    :returns: the request tracking token of the job, once the job is \
+        done. Earlier versions returned the job status instead.
 
+    :raises RuntimeError: If the job fails or doesn't finish within \
+        timeout seconds.
     '''
     podaac = Podaac()
-    status = podaac.subset_status(podaac.granule_subset(input_file_path))
-    print("Granule subsetting initiated with request tracking token '%s'." % status)
-    while status is not "done":
-        print('...')
-    return status
+    token = podaac.granule_subset(input_file_path)
+    logger.info("Granule subsetting initiated with request tracking token "
+                "'%s'.", token)
+    wait_for_subset(token, timeout, poll_interval, max_poll_interval)
+    return token
+
+
+def subset_granule_async(input_file_path='', **kwargs):
+    '''Submit a subset job without waiting for it to finish.
+
+    :param input_file_path: path to a json file which contains the \
+        the request that you want to send to PO.DAAC
+    :type input_file_path: :mod:`string`
+
+    :param kwargs: The polling parameters of :func:`subset_granule`.
+
+    :returns: A future of the result of :func:`subset_granule`.
+    :rtype: :class:`concurrent.futures.Future`
+    '''
+    executor = ThreadPoolExecutor(max_workers=1)
+    future = executor.submit(subset_granule, input_file_path, **kwargs)
+    executor.shutdown(wait=False)
+    return future
+
 
-def load_level4_granule(variable, datasetId='', name=''):
+def load_level4_granule(variable, datasetId='', name='', cache_dir=None,
+                        max_cache_bytes=None, cache_ttl=CACHE_TTL):
     '''Loads a Level4 gridded Dataset from PODAAC
     :param variable: The name of the variable to read from the dataset.
     :type variable: :mod:`string`
@@ -91,51 +178,127 @@ def load_level4_granule(variable, datasetId='', name=''):
     :param name: (Optional) A name for the loaded dataset.
     :type name: :mod:`string`
 
+    :param cache_dir: (Optional) Directory of the granule cache. Loading the
+        same variable of a dataset again reads it from there instead of
+        downloading the granule. Nothing is cached by default.
+    :type cache_dir: :mod:`string`
+
+    :param max_cache_bytes: (Optional) Size the granule cache is kept under
+        by removing its least recently used entries.
+    :type max_cache_bytes: :class:`int`
+
+    :param cache_ttl: (Optional) Seconds a cached granule stays valid, or
+        None for no expiry. Once it expires the latest granule is downloaded
+        again.
+    :type cache_ttl: :class:`int`
+
     :returns: A :class:`dataset.Dataset` containing the dataset pointed to by
         the OpenDAP URL.
 
     :raises: ServerError
     '''
+    if cache_dir is not None:
+        cache = DatasetCache(cache_dir, max_cache_bytes)
+        key = cache.key({'source': 'PO.DAAC', 'datasetId': datasetId,
+                         'variable': variable})
+        dataset = cache.get(key, max_age=cache_ttl)
+        if dataset is not None:
+            dataset.name = name
+            return dataset
+
     # Downloading the dataset using podaac toolkit
     podaac = Podaac()
-    path = os.path.dirname(os.path.abspath(__file__))
-    granuleName = podaac.extract_l4_granule(
-        dataset_id=datasetId, path=path)
-    path = path + '/' + granuleName
+    path = tempfile.mkdtemp()
+    try:
+        granuleName = podaac.extract_l4_granule(
+            dataset_id=datasetId, path=path)
+        dataset = _read_granule(os.path.join(path, granuleName), variable,
+                                name)
+    finally:
+        # Removing the downloaded temporary granule
+        shutil.rmtree(path, ignore_errors=True)
+
+    if cache_dir is not None:
+        cache.put(key, dataset)
+    return dataset
+
+
+def load_level4_granules(variable, datasetIds, names=None, max_workers=4,
+                         cache_dir=None, max_cache_bytes=None,
+                         cache_ttl=CACHE_TTL):
+    '''Loads several Level4 gridded Datasets from PODAAC concurrently.
+
+    :param variable: The name of the variable to read from the datasets.
+    :type variable: :mod:`string`
+
+    :param datasetIds: The dataset persistent IDs.
+    :type datasetIds: :class:`list` of :mod:`string`
+
+    :param names: (Optional) A name for each loaded dataset.
+    :type names: :class:`list` of :mod:`string`
+
+    :param max_workers: (Optional) Number of granules downloaded at the same
+        time.
+    :type max_workers: :class:`int`
+
+    :param cache_dir: (Optional) Directory of the granule cache, see
+        :func:`load_level4_granule`.
+    :type cache_dir: :mod:`string`
+
+    :param max_cache_bytes: (Optional) Size the granule cache is kept under.
+    :type max_cache_bytes: :class:`int`
+
+    :param cache_ttl: (Optional) Seconds a cached granule stays valid.
+    :type cache_ttl: :class:`int`
+
+    :returns: The datasets, in the order of datasetIds.
+    :rtype: :class:`list` of :class:`dataset.Dataset`
+    '''
+    if names is None:
+        names = [''] * len(datasetIds)
+
+    def load(arguments):
+        datasetId, name = arguments
+        return load_level4_granule(variable, datasetId, name, cache_dir,
+                                   max_cache_bytes, cache_ttl)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(load, zip(datasetIds, names)))
+
+
+def _read_granule(path, variable, name):
+    '''Read a variable of a downloaded granule into a Dataset.'''
     d = netcdf_dataset(path, mode='r')
-    dataset = d.variables[variable]
-
-    # By convention, but not by standard, if the dimensions exist, they will be in the order:
-    # time (t), altitude (z), latitude (y), longitude (x)
-    # but conventions aren't always followed and all dimensions aren't always present so
-    # see if we can make some educated deductions before defaulting to just pulling the first three
-    # columns.
-    temp_dimensions = list(map(lambda x: x.lower(), dataset.dimensions))
-    dataset_dimensions = dataset.dimensions
-    time = dataset_dimensions[temp_dimensions.index(
-        'time') if 'time' in temp_dimensions else 0]
-    lat = dataset_dimensions[temp_dimensions.index(
-        'lat') if 'lat' in temp_dimensions else 1]
-    lon = dataset_dimensions[temp_dimensions.index(
-        'lon') if 'lon' in temp_dimensions else 2]
-
-    # Time is given to us in some units since an epoch. We need to convert
-    # these values to datetime objects. Note that we use the main object's
-    # time object and not the dataset specific reference to it. We need to
-    # grab the 'units' from it and it fails on the dataset specific object.
-    times = np.array(convert_times_to_datetime(d[time]))
-    lats = np.array(d.variables[lat][:])
-    lons = np.array(d.variables[lon][:])
-    values = np.array(dataset[:])
+    try:
+        dataset = d.variables[variable]
+
+        # By convention, but not by standard, if the dimensions exist, they will be in the order:
+        # time (t), altitude (z), latitude (y), longitude (x)
+        # but conventions aren't always followed and all dimensions aren't always present so
+        # see if we can make some educated deductions before defaulting to just pulling the first three
+        # columns.
+        temp_dimensions = list(map(lambda x: x.lower(), dataset.dimensions))
+        dataset_dimensions = dataset.dimensions
+        time = dataset_dimensions[temp_dimensions.index(
+            'time') if 'time' in temp_dimensions else 0]
+        lat = dataset_dimensions[temp_dimensions.index(
+            'lat') if 'lat' in temp_dimensions else 1]
+        lon = dataset_dimensions[temp_dimensions.index(
+            'lon') if 'lon' in temp_dimensions else 2]
+
+        # Time is given to us in some units since an epoch. We need to convert
+        # these values to datetime objects. Note that we use the main object's
+        # time object and not the dataset specific reference to it. We need to
+        # grab the 'units' from it and it fails on the dataset specific object.
+        times = convert_times_to_datetime(d[time])
+        lats = np.array(d.variables[lat][:])
+        lons = np.array(d.variables[lon][:])
+        values = np.array(dataset[:])
+    finally:
+        d.close()
+
     origin = {
         'source': 'PO.DAAC',
         'url': 'podaac.jpl.nasa.gov/ws'
     }
-
-    # Removing the downloaded temporary granule before creating the OCW
-    # dataset.
-    d.close()
-    path = os.path.join(os.path.dirname(__file__), granuleName)
-    os.remove(path)
-
     return Dataset(lats, lons, times, values, variable, name=name, origin=origin)
@@ -23,35 +23,148 @@ Classes:
 '''
 # Needed Python 2/3 urllib compatability
 try:
-    from urllib.parse import urlencode
-    from urllib.request import urlopen
+    from urllib.parse import urlencode, urlsplit, parse_qsl
 except ImportError:
     from urllib import urlencode
-    from urllib2 import urlopen
+    from urlparse import urlsplit, parse_qsl
 
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import io
+import os
 import re
 import json
+import shutil
+import tempfile
+import threading
+import time
 import numpy as np
 import numpy.ma as ma
-from datetime import datetime
+import requests
+from datetime import datetime, timedelta
 import calendar
 from ocw.dataset import Dataset
 
 
 URL = 'http://rcmes.jpl.nasa.gov/query-api/query.php?'
 
+# Seconds a cached query response stays valid
+CACHE_TTL = 7 * 24 * 60 * 60
 
-def get_parameters_metadata():
+_BLOCK_SIZE = 16 * 1024 * 1024
+_MAX_WORKERS = 4
+_ROW_DTYPE = [('lat', np.float32), ('lon', np.float32), ('level', np.float32),
+              ('time', 'S19'), ('value', np.float32)]
+
+_session = requests.Session()
+_session_pool_size = 0
+_session_lock = threading.Lock()
+
+
+def _size_session_pool(max_workers):
+    '''Make the HTTP session keep at least max_workers connections.'''
+
+    global _session_pool_size
+    with _session_lock:
+        if max_workers > _session_pool_size:
+            for prefix in ('http://', 'https://'):
+                _session.mount(prefix, requests.adapters.HTTPAdapter(
+                    pool_maxsize=max_workers))
+            _session_pool_size = max_workers
+
+
+_size_session_pool(_MAX_WORKERS)
+
+
+def urlopen(url):
+    '''Open a URL through the pooled HTTP session.
+
+    The connections to RCMED are kept alive and shared by the concurrent
+    tile queries.
+
+    :param url: url to open
+    :type url: String
+
+    :returns: File-like object of the response body
+    '''
+
+    response = _session.get(url, stream=True)
+    response.raise_for_status()
+    response.raw.decode_content = True
+    return response.raw
+
+
+def _cache_path(url, cache_dir):
+    '''Path of the cached response of a query url.
+
+    The query parameters are sorted so that equivalent urls share an entry.
+    '''
+
+    scheme, netloc, path, query, _ = urlsplit(url)
+    query = urlencode(sorted(parse_qsl(query, keep_blank_values=True)))
+    key = '{0}://{1}{2}?{3}'.format(scheme, netloc.lower(), path, query)
+    return os.path.join(cache_dir,
+                        hashlib.sha256(key.encode('utf-8')).hexdigest())
+
+
+def _open_url(url, cache_dir=None, cache_ttl=CACHE_TTL):
+    '''Open a query url, reading it from the response cache if possible.
+
+    :param url: url to query from database
+    :type url: String
+    :param cache_dir: (Optional) Directory of the response cache. Responses
+        are not cached by default.
+    :type cache_dir: String
+    :param cache_ttl: (Optional) Seconds a cached response stays valid, or
+        None for no expiry.
+    :type cache_ttl: Integer
+
+    :returns: File-like object of the response body
+    '''
+
+    if cache_dir is None:
+        return urlopen(url)
+
+    path = _cache_path(url, cache_dir)
+    if os.path.exists(path) and (
+            cache_ttl is None or time.time() - os.path.getmtime(path) < cache_ttl):
+        return open(path, 'rb')
+
+    if not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir)
+    response = urlopen(url)
+    # The response is written next to its entry and renamed so that
+    # concurrent queries never read a partial response.
+    with tempfile.NamedTemporaryFile(dir=cache_dir, delete=False) as cached:
+        try:
+            shutil.copyfileobj(response, cached, _BLOCK_SIZE)
+        except Exception:
+            os.remove(cached.name)
+            raise
+    os.rename(cached.name, path)
+    return open(path, 'rb')
+
+
+def get_parameters_metadata(cache_dir=None, cache_ttl=CACHE_TTL):
     '''Get the metadata of all parameter from RCMED.
 
+    :param cache_dir: (Optional) Directory of the response cache. The
+        metadata is not cached by default.
+    :type cache_dir: :mod:`string`
+
+    :param cache_ttl: (Optional) Seconds the cached metadata stays valid, or
+        None for no expiry.
+    :type cache_ttl: :class:`int`
+
     :returns: Dictionary of information for each parameter stored in one list
     :rtype: :class:`list` of :class:`dict`
     '''
 
     param_info_list = []
     url = URL + "&param_info=yes"
-    string = urlopen(url)
+    string = _open_url(url, cache_dir, cache_ttl)
     data_string = string.read().decode('utf-8')
+    string.close()
     json_format_data = json.loads(data_string)
     fields_name = json_format_data['fields_name']
     data = json_format_data['data']
@@ -64,6 +177,21 @@ def get_parameters_metadata():
     return param_info_list
 
 
+_PARAMETERS_METADATA = {}
+_PARAMETERS_METADATA_LOCK = threading.Lock()
+
+
+def _get_parameters_metadata(cache_dir, cache_ttl):
+    '''Memoized :func:`get_parameters_metadata` for the dataset loader.'''
+
+    key = (cache_dir, cache_ttl)
+    with _PARAMETERS_METADATA_LOCK:
+        if key not in _PARAMETERS_METADATA:
+            _PARAMETERS_METADATA[key] = get_parameters_metadata(cache_dir,
+                                                                cache_ttl)
+        return _PARAMETERS_METADATA[key]
+
+
 def _make_mask_array(values, parameter_id, parameters_metadata):
     '''Created masked array to deal with missing values
 
@@ -89,31 +217,39 @@ def _make_mask_array(values, parameter_id, parameters_metadata):
 
 
 def _reshape_values(values, unique_values):
-    '''Reshape values into 4D array.
+    '''Place values into a (time, lat, lon) array.
+
+    The values are assigned by index, so the rows of the response may come in
+    any order. Grid cells without a row are masked.
 
     :param values: Raw values data
     :type values: numpy array
-    :param unique_values: Tuple of unique latitudes, longitudes and times data.
+    :param unique_values: Tuple of unique latitudes, longitudes and times data
+        and of the index of each value in them, as returned by
+        :func:`_make_unique`.
     :type unique_values: Tuple
 
     :returns: Reshaped values data
-    :rtype: Numpy array
+    :rtype: Masked array
     '''
 
-    lats_len = len(unique_values[0])
-    lons_len = len(unique_values[1])
-    times_len = len(unique_values[2])
+    unique_lats, unique_lons, unique_times, indices = unique_values
+    lat_index, lon_index, time_index = indices
 
-    values = values.reshape(times_len, lats_len, lons_len)
+    reshaped = ma.masked_all((len(unique_times), len(unique_lats),
+                              len(unique_lons)), dtype=values.dtype)
+    reshaped[time_index, lat_index, lon_index] = values
+    if not reshaped.mask.any():
+        reshaped.mask = ma.nomask
 
-    return values
+    return reshaped
 
 
 def _calculate_time(unique_times, time_step):
     '''Convert each time to the datetime object.
 
     :param unique_times: Unique time data
-    :type unique_times: String
+    :type unique_times: numpy.datetime64 array
     :param time_step: Time step
     :type time_step: String
 
@@ -121,16 +257,12 @@ def _calculate_time(unique_times, time_step):
     :rtype: Numpy array
     '''
 
-    time_format = "%Y-%m-%d %H:%M:%S"
-    unique_times = np.array(
-        [datetime.strptime(time.decode('utf-8'), time_format)
-                           for time in unique_times])
     # There is no need to sort time.
     # This function may required still in RCMES
     # unique_times.sort()
     # This function should be moved to the data_process.
 
-    return unique_times
+    return unique_times.astype('datetime64[s]').astype(object)
 
 
 def _make_unique(lats, lons, times):
@@ -143,55 +275,94 @@ def _make_unique(lats, lons, times):
     :param times: times
     :type times: Numpy array
 
-    :returns: Unique numpy arrays of latitudes, longitudes and times
+    :returns: Unique numpy arrays of latitudes, longitudes and times, and a
+        tuple of the index of each input value in them.
     :rtype: Tuple
     '''
 
-    unique_lats = np.unique(lats)
-    unique_lons = np.unique(lons)
-    unique_times = np.unique(times)
+    unique_lats, lat_index = np.unique(lats, return_inverse=True)
+    unique_lons, lon_index = np.unique(lons, return_inverse=True)
+    unique_times, time_index = np.unique(times, return_inverse=True)
+
+    return (unique_lats, unique_lons, unique_times,
+            (lat_index, lon_index, time_index))
+
 
-    return (unique_lats, unique_lons, unique_times)
+def _parse_rows(block):
+    '''Parse complete rows of the query response.
 
+    :param block: Rows of the form b'lat,lon,level,YYYY-MM-DD HH:MM:SS,value'
+        separated by b'\\r\\n'.
+    :type block: bytes
 
-def _get_data(url):
+    :returns: Latitudes, longitudes, times and values data
+    :rtype: (Numpy array, Numpy array, Numpy array, Numpy array)
+    '''
+
+    rows = np.loadtxt(io.BytesIO(block), delimiter=',', dtype=_ROW_DTYPE,
+                      ndmin=1)
+    # Only the few distinct timestamps of a block are parsed as strings.
+    # Level is not currently supported in Dataset class.
+    unique_times, time_index = np.unique(rows['time'], return_inverse=True)
+    unique_times = unique_times.astype('U').astype('datetime64[s]')
+
+    return rows['lat'], rows['lon'], unique_times[time_index], rows['value']
+
+
+def _get_data(url, block_size=_BLOCK_SIZE, cache_dir=None,
+              cache_ttl=CACHE_TTL):
     '''Reterive data from database.
 
+    The response is read and parsed in blocks, so it is never held in memory
+    as text as a whole.
+
     :param url: url to query from database
     :type url: String
+    :param block_size: (Optional) Number of bytes of the response parsed at
+        a time.
+    :type block_size: Integer
+    :param cache_dir: (Optional) Directory of the response cache.
+    :type cache_dir: String
+    :param cache_ttl: (Optional) Seconds a cached response stays valid.
+    :type cache_ttl: Integer
 
     :returns: Latitudes, longitudes, times and values data
     :rtype: (Numpy array, Numpy array, Numpy array, Numpy array)
     '''
 
-    string = urlopen(url)
-    data_string = string.read()
-    index_of_data = re.search(b'data: \r\n', data_string)
-    data = data_string[index_of_data.end():len(data_string)]
-    data = data.split(b'\r\n')
-
-    lats = []
-    lons = []
-    #levels = []
-    values = []
-    times = []
-
-    # Because the last row is empty, "len(data)-1" is used.
-    for i in range(len(data) - 1):
-        row = data[i].split(b',')
-        lats.append(np.float32(row[0]))
-        lons.append(np.float32(row[1]))
-        # Level is not currently supported in Dataset class.
-        # levels.append(np.float32(row[2]))
-        times.append(row[3])
-        values.append(np.float32(row[4]))
+    response = _open_url(url, cache_dir, cache_ttl)
 
-    lats = np.array(lats)
-    lons = np.array(lons)
-    times = np.array(times)
-    values = np.array(values)
+    # Skip the metadata which precede the data rows
+    buffer = b''
+    while True:
+        block = response.read(block_size)
+        buffer += block
+        index_of_data = re.search(b'data: \r\n', buffer)
+        if index_of_data or not block:
+            break
+    buffer = buffer[index_of_data.end():]
+
+    columns = []
+    while True:
+        block = response.read(block_size)
+        buffer += block
+        if block:
+            # Keep the last, possibly incomplete, row for the next block
+            end = buffer.rfind(b'\n') + 1
+        else:
+            end = len(buffer)
+        if buffer[:end].strip():
+            columns.append(_parse_rows(buffer[:end]))
+        buffer = buffer[end:]
+        if not block:
+            break
+    response.close()
 
-    return lats, lons, times, values
+    if not columns:
+        return (np.array([], dtype=np.float32), np.array([], dtype=np.float32),
+                np.array([], dtype='datetime64[s]'),
+                np.array([], dtype=np.float32))
+    return tuple(np.concatenate(column) for column in zip(*columns))
 
 
 def _beginning_of_date(time, time_step):
@@ -277,6 +448,62 @@ def _generate_query_url(dataset_id, parameter_id, min_lat, max_lat, min_lon, max
     return url_request
 
 
+def _time_tiles(start_time, end_time, tile_months):
+    '''Split a time range into periods of whole calendar months.
+
+    :param start_time: Start time
+    :type start_time: Datetime
+    :param end_time: End time
+    :type end_time: Datetime
+    :param tile_months: Number of months in a period, or None for a single
+        period.
+    :type tile_months: Integer
+
+    :returns: Start and end time of each period
+    :rtype: List of tuples
+    '''
+
+    if tile_months is None:
+        return [(start_time, end_time)]
+
+    tiles = []
+    tile_start = start_time
+    while tile_start <= end_time:
+        month = tile_start.month - 1 + tile_months
+        next_start = datetime(tile_start.year + month // 12, month % 12 + 1, 1)
+        # Tiles end just before the next one starts, so that sub-daily
+        # times on the last day of a tile are queried too
+        tiles.append((tile_start,
+                      min(next_start - timedelta(seconds=1), end_time)))
+        tile_start = next_start
+
+    return tiles
+
+
+def _spatial_tiles(min_lat, max_lat, min_lon, max_lon, tile_degrees):
+    '''Split a lat/lon box into boxes of at most tile_degrees a side.
+
+    :param tile_degrees: Size of a box in degrees, or None for a single box.
+    :type tile_degrees: Float
+
+    :returns: Minimum and maximum latitude and longitude of each box
+    :rtype: List of tuples
+    '''
+
+    if tile_degrees is None:
+        return [(min_lat, max_lat, min_lon, max_lon)]
+
+    def edges(minimum, maximum):
+        inner = np.arange(minimum, maximum, tile_degrees)[1:]
+        return [minimum] + [float(edge) for edge in inner] + [maximum]
+
+    lat_edges = edges(min_lat, max_lat)
+    lon_edges = edges(min_lon, max_lon)
+    return [(lat_edges[i], lat_edges[i + 1], lon_edges[j], lon_edges[j + 1])
+            for i in range(len(lat_edges) - 1)
+            for j in range(len(lon_edges) - 1)]
+
+
 def _get_parameter_info(parameters_metadata, parameter_id):
     '''General information for given parameter id.
 
@@ -302,9 +529,14 @@ def _get_parameter_info(parameters_metadata, parameter_id):
     return (database, time_step, realm, instrument, start_date, end_date, unit)
 
 
-def parameter_dataset(dataset_id, parameter_id, min_lat, max_lat, min_lon, max_lon, start_time, end_time, name=''):
+def parameter_dataset(dataset_id, parameter_id, min_lat, max_lat, min_lon, max_lon, start_time, end_time, name='',
+                      tile_months=12, tile_degrees=None, max_workers=_MAX_WORKERS, cache_dir=None, cache_ttl=CACHE_TTL):
     '''Get data from one database(parameter).
 
+    The request is split into tiles of time (and optionally space) which are
+    queried concurrently and stitched into one dataset. The parameter
+    metadata is only fetched once per process.
+
     :param dataset_id: Dataset id.
     :type dataset_id: :class:`int`
 
@@ -332,16 +564,49 @@ def parameter_dataset(dataset_id, parameter_id, min_lat, max_lat, min_lon, max_l
     :param name: (Optional) A name for the loaded dataset.
     :type name: :mod:`string`
 
+    :param tile_months: (Optional) Number of calendar months queried at a
+        time, or None to query the whole period at once.
+    :type tile_months: :class:`int`
+
+    :param tile_degrees: (Optional) Size in degrees of the lat/lon boxes
+        queried at a time. By default the whole area is queried at once.
+    :type tile_degrees: :class:`float`
+
+    :param max_workers: (Optional) Number of tiles queried at the same time.
+    :type max_workers: :class:`int`
+
+    :param cache_dir: (Optional) Directory the raw query responses are cached
+        in. Cached responses are read instead of querying RCMED again. By
+        default nothing is cached.
+    :type cache_dir: :mod:`string`
+
+    :param cache_ttl: (Optional) Seconds a cached response stays valid, or
+        None for no expiry.
+    :type cache_ttl: :class:`int`
+
     :returns: An OCW Dataset object contained the requested data from RCMED.
     :rtype: :class:`dataset.Dataset`
     '''
 
-    parameters_metadata = get_parameters_metadata()
+    parameters_metadata = _get_parameters_metadata(cache_dir, cache_ttl)
     parameter_name, time_step, _, _, _, _, parameter_units = _get_parameter_info(
         parameters_metadata, parameter_id)
-    url = _generate_query_url(dataset_id, parameter_id, min_lat,
-                              max_lat, min_lon, max_lon, start_time, end_time, time_step)
-    lats, lons, times, values = _get_data(url)
+    urls = [_generate_query_url(dataset_id, parameter_id, tile_min_lat, tile_max_lat, tile_min_lon, tile_max_lon,
+                                tile_start, tile_end, time_step)
+            for tile_min_lat, tile_max_lat, tile_min_lon, tile_max_lon in
+            _spatial_tiles(min_lat, max_lat, min_lon, max_lon, tile_degrees)
+            for tile_start, tile_end in _time_tiles(start_time, end_time, tile_months)]
+
+    def get_tile(url):
+        return _get_data(url, cache_dir=cache_dir, cache_ttl=cache_ttl)
+
+    _size_session_pool(max_workers)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        tiles = list(executor.map(get_tile, urls))
+    # Rows on the edges shared by spatial tiles are returned twice and are
+    # assigned to the same grid cell when the tiles are stitched.
+    lats, lons, times, values = (np.concatenate(column)
+                                 for column in zip(*tiles))
 
     unique_lats_lons_times = _make_unique(lats, lons, times)
     unique_times = _calculate_time(unique_lats_lons_times[2], time_step)
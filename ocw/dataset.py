@@ -20,13 +20,19 @@ Classes:
 
     Dataset - Container for a dataset's attributes and data.
 
+    LazyDataset - Dataset whose values are read from an open variable only
+                when they are accessed.
+
     Bounds - Container for holding spatial and temporal bounds information
                 for operations on a Dataset.
 
 '''
 
 import os
+import copy
+import json
 import numpy
+import numpy.ma as ma
 import logging
 import datetime as dt
 from mpl_toolkits.basemap import Basemap
@@ -38,7 +44,7 @@ import ocw.utils as utils
 logger = logging.getLogger(__name__)
 
 
-class Dataset:
+class Dataset(object):
     '''Container for a dataset's attributes and data.'''
 
     def __init__(self, lats, lons, times, values, variable=None, units=None,
@@ -86,6 +92,51 @@ class Dataset:
         self.name = name
         self.origin = origin
 
+    @property
+    def times(self):
+        '''One dimensional numpy array of the Dataset's datetime objects.'''
+        return self._times
+
+    @times.setter
+    def times(self, times):
+        self._times = times
+        self._calendar = None
+        self._time_offsets = None
+        self._time_fields = None
+
+    @property
+    def calendar(self):
+        '''CF calendar name of the Dataset's times.'''
+        if self._calendar is None:
+            self._calendar = utils.get_calendar(self._times)
+        return self._calendar
+
+    @property
+    def time_offsets(self):
+        '''Times as integer seconds from the calendar epoch.
+
+        In the standard calendars the offsets are the same as
+        ``times.astype('datetime64[s]')``. See
+        :func:`utils.times_to_offsets`. The offsets are computed once and
+        reset when :attr:`times` is assigned.
+        '''
+        if self._time_offsets is None:
+            self._time_offsets = utils.times_to_offsets(self._times,
+                                                        self.calendar)
+        return self._time_offsets
+
+    def time_fields(self):
+        '''Calculate the year, month and day of each time.
+
+        :returns: Integer arrays of years, months and days as a tuple in the
+            form (years, months, days).
+        :rtype: :func:`tuple` of :class:`numpy.ndarray`
+        '''
+        if self._time_fields is None:
+            self._time_fields = utils.time_fields(self.time_offsets,
+                                                  self.calendar)
+        return self._time_fields
+
     def spatial_boundaries(self):
         '''Calculate the spatial boundaries.
 
@@ -106,9 +157,9 @@ class Dataset:
         :rtype: :func:`tuple` of the form (:class:`datetime.datetime`,
             :class:`datetime.datetime`)
         '''
-        sorted_time = numpy.sort(self.times)
-        start_time = sorted_time[0]
-        end_time = sorted_time[-1]
+        offsets = self.time_offsets
+        start_time = self.times[numpy.argmin(offsets)]
+        end_time = self.times[numpy.argmax(offsets)]
 
         return (start_time, end_time)
 
@@ -143,12 +194,12 @@ class Dataset:
         :returns: The temporal resolution.
         :rtype: :mod:`string`
         '''
-        sorted_times = numpy.sort(self.times)
-        time_resolution = sorted_times[1] - sorted_times[0]
-        num_days = time_resolution.days
+        sorted_offsets = numpy.sort(self.time_offsets)
+        seconds = int(sorted_offsets[1] - sorted_offsets[0])
+        num_days = seconds // 86400
 
         if num_days == 0:
-            num_hours = time_resolution.seconds / 3600
+            num_hours = (seconds % 86400) / 3600
             time_resolution = 'hourly' if num_hours >= 1 else 'minutely'
         elif num_days == 1:
             time_resolution = 'daily'
@@ -159,6 +210,84 @@ class Dataset:
 
         return time_resolution
 
+    def save(self, path):
+        '''Write the Dataset to a directory of raw arrays.
+
+        The values, coordinates and integer time offsets are stored as
+        ``.npy`` files, the mask as packed bits and the remaining attributes
+        as JSON. Unlike :func:`dataset_processor.write_netcdf` the values keep
+        their dtype and nothing is compressed, so :meth:`load` can map them
+        straight from the file.
+
+        :param path: The directory to write to. It is created if needed.
+        :type path: :mod:`string`
+        '''
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        values = self.values
+        numpy.save(os.path.join(path, 'values.npy'), ma.getdata(values))
+        mask = ma.getmask(values)
+        mask_path = os.path.join(path, 'mask.npy')
+        if mask is not ma.nomask and mask.any():
+            numpy.save(mask_path, numpy.packbits(mask))
+        elif os.path.exists(mask_path):
+            os.remove(mask_path)
+        numpy.save(os.path.join(path, 'lats.npy'), numpy.asarray(self.lats))
+        numpy.save(os.path.join(path, 'lons.npy'), numpy.asarray(self.lons))
+        numpy.save(os.path.join(path, 'times.npy'), self.time_offsets)
+
+        metadata = {
+            'variable': self.variable,
+            'units': self.units,
+            'name': self.name,
+            'origin': self.origin,
+            'calendar': self.calendar
+        }
+        with open(os.path.join(path, 'metadata.json'), 'w') as f:
+            json.dump(metadata, f, default=str)
+
+    @staticmethod
+    def load(path, mmap=True):
+        '''Read a Dataset written by :meth:`save`.
+
+        :param path: The directory the Dataset was written to.
+        :type path: :mod:`string`
+
+        :param mmap: (Optional) Whether to map the values from the file
+            instead of reading them into memory. The pages of a mapped file
+            are shared by every process reading it. The mapping is
+            copy-on-write, so the values can still be modified without
+            changing the file.
+        :type mmap: :class:`bool`
+
+        :returns: The Dataset.
+        :rtype: :class:`dataset.Dataset`
+        '''
+        with open(os.path.join(path, 'metadata.json')) as f:
+            metadata = json.load(f)
+
+        values = numpy.load(os.path.join(path, 'values.npy'),
+                            mmap_mode='c' if mmap else None)
+        mask_path = os.path.join(path, 'mask.npy')
+        if os.path.exists(mask_path):
+            mask = numpy.unpackbits(numpy.load(mask_path), count=values.size)
+            mask = mask.reshape(values.shape).view(bool)
+        else:
+            mask = ma.nomask
+        values = ma.MaskedArray(values, mask=mask, copy=False)
+
+        calendar = metadata['calendar']
+        offsets = numpy.load(os.path.join(path, 'times.npy'))
+        dataset = Dataset(numpy.load(os.path.join(path, 'lats.npy')),
+                          numpy.load(os.path.join(path, 'lons.npy')),
+                          utils.offsets_to_times(offsets, calendar), values,
+                          variable=metadata['variable'],
+                          units=metadata['units'],
+                          origin=metadata['origin'], name=metadata['name'])
+        dataset._calendar = calendar
+        dataset._time_offsets = offsets
+        return dataset
+
     def _validate_inputs(self, lats, lons, times, values):
         """Check that Dataset inputs are valid.
 
@@ -233,6 +362,190 @@ class Dataset:
         )
 
 
+class LazyDataset(Dataset):
+    '''Dataset whose values stay in an array-like source until accessed.
+
+    The source is usually an open :class:`netCDF4.Variable`. Selections made
+    with :meth:`select` are only recorded, so a chain of subsets results in a
+    single indexed read of the selected hyperslab when :attr:`values` is
+    first accessed.
+    '''
+
+    def __init__(self, lats, lons, times, source, variable=None, units=None,
+                 origin=None, name="", fixed_indices=None):
+        '''Default LazyDataset constructor
+
+        :param lats: One or two dimensional numpy array of latitude values.
+        :type lats: :class:`numpy.ndarray`
+
+        :param lons: One or two dimensional numpy array of longitude values.
+        :type lons: :class:`numpy.ndarray`
+
+        :param times: One dimensional numpy array of unique python datetime
+            objects.
+        :type times: :class:`numpy.ndarray`
+
+        :param source: Array-like object with time, lat and lon axes in that
+            order, such as a :class:`netCDF4.Variable`. It must support
+            indexing with a tuple of slices and integers.
+
+        :param variable: Name of the value variable.
+        :type variable: :mod:`string`
+
+        :param units: Name of the value units
+        :type units: :mod:`string`
+
+        :param name: An optional string name for the Dataset.
+        :type name: :mod:`string`
+
+        :param origin: An optional object used to specify information on where
+            this dataset was loaded from.
+        :type origin: :class:`dict`
+
+        :param fixed_indices: (Optional) Index to read along each source axis
+            that is not a time, lat or lon axis, keyed by the axis number.
+            One of them may be a list of indices, in which case the values
+            keep that axis right after the time axis.
+        :type fixed_indices: :class:`dict`
+
+        :raises: ValueError
+        '''
+        fixed_indices = dict(fixed_indices or {})
+        shape = tuple(length for axis, length in enumerate(source.shape)
+                      if axis not in fixed_indices)
+        if len(shape) != 3:
+            error = ("The source of a LazyDataset must have time, lat and lon "
+                     "axes. Found a shape of %s." % (shape,))
+            logger.error(error)
+            raise ValueError(error)
+        # A zero strided array is enough to validate the shape of the values
+        self._validate_inputs(lats, lons, times,
+                              numpy.broadcast_to(numpy.empty(1), shape))
+
+        if lats.ndim == 1 and lons.ndim == 1:
+            # Run the flat indices of the grid through the normalization to
+            # find which rows and columns of the source it flips or shifts.
+            grid = numpy.arange(lats.size * lons.size).reshape(shape[1:])
+            lats, lons, grid = utils.normalize_lat_lon_values(lats, lons, grid)
+            lat_index = grid[:, 0] // shape[2]
+            lon_index = grid[0, :] % shape[2]
+        else:
+            lats, lons, _ = utils.normalize_lat_lon_values(lats, lons, None)
+            lat_index = numpy.arange(shape[1])
+            lon_index = numpy.arange(shape[2])
+
+        self._source = source
+        self._fixed_indices = fixed_indices
+        self._indices = (numpy.arange(shape[0]), lat_index, lon_index)
+        self._values = None
+
+        self.lats = lats
+        self.lons = lons
+        self.times = times
+        self.variable = variable
+        self.units = units
+        self.name = name
+        self.origin = origin
+
+    @property
+    def values(self):
+        '''Values of the selected hyperslab, read on first access.'''
+        if self._values is None:
+            self._values = self._read()
+        return self._values
+
+    @values.setter
+    def values(self, values):
+        self._values = values
+
+    @property
+    def is_loaded(self):
+        '''Whether the values have been read from the source.'''
+        return self._values is not None
+
+    def close(self):
+        '''Close the file of a :class:`netCDF4.Variable` source.
+
+        The values cannot be read from the source afterwards.
+        '''
+        if isinstance(self._source, netCDF4.Variable):
+            group = self._source.group()
+            while group.parent is not None:
+                group = group.parent
+            if group.isopen():
+                group.close()
+
+    def select(self, time=None, lat=None, lon=None):
+        '''Select a part of the Dataset without reading any values.
+
+        Each selection is a slice or an array of integer indices relative to
+        the current Dataset. None selects the whole axis.
+
+        :param time: (Optional) Selection along the time axis.
+        :type time: :class:`slice` or :class:`numpy.ndarray`
+
+        :param lat: (Optional) Selection along the lat axis.
+        :type lat: :class:`slice` or :class:`numpy.ndarray`
+
+        :param lon: (Optional) Selection along the lon axis.
+        :type lon: :class:`slice` or :class:`numpy.ndarray`
+
+        :returns: A new LazyDataset sharing the source of this one. When the
+            values of this Dataset are already loaded, they are sliced in
+            memory instead.
+        :rtype: :class:`dataset.LazyDataset`
+        '''
+        time, lat, lon = [slice(None) if selection is None else selection
+                          for selection in (time, lat, lon)]
+        selected = copy.copy(self)
+        selected._indices = (self._indices[0][time], self._indices[1][lat],
+                             self._indices[2][lon])
+        if self.lats.ndim == 2:
+            selected.lats = self.lats[lat][:, lon]
+            selected.lons = self.lons[lat][:, lon]
+        else:
+            selected.lats = self.lats[lat]
+            selected.lons = self.lons[lon]
+        selected.times = self.times[time]
+        if self._values is not None:
+            selected._values = self._values[time][..., lat, :][..., lon]
+        return selected
+
+    def _read(self):
+        '''Read the selected hyperslab from the source.
+
+        Every axis is read as one contiguous range covering its selection
+        and the selection is then taken from that range in memory.
+        '''
+        key = []
+        takes = []
+        level_axis = None
+        indices = iter(self._indices)
+        for axis in range(len(self._source.shape)):
+            if axis in self._fixed_indices:
+                fixed_index = self._fixed_indices[axis]
+                key.append(fixed_index)
+                if numpy.ndim(fixed_index) == 1:
+                    level_axis = len(takes)
+                    takes.append(None)
+                continue
+            index = next(indices)
+            start = int(index.min()) if index.size else 0
+            stop = int(index.max()) + 1 if index.size else 0
+            key.append(slice(start, stop))
+            takes.append(index - start)
+
+        values = ma.array(self._source[tuple(key)])
+        for axis, index in enumerate(takes):
+            if index is None:
+                continue
+            if not numpy.array_equal(index, numpy.arange(values.shape[axis])):
+                values = values.take(index, axis=axis)
+        if level_axis is not None:
+            values = numpy.moveaxis(values, level_axis, 1)
+        return values
+
+
 class Bounds(object):
     '''Container for holding spatial and temporal bounds information.
 
@@ -0,0 +1,263 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+'''
+Classes:
+    DatasetCache - On-disk cache of the datasets loaded by DatasetLoader.
+'''
+
+import datetime
+from glob import glob
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+import numpy
+
+from ocw.dataset import Dataset
+
+logger = logging.getLogger(__name__)
+
+_GLOB_CHARACTERS = set('*?[')
+
+try:
+    _STRING_TYPES = (basestring,)
+except NameError:
+    _STRING_TYPES = (str,)
+
+
+def _normalize(value):
+    ''' Convert loader options to JSON serializable values which compare
+    equal when the options do.
+    '''
+    if isinstance(value, dict):
+        return dict((str(key), _normalize(item))
+                    for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return [_normalize(item) for item in value]
+    if isinstance(value, numpy.ndarray):
+        return {'dtype': value.dtype.str, 'shape': value.shape,
+                'sha1': hashlib.sha1(
+                    numpy.ascontiguousarray(value).tobytes()).hexdigest()}
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    if isinstance(value, numpy.generic):
+        return value.item()
+    if value is None or isinstance(value, _STRING_TYPES + (int, float, bool)):
+        return value
+    if hasattr(value, '__dict__'):
+        return [type(value).__name__, _normalize(vars(value))]
+    return repr(value)
+
+
+def _source_files(loader_opts):
+    ''' Find the local files the loader options refer to. '''
+    strings = []
+    for value in loader_opts.values():
+        if isinstance(value, _STRING_TYPES):
+            strings.append(value)
+        elif isinstance(value, (list, tuple)):
+            strings.extend(item for item in value
+                           if isinstance(item, _STRING_TYPES))
+    # The files named in a local_split file list are inputs as well
+    file_list = loader_opts.get('file_list')
+    if isinstance(file_list, _STRING_TYPES) and os.path.isfile(file_list):
+        with open(file_list) as f:
+            strings.extend(line.rstrip('\n') for line in f if line.strip())
+    patterns = loader_opts.get('filename_pattern')
+    if isinstance(loader_opts.get('file_path'), _STRING_TYPES) and patterns:
+        if isinstance(patterns, _STRING_TYPES):
+            patterns = [patterns]
+        strings.extend(loader_opts['file_path'] + pattern
+                       for pattern in patterns)
+
+    files = set()
+    for string in strings:
+        if _GLOB_CHARACTERS.intersection(string):
+            matches = glob(string)
+        elif os.path.exists(string):
+            matches = [string]
+        else:
+            continue
+        for match in matches:
+            if os.path.isdir(match):
+                for root, _, names in os.walk(match):
+                    files.update(os.path.join(root, name) for name in names)
+            else:
+                files.add(match)
+    return sorted(os.path.abspath(path) for path in files)
+
+
+class DatasetCache(object):
+    '''On-disk cache of the datasets loaded by DatasetLoader.
+
+    Entries are keyed by a hash of the loader options together with the
+    path, modification time and size of every local file the options refer
+    to, so editing an input file invalidates its entries. Remote sources are
+    keyed by their query options alone. The values of cached datasets are
+    memory mapped when they are read back. Once the cache grows beyond its
+    size limit the least recently used entries are removed.
+    '''
+
+    def __init__(self, directory, max_bytes=None):
+        '''Default DatasetCache constructor.
+
+        :param directory: The directory to store the cached datasets in.
+            It is created if needed.
+        :type directory: :mod:`string`
+
+        :param max_bytes: (Optional) The size the cache is kept under. By
+            default the cache is not bounded.
+        :type max_bytes: :class:`int`
+        '''
+        self.directory = os.path.abspath(directory)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+
+    def key(self, loader_opts):
+        '''Compute the cache key of a dataset loader configuration.
+
+        :param loader_opts: The keyword arguments of the loader, including
+            'loader_name'.
+        :type loader_opts: :class:`dict`
+
+        :returns: The hexadecimal key.
+        :rtype: :mod:`string`
+        '''
+        files = []
+        for path in _source_files(loader_opts):
+            stat = os.stat(path)
+            files.append([path, repr(stat.st_mtime), stat.st_size])
+        contents = json.dumps([_normalize(loader_opts), files],
+                              sort_keys=True)
+        return hashlib.sha256(contents.encode('utf-8')).hexdigest()
+
+    def get(self, key, max_age=None):
+        '''Read a cached loader output.
+
+        :param key: The key from :meth:`key`.
+        :type key: :mod:`string`
+
+        :param max_age: (Optional) Seconds after which an entry is stale and
+            ignored. By default entries don't expire.
+        :type max_age: :class:`float`
+
+        :returns: The dataset or list of datasets stored under the key, or
+            None if there is no such entry.
+        '''
+        path = os.path.join(self.directory, key)
+        entry_path = os.path.join(path, 'entry.json')
+        try:
+            if (max_age is not None and
+                    time.time() - os.path.getmtime(entry_path) > max_age):
+                return None
+            with open(entry_path) as f:
+                entry = json.load(f)
+            datasets = [Dataset.load(os.path.join(path, str(index)))
+                        for index in range(entry['count'])]
+            # The modification time of an entry records when it was last
+            # used, that of its entry.json when it was stored
+            os.utime(path, None)
+        except (IOError, OSError, ValueError, KeyError):
+            return None
+
+        logger.debug('Loaded %s from the dataset cache', key)
+        return datasets if entry['is_list'] else datasets[0]
+
+    def put(self, key, output):
+        '''Store a loader output.
+
+        :param key: The key from :meth:`key`.
+        :type key: :mod:`string`
+
+        :param output: The dataset or list of datasets to store.
+        :type output: :class:`dataset.Dataset` or :class:`list`
+        '''
+        is_list = isinstance(output, list)
+        datasets = output if is_list else [output]
+
+        # Entries are written next to their final location and renamed so
+        # that concurrent readers never see a partial entry.
+        staging = tempfile.mkdtemp(prefix='.', dir=self.directory)
+        try:
+            for index, dataset in enumerate(datasets):
+                dataset.save(os.path.join(staging, str(index)))
+            with open(os.path.join(staging, 'entry.json'), 'w') as f:
+                json.dump({'is_list': is_list, 'count': len(datasets)}, f)
+            with self._lock:
+                self._remove(key)
+                os.rename(staging, os.path.join(self.directory, key))
+        except Exception:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        self._evict()
+
+    def invalidate(self, key):
+        '''Remove an entry from the cache.
+
+        :param key: The key from :meth:`key`.
+        :type key: :mod:`string`
+        '''
+        with self._lock:
+            self._remove(key)
+
+    def clear(self):
+        '''Remove every entry from the cache.'''
+        with self._lock:
+            for key in self._keys():
+                self._remove(key)
+
+    def size(self):
+        '''Total size of the cached entries in bytes.'''
+        return sum(self._entry_size(key) for key in self._keys())
+
+    def _keys(self):
+        return [name for name in os.listdir(self.directory)
+                if not name.startswith('.')]
+
+    def _remove(self, key):
+        shutil.rmtree(os.path.join(self.directory, key), ignore_errors=True)
+
+    def _entry_size(self, key):
+        size = 0
+        for root, _, names in os.walk(os.path.join(self.directory, key)):
+            size += sum(os.path.getsize(os.path.join(root, name))
+                        for name in names)
+        return size
+
+    def _evict(self):
+        if self.max_bytes is None:
+            return
+        with self._lock:
+            entries = sorted(
+                (os.path.getmtime(os.path.join(self.directory, key)), key)
+                for key in self._keys())
+            sizes = dict((key, self._entry_size(key)) for _, key in entries)
+            total = sum(sizes.values())
+            for _, key in entries:
+                if total <= self.max_bytes:
+                    break
+                logger.debug('Evicting %s from the dataset cache', key)
+                self._remove(key)
+                total -= sizes[key]
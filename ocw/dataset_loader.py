@@ -20,15 +20,24 @@ Classes:
     DatasetLoader - Generate OCW Dataset objects from a variety of sources.
 '''
 
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import os
+import threading
+import time
+
+from ocw.dataset import Dataset, LazyDataset
 import ocw.data_source.local as local
 import ocw.data_source.rcmed as rcmed
 import ocw.data_source.podaac_datasource as podaac
 import warnings
 
+logger = logging.getLogger(__name__)
+
 class DatasetLoader:
     '''Generate a list of OCW Dataset objects from a variety of sources.'''
 
-    def __init__(self, *loader_opts):
+    def __init__(self, *loader_opts, **kwargs):
         '''Generate a list of OCW Dataset objects from a variety of sources.
 
         Each keyword argument can be information for a dataset in dictionary
@@ -63,6 +72,9 @@ class DatasetLoader:
         * ``'local'`` - One or multiple dataset files in a local directory
         * ``'local_split'`` - A single dataset split accross multiple files in a
                               local directory
+        * ``'catalog'`` - A single dataset made of the files of a
+                          :class:`ocw.catalog.Catalog` which contain the
+                          variable and overlap the bounds
         * ``'esgf'`` - Download the dataset from the Earth System Grid
                        Federation
         * ``'rcmed'`` - Download the dataset from the Regional Climate Model
@@ -83,16 +95,31 @@ class DatasetLoader:
                             this defaults to local.
         :type loader_opts: :class:`dict`
 
+        :param catalog: (Optional) The catalog of local files used by the
+                        ``'catalog'`` loader.
+        :type catalog: :class:`ocw.catalog.Catalog`
+
+        :param cache: (Optional) The cache loaded datasets are stored in and
+                      read back from when a configuration and its input
+                      files are unchanged.
+        :type cache: :class:`ocw.dataset_cache.DatasetCache`
+
         :raises KeyError: If an invalid argument is passed to a data source
         loader function.
         '''
         # dataset loader config
         self.set_loader_opts(*loader_opts)
+        self.catalog = kwargs.pop('catalog', None)
+        self.cache = kwargs.pop('cache', None)
+        if kwargs:
+            raise TypeError('Unexpected keyword arguments: {}'.format(
+                ', '.join(sorted(kwargs))))
 
         # Default loaders
         self._source_loaders = {
             'local': local.load_multiple_files,
             'local_split': local.load_dataset_from_multiple_netcdf_files,
+            'catalog': self._load_from_catalog,
             'rcmed': rcmed.parameter_dataset,
             'podaac': podaac.load_level4_granule
         }
@@ -152,29 +179,123 @@ class DatasetLoader:
         self._config = []
         self.add_loader_opts(*loader_opts)
 
-    def load_datasets(self):
+    def invalidate_cache(self):
+        '''
+        Remove the cached datasets of the current loader configurations.
+        '''
+        if self.cache is not None:
+            for loader_opt in self._config:
+                self.cache.invalidate(self.cache.key(loader_opt))
+
+    def load_datasets(self, max_workers=1, per_source_limits=None,
+                      continue_on_error=False):
         '''
         Loads the datasets from the given loader configurations.
+
+        The datasets are kept in the order of the configurations whether or
+        not they are loaded concurrently. The wall time, number of bytes
+        loaded and error of each configuration are recorded in
+        ``self.load_stats``.
+
+        :param max_workers: (Optional) Number of threads loading the
+                            datasets. By default they are loaded one after
+                            the other.
+        :type max_workers: :class:`int`
+
+        :param per_source_limits: (Optional) Maximum number of datasets
+                                  loaded at the same time from a loader, for
+                                  example ``{'esgf': 4, 'rcmed': 2}``.
+        :type per_source_limits: :class:`dict`
+
+        :param continue_on_error: (Optional) If True, a configuration that
+                                  fails to load is left out of the datasets
+                                  and the other ones are still loaded.
+                                  Otherwise the first error is raised.
+        :type continue_on_error: :class:`bool`
         '''
         # Ensure output is clear if loading is performed more than once to
         # prevent duplicates.
         self.datasets = []
+        self.load_stats = []
+
+        limits = dict((loader_name, threading.BoundedSemaphore(limit))
+                      for loader_name, limit in
+                      (per_source_limits or {}).items())
+
+        def load(loader_opt):
+            limit = limits.get(loader_opt['loader_name'])
+            if limit is None:
+                return self._load_with_stats(**loader_opt)
+            with limit:
+                return self._load_with_stats(**loader_opt)
+
+        if max_workers > 1:
+            executor = ThreadPoolExecutor(max_workers=max_workers)
+            futures = [executor.submit(load, loader_opt)
+                       for loader_opt in self._config]
+            results = (future.result() for future in futures)
+        else:
+            executor = None
+            results = (load(loader_opt) for loader_opt in self._config)
+
+        try:
+            for output, stats in results:
+                self.load_stats.append(stats)
+                if stats['error'] is not None:
+                    if not continue_on_error:
+                        raise stats['error']
+                    logger.error('Unable to load dataset with %s loader: %s',
+                                 stats['loader_name'], stats['error'])
+                    continue
 
-        # Load the datasets
-        for loader_opt in self._config:
-            output = self._load(**loader_opt)
+                # Need to account for the fact that some loaders return lists
+                # of OCW Dataset objects instead of just one
+                if isinstance(output, list):
+                    self.datasets.extend(output)
+                else:
+                    self.datasets.append(output)
+        finally:
+            if executor is not None:
+                # Configurations that have not started yet are skipped
+                for future in futures:
+                    future.cancel()
+                executor.shutdown(wait=True)
 
-            # Need to account for the fact that some loaders return lists
-            # of OCW Dataset objects instead of just one
-            if isinstance(output, list):
-                self.datasets.extend(output)
-            else:
-                self.datasets.append(output)
+    def _load_with_stats(self, **kwargs):
+        '''
+        Load a dataset, returning it with the wall time, number of bytes
+        loaded and error of the load instead of raising.
+        '''
+        stats = {'loader_name': kwargs['loader_name'], 'wall_time': None,
+                 'nbytes': 0, 'error': None}
+        output = None
+        start = time.time()
+        try:
+            output = self._load(**kwargs)
+        except Exception as error:
+            stats['error'] = error
+        stats['wall_time'] = time.time() - start
+
+        datasets = output if isinstance(output, list) else [output]
+        for dataset in datasets:
+            # Lazily loaded values have not been read yet
+            if isinstance(dataset, Dataset) and (
+                    not isinstance(dataset, LazyDataset) or dataset.is_loaded):
+                stats['nbytes'] += dataset.values.nbytes
+        logger.info('Loaded %s bytes with %s loader in %.3f s',
+                    stats['nbytes'], stats['loader_name'], stats['wall_time'])
+        return output, stats
 
     def _load(self, **kwargs):
         '''
         Generic dataset loading method.
         '''
+        if self.cache is not None:
+            key = self.cache.key(kwargs)
+            output = self.cache.get(key)
+            if output is not None:
+                return output
+
         # Extract the loader name
         loader_name = kwargs.pop('loader_name')
 
@@ -186,4 +307,47 @@ class DatasetLoader:
 
         # Preserve loader_name info for later use
         kwargs['loader_name'] = loader_name
+
+        if self.cache is not None:
+            self.cache.put(key, output)
         return output
+
+    def _load_from_catalog(self, variable_name, directory=None, bounds=None,
+                           **kwargs):
+        '''
+        Load the cataloged files containing a variable as a single dataset.
+
+        The files are looked up in the catalog instead of being opened to
+        check their variables and extents. The remaining kwargs are passed to
+        :func:`ocw.data_source.local.load_dataset_from_multiple_netcdf_files`.
+
+        :param variable_name: The variable name to load.
+        :type variable_name: :mod:`string`
+
+        :param directory: (Optional) Only the files under this directory are
+            loaded. The directory is scanned first so that new or modified
+            files are cataloged.
+        :type directory: :mod:`string`
+
+        :param bounds: (Optional) Only the files overlapping these bounds are
+            loaded, and only the part of them within the bounds is read.
+        :type bounds: :class:`dataset.Bounds`
+
+        :raises ValueError: If no catalog was given or no cataloged file
+            matches.
+        '''
+        if self.catalog is None:
+            raise ValueError('The catalog loader requires a catalog.')
+
+        if directory is not None:
+            self.catalog.scan(directory)
+        files = self.catalog.find(variable_name, bounds)
+        if directory is not None:
+            prefix = os.path.join(os.path.abspath(directory), '')
+            files = [path for path in files if path.startswith(prefix)]
+        if not files:
+            raise ValueError('No cataloged file contains {} within the '
+                             'bounds.'.format(variable_name))
+
+        return local.load_dataset_from_multiple_netcdf_files(
+            variable_name, file_list=files, bounds=bounds, **kwargs)
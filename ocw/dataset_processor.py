@@ -17,13 +17,13 @@
 
 from ocw import dataset as ds
 import ocw.utils as utils
+from ocw.regrid_weights import RegridWeights, CurvilinearGridIndex
 
 import datetime
 import numpy as np
 import numpy.ma as ma
 import scipy.interpolate
 import scipy.ndimage
-from scipy.stats import rankdata
 from scipy.ndimage import map_coordinates
 import netCDF4
 from matplotlib.path import Path
@@ -59,12 +59,8 @@ def temporal_subset(target_dataset, month_start, month_end,
     else:
         month_index = range(month_start, month_end + 1)
 
-    dates = target_dataset.times
-    months = np.array([d.month for d in dates])
-    time_index = []
-    for m_value in month_index:
-        time_index.extend(list(np.where(months == m_value)[0]))
-    time_index.sort()
+    months = target_dataset.time_fields()[1]
+    time_index = np.where(np.isin(months, list(month_index)))[0]
 
     new_dataset = ds.Dataset(target_dataset.lats,
                              target_dataset.lons,
@@ -77,22 +73,15 @@ def temporal_subset(target_dataset, month_start, month_end,
     if average_each_year:
         nmonth = len(month_index)
         ntime = new_dataset.times.size
-        nyear = ntime / nmonth
-        averaged_time = []
-        ny, nx = target_dataset.values.shape[1:]
-        averaged_values = ma.zeros([nyear, ny, nx])
-        for iyear in np.arange(nyear):
-            # centered time index of the season between month_start and
-            # month_end in each year
-            center_index = int(nmonth / 2) + iyear * nmonth
-            if nmonth == 1:
-                center_index = iyear
-            averaged_time.append(new_dataset.times[center_index])
-            averaged_values[iyear, :] = ma.average(new_dataset.values[
-                nmonth * iyear: nmonth * iyear + nmonth, :], axis=0)
+        nyear = ntime // nmonth
+        # centered time index of the season between month_start and
+        # month_end in each year
+        center_index = int(nmonth / 2) + np.arange(nyear) * nmonth
+        averaged_values = _group_reduce(new_dataset.values[:nyear * nmonth],
+                                        np.arange(nyear * nmonth) // nmonth)
         new_dataset = ds.Dataset(target_dataset.lats,
                                  target_dataset.lons,
-                                 np.array(averaged_time),
+                                 new_dataset.times[center_index],
                                  averaged_values,
                                  variable=target_dataset.variable,
                                  units=target_dataset.units,
@@ -100,7 +89,7 @@ def temporal_subset(target_dataset, month_start, month_end,
     return new_dataset
 
 
-def temporal_rebin(target_dataset, temporal_resolution):
+def temporal_rebin(target_dataset, temporal_resolution, how='mean'):
     """ Rebin a Dataset to a new temporal resolution
 
     :param target_dataset: Dataset object that needs temporal rebinned
@@ -109,6 +98,10 @@ def temporal_rebin(target_dataset, temporal_resolution):
     :param temporal_resolution: The new temporal resolution
     :type temporal_resolution: :mod:`string`
 
+    :param how: (Optional) Reduction of the unmasked values in each bin:
+        'mean', 'sum', 'min', 'max' or 'count'
+    :type how: :mod:`string`
+
     :returns: A new temporally rebinned Dataset
     :rtype: :class:`dataset.Dataset`
     """
@@ -116,7 +109,8 @@ def temporal_rebin(target_dataset, temporal_resolution):
     # _rcmes_calc_average_on_new_time_unit_K() can understand
 
     binned_values, binned_dates = _rcmes_calc_average_on_new_time_unit(
-        target_dataset.values, target_dataset.times, temporal_resolution)
+        target_dataset.values, target_dataset.times, temporal_resolution,
+        how=how, fields=target_dataset.time_fields())
     binned_dates = np.array(binned_dates)
     new_dataset = ds.Dataset(target_dataset.lats,
                              target_dataset.lons,
@@ -151,14 +145,8 @@ def temporal_rebin_with_time_index(target_dataset, nt_average):
     # nt2 is the length of time dimension in the rebinned dataset
     nt2 = nt // nt_average
     binned_dates = target_dataset.times[np.arange(nt2) * nt_average]
-    binned_values = ma.zeros(
-        np.insert(target_dataset.values.shape[1:], 0, nt2))
-    for it in np.arange(nt2):
-        binned_values[it, :] = ma.average(
-            target_dataset.values[nt_average * it:
-                                  nt_average * it + nt_average,
-                                  :],
-            axis=0)
+    binned_values = _group_reduce(target_dataset.values[:nt2 * nt_average],
+                                  np.arange(nt2 * nt_average) // nt_average)
     new_dataset = ds.Dataset(target_dataset.lats,
                              target_dataset.lons,
                              binned_dates,
@@ -171,7 +159,8 @@ def temporal_rebin_with_time_index(target_dataset, nt_average):
 
 
 def spatial_regrid(target_dataset, new_latitudes, new_longitudes,
-                   boundary_check=True):
+                   boundary_check=True, weights_cache=None,
+                   method='bilinear', time_chunk_size=None):
     """ Regrid a Dataset using the new latitudes and longitudes
 
     :param target_dataset: Dataset object that needs spatially regridded
@@ -184,145 +173,70 @@ def spatial_regrid(target_dataset, new_latitudes, new_longitudes,
     :type new_longitudes: :class:`numpy.ndarray`
 
     :param boundary_check:  Check if the regriding domain's boundaries
-                            are outside target_dataset's domain
+                            are outside target_dataset's domain. If False,
+                            bilinear regridding only masks the new grid
+                            points south of a regular grid, and other new
+                            points off the grid are 0.
     :type boundary_check: :class:'bool'
 
+    :param weights_cache: (Optional) Cache of interpolation weights. The
+        weights between the source and new grids are stored in the cache
+        and datasets on the same grid reuse them.
+    :type weights_cache: :class:`regrid_weights.RegridWeightsCache`
+
+    :param method: 'bilinear' interpolation, 'inverse_distance' weighting
+        of the four nearest grid points or first order area weighted
+        'conservative' remapping between regular grids. Conservative
+        remapping averages all source cells overlapping a new cell and
+        ignores masked source cells.
+    :type method: :mod:`string`
+
+    :param time_chunk_size: (Optional) Number of time steps regridded at
+        once. Smaller slabs lower the peak memory use. By default the slabs
+        hold about regrid_weights.DEFAULT_CHUNK_VALUES source values.
+    :type time_chunk_size: :class:`int`
+
     :returns: A new spatially regridded Dataset
     :rtype: :class:`dataset.Dataset`
+
+    :raises ValueError: If the method is not supported.
     """
+    if method not in ('bilinear', 'inverse_distance', 'conservative'):
+        error = ("Regridding method '%s' is not supported. Use 'bilinear', "
+                 "'inverse_distance' or 'conservative'." % method)
+        logger.error(error)
+        raise ValueError(error)
 
     # Create grids of the given lats and lons for the underlying API
     # NOTE: np.meshgrid() requires inputs (x, y) and returns data
     #       of shape(y|lat|rows, x|lon|columns).  So we pass in lons, lats
     #       and get back data.shape(lats, lons)
-    if target_dataset.lons.ndim == 1 and target_dataset.lats.ndim == 1:
-        regular_grid = True
-        lons, lats = np.meshgrid(target_dataset.lons, target_dataset.lats)
-    else:
-        regular_grid = False
-        lons = target_dataset.lons
-        lats = target_dataset.lats
     if new_longitudes.ndim == 1 and new_latitudes.ndim == 1:
         new_lons, new_lats = np.meshgrid(new_longitudes, new_latitudes)
     else:
         new_lons = new_longitudes
         new_lats = new_latitudes
 
-    ny_old, nx_old = lats.shape
     ny_new, nx_new = new_lats.shape
 
-    for iy in np.arange(ny_old):
-        if not all(x < y for x, y in zip(lons[iy, :], lons[iy, 1:])):
-            lons[iy, :][lons[iy, :] < 0] = lons[iy, :][lons[iy, :] < 0] + 360.
-
-    # Make masked array of shape (times, new_latitudes,new_longitudes)
-    new_values = ma.zeros([len(target_dataset.times),
-                           ny_new, nx_new])
-    # Make masked array of shape (times, new_latitudes,new_longitudes)
-    new_values = ma.zeros([len(target_dataset.times),
-                           ny_new, nx_new])
-
-    # Boundary vertices of target_dataset
-    vertices = []
-
-    if regular_grid:
-        vertices.append([lons[0, 0], lats[0, 0]])
-        vertices.append([lons[-1, 0], lats[-1, 0]])
-        vertices.append([lons[-1, -1], lats[-1, -1]])
-        vertices.append([lons[0, -1], lats[0, -1]])
+    def build_weights():
+        return _calc_regrid_weights(
+            target_dataset.lats, target_dataset.lons, new_lats, new_lons,
+            method=method, boundary_check=boundary_check,
+            source_shape=target_dataset.values.shape[-2:])
+
+    if weights_cache is None:
+        weights = build_weights()
     else:
-        # from south to north along the west boundary
-        for iy in np.arange(ny_old):
-            vertices.append([lons[iy, 0], lats[iy, 0]])
-        # from west to east along the north boundary
-        for ix in np.arange(nx_old):
-            vertices.append([lons[-1, ix], lats[-1, ix]])
-        # from north to south along the east boundary
-        for iy in np.arange(ny_old)[::-1]:
-            vertices.append([lons[iy, -1], lats[iy, -1]])
-        # from east to west along the south boundary
-        for ix in np.arange(nx_old)[::-1]:
-            vertices.append([lons[0, ix], lats[0, ix]])
-    path = Path(vertices)
-
-    # Convert new_lats and new_lons to float indices
-    new_lons_indices = np.zeros(new_lons.shape)
-    new_lats_indices = np.zeros(new_lats.shape)
-
-    for iy in np.arange(ny_new):
-        for ix in np.arange(nx_new):
-            if path.contains_point([new_lons[iy, ix],
-                                    new_lats[iy, ix]]) or not boundary_check:
-                if regular_grid:
-                    mn = lats.min()
-                    mx = lats.max()
-                    new_lats_indices[iy, ix] = (
-                        ny_old - 1.) * (new_lats[iy, ix] - mn) / (mx - mn)
-                    mn = lons.min()
-                    mx = lons.max()
-                    new_lons_indices[iy, ix] = (
-                        nx_old - 1.) * (new_lons[iy, ix] - mn) / (mx - mn)
-                else:
-                    distance_from_original_grids = (
-                        (lons - new_lons[iy, ix])**2. +
-                        (lats - new_lats[iy, ix])**2.)**0.5
-                    if np.min(distance_from_original_grids) == 0.:
-                        new_lats_indices[iy, ix], new_lons_indices[
-                            iy, ix] = np.where(
-                                distance_from_original_grids == 0)
-                    else:
-                        distance_rank = rankdata(
-                            distance_from_original_grids.flatten(),
-                            method='ordinal').reshape(lats.shape)
-                        # the nearest grid point's indices
-                        iy1, ix1 = np.where(distance_rank == 1)
-                        # point [iy2, ix] is diagonally across from [iy1, ix1]
-                        iy2, ix2 = np.where(distance_rank == 4)
-                        dist1 = distance_from_original_grids[iy1, ix1]
-                        dist2 = distance_from_original_grids[iy2, ix2]
-                        new_lats_indices[iy, ix] = (
-                            dist1 * iy2 + dist2 * iy1) / (dist1 + dist2)
-                        new_lons_indices[iy, ix] = (
-                            dist1 * ix2 + dist2 * ix1) / (dist1 + dist2)
-            else:
-                new_lats_indices[iy, ix] = -999.
-                new_lats_indices[iy, ix] = -999.
-    new_lats_indices = ma.masked_less(new_lats_indices, 0.)
-    new_lons_indices = ma.masked_less(new_lons_indices, 0.)
-
-    # Regrid the data on each time slice
-    for i in range(len(target_dataset.times)):
-        if len(target_dataset.times) == 1 and target_dataset.values.ndim == 2:
-            values_original = ma.array(target_dataset.values)
-        else:
-            values_original = ma.array(target_dataset.values[i])
-        for shift in (-1, 1):
-            for axis in (0, 1):
-                q_shifted = np.roll(values_original, shift=shift, axis=axis)
-                idx = ~q_shifted.mask * values_original.mask
-                indices = np.where(idx)[0]
-                values_original.data[indices] = q_shifted[indices]
-        new_values[i] = map_coordinates(values_original,
-                                        [new_lats_indices.flatten(),
-                                         new_lons_indices.flatten()],
-                                        order=1).reshape(new_lats.shape)
-        new_values[i] = ma.array(new_values[i], mask=new_lats_indices.mask)
-        # Make a masking map using nearest neighbour interpolation -use this to
-        # determine locations with MDI and mask these
-        qmdi = np.zeros_like(values_original)
-        values_true_indices = np.where(values_original.mask == True)[0]
-        values_false_indices = np.where(values_original.mask == False)[0]
-        qmdi[values_true_indices] = 1.
-        qmdi[values_false_indices] = 0.
-        qmdi_r = map_coordinates(qmdi, [new_lats_indices.flatten(
-        ), new_lons_indices.flatten()], order=1).reshape(new_lats.shape)
-        mdimask = (qmdi_r != 0.0)
-        # Combine missing data mask, with outside domain mask define above.
-        new_values[i].mask = np.logical_or(mdimask, new_values[i].mask)
-
-    # TODO:
-    # This will call down to the _congrid() function and the lat and lon
-    # axis will be adjusted with the time axis being held constant
+        key = RegridWeights.make_key(target_dataset.lats, target_dataset.lons,
+                                     new_lats, new_lons, method=method,
+                                     boundary_check=boundary_check)
+        weights = weights_cache.get_or_build(key, build_weights)
+
+    # Regrid slabs of time steps with one sparse product per slab
+    new_values = weights.apply(target_dataset.values,
+                               time_chunk_size=time_chunk_size).reshape(
+        [len(target_dataset.times), ny_new, nx_new])
 
     # Create a new Dataset Object to return using new data
     regridded_dataset = ds.Dataset(new_latitudes,
@@ -336,6 +250,256 @@ def spatial_regrid(target_dataset, new_latitudes, new_longitudes,
     return regridded_dataset
 
 
+def _calc_grid_indices(lats, lons, new_lats, new_lons, boundary_check=True):
+    '''Calculate the fractional indices of new grid points on the original
+    regular or curvilinear grid.
+
+    :returns: Masked arrays of (lat, lon) float indices with the shape of
+        new_lats. Points outside of the original domain are masked.
+    '''
+    if lons.ndim == 1 and lats.ndim == 1:
+        # Convert new_lats and new_lons to float indices in one shot
+        return _calc_regular_grid_indices(lats, lons, new_lats, new_lons,
+                                          boundary_check=boundary_check)
+    return _calc_curvilinear_grid_indices(lats, lons, new_lats, new_lons,
+                                          boundary_check=boundary_check)
+
+
+def _calc_regular_grid_indices(lats, lons, new_lats, new_lons,
+                               boundary_check=True):
+    '''Calculate the fractional indices of new grid points on a regular grid.
+
+    The indices of every new grid point and the inside-domain test are
+    computed with array operations instead of a loop over the new grid.
+
+    :param lats: 1D array of the original latitudes
+    :type lats: :class:`numpy.ndarray`
+
+    :param lons: 1D array of the original longitudes
+    :type lons: :class:`numpy.ndarray`
+
+    :param new_lats: 2D array of the new latitudes
+    :type new_lats: :class:`numpy.ndarray`
+
+    :param new_lons: 2D array of the new longitudes
+    :type new_lons: :class:`numpy.ndarray`
+
+    :param boundary_check: Mask the new grid points that are outside
+        of the original domain. Otherwise only the points south of the
+        original grid are masked.
+    :type boundary_check: :class:'bool'
+
+    :returns: Masked arrays of (lat, lon) float indices with the shape of
+        new_lats.
+    '''
+    lats = np.asarray(lats, dtype=float)
+    lons = np.asarray(lons, dtype=float)
+    new_lats = np.asarray(new_lats, dtype=float)
+    new_lons = np.asarray(new_lons, dtype=float)
+
+    if not np.all(np.diff(lons) > 0):
+        lons = np.where(lons < 0, lons + 360., lons)
+
+    ny_old = lats.size
+    nx_old = lons.size
+
+    new_lats_indices = (ny_old - 1.) * (new_lats - lats.min()) / (
+        lats.max() - lats.min())
+    new_lons_indices = (nx_old - 1.) * (new_lons - lons.min()) / (
+        lons.max() - lons.min())
+
+    if not boundary_check:
+        # spatial_regrid has always masked only the negative latitude
+        # indices here, leaving the other points off the grid at 0
+        return ma.masked_less(new_lats_indices, 0.), ma.array(new_lons_indices)
+
+    # Boundary vertices of the original domain
+    path = Path([[lons[0], lats[0]], [lons[0], lats[-1]],
+                 [lons[-1], lats[-1]], [lons[-1], lats[0]]])
+    points = np.column_stack((new_lons.ravel(), new_lats.ravel()))
+    outside = ~path.contains_points(points).reshape(new_lats.shape)
+    new_lats_indices[outside] = -999.
+    new_lons_indices[outside] = -999.
+
+    return (ma.masked_outside(new_lats_indices, 0., ny_old - 1.),
+            ma.masked_outside(new_lons_indices, 0., nx_old - 1.))
+
+
+def _calc_curvilinear_grid_indices(lats, lons, new_lats, new_lons,
+                                   boundary_check=True):
+    '''Calculate the fractional indices of new grid points on a curvilinear
+    grid.
+
+    A KD-tree of the original grid is built once and all new grid points are
+    located with a single query.
+
+    :param lats: 2D array of the original latitudes
+    :type lats: :class:`numpy.ndarray`
+
+    :param lons: 2D array of the original longitudes
+    :type lons: :class:`numpy.ndarray`
+
+    :param new_lats: 2D array of the new latitudes
+    :type new_lats: :class:`numpy.ndarray`
+
+    :param new_lons: 2D array of the new longitudes
+    :type new_lons: :class:`numpy.ndarray`
+
+    :param boundary_check: Mask the new grid points that are outside
+        of the original domain
+    :type boundary_check: :class:'bool'
+
+    :returns: Masked arrays of (lat, lon) float indices with the shape of
+        new_lats. Points outside of the original domain are masked.
+    '''
+    grid_index = CurvilinearGridIndex(lats, lons)
+    return grid_index.fractional_indices(new_lats, new_lons,
+                                         boundary_check=boundary_check)
+
+
+def _calc_regrid_weights(lats, lons, new_lats, new_lons, method='bilinear',
+                         boundary_check=True, source_shape=None):
+    '''Calculate the weights regridding the original grid to the new one.
+
+    :param method: 'bilinear', 'inverse_distance' or 'conservative'
+    :type method: :mod:`string`
+
+    :param source_shape: (Optional) Shape of the original values. Defaults to
+        the shape of the original grid.
+    :type source_shape: :func:`tuple`
+
+    :returns: The interpolation weights.
+    :rtype: :class:`regrid_weights.RegridWeights`
+    '''
+    if method == 'conservative':
+        # Reduce a rectilinear new grid to 1D latitudes and longitudes
+        if (new_lats.ndim == 2 and np.all(new_lats == new_lats[:, :1]) and
+                np.all(new_lons == new_lons[:1, :])):
+            new_lats = new_lats[:, 0]
+            new_lons = new_lons[0, :]
+        return RegridWeights.conservative(lats, lons, new_lats, new_lons,
+                                          boundary_check=boundary_check)
+
+    if method == 'inverse_distance':
+        if lats.ndim == 1 and lons.ndim == 1:
+            lons, lats = np.meshgrid(lons, lats)
+        grid_index = CurvilinearGridIndex(lats, lons)
+        return grid_index.inverse_distance_weights(
+            new_lats, new_lons, boundary_check=boundary_check)
+
+    lats_indices, lons_indices = _calc_grid_indices(
+        lats, lons, new_lats, new_lons, boundary_check=boundary_check)
+    if source_shape is None:
+        source_shape = (lats.shape if lats.ndim == 2
+                        else (lats.size, lons.size))
+    return RegridWeights.from_fractional_indices(lats_indices, lons_indices,
+                                                 source_shape,
+                                                 mask_outside=boundary_check)
+
+
+def spatial_coarsen(target_dataset, factor_lat, factor_lon, how='mean',
+                    min_valid_fraction=0.):
+    """ Coarsen a Dataset by reducing blocks of grid points
+
+    Each block of factor_lat x factor_lon grid points becomes one grid point
+    of the new Dataset. Masked values are left out of the reduction. Grid
+    points in the last rows or columns that do not fill a block are dropped.
+
+    :param target_dataset: Dataset object that needs spatially coarsened
+    :type target_dataset: :class:`dataset.Dataset`
+
+    :param factor_lat: Number of latitudes in a block
+    :type factor_lat: :class:`int`
+
+    :param factor_lon: Number of longitudes in a block
+    :type factor_lon: :class:`int`
+
+    :param how: Reduction of the unmasked values of a block: 'mean', 'sum'
+        or 'max'
+    :type how: :mod:`string`
+
+    :param min_valid_fraction: (Optional) Blocks with a smaller fraction
+        of unmasked values are masked. Blocks without any unmasked value are
+        always masked.
+    :type min_valid_fraction: :class:`float`
+
+    :returns: A new spatially coarsened Dataset
+    :rtype: :class:`dataset.Dataset`
+
+    :raises ValueError: If the factors or the reduction are not valid.
+    """
+    if how not in ('mean', 'sum', 'max'):
+        error = ("Reduction '%s' is not supported. Use 'mean', 'sum' or "
+                 "'max'." % how)
+        logger.error(error)
+        raise ValueError(error)
+
+    ny, nx = target_dataset.values.shape[-2:]
+    for factor, npoint in ((factor_lat, ny), (factor_lon, nx)):
+        if int(factor) != factor or not 1 <= factor <= npoint:
+            error = ("Coarsening factor %s must be an integer between 1 and "
+                     "the grid size %d" % (factor, npoint))
+            logger.error(error)
+            raise ValueError(error)
+    factor_lat = int(factor_lat)
+    factor_lon = int(factor_lon)
+    ny2 = ny // factor_lat
+    nx2 = nx // factor_lon
+    if ny % factor_lat != 0 or nx % factor_lon != 0:
+        logger.warning('Grid points that do not fill a block are dropped')
+
+    def blocks(array):
+        # View of shape (..., ny2, factor_lat, nx2, factor_lon)
+        array = array[..., :ny2 * factor_lat, :nx2 * factor_lon]
+        return array.reshape(array.shape[:-2] +
+                             (ny2, factor_lat, nx2, factor_lon))
+
+    values = ma.asanyarray(target_dataset.values)
+    data = blocks(ma.getdata(values))
+    block_axes = (-3, -1)
+    if values.mask is ma.nomask:
+        valid = True
+        count = np.full(data.shape[:-4] + (ny2, nx2),
+                        factor_lat * factor_lon)
+    else:
+        valid = blocks(~values.mask)
+        count = valid.sum(axis=block_axes)
+
+    if how == 'max':
+        if np.issubdtype(data.dtype, np.floating):
+            initial = -np.inf
+        else:
+            initial = np.iinfo(data.dtype).min
+        new_data = np.max(data, axis=block_axes, where=valid, initial=initial)
+    else:
+        new_data = np.sum(data, axis=block_axes, where=valid)
+        if how == 'mean':
+            with np.errstate(invalid='ignore', divide='ignore'):
+                new_data = new_data / count
+
+    new_mask = (count == 0) | (count < min_valid_fraction *
+                               factor_lat * factor_lon)
+    new_values = ma.array(new_data, mask=new_mask)
+
+    if target_dataset.lats.ndim == 1 and target_dataset.lons.ndim == 1:
+        new_lats = target_dataset.lats[:ny2 * factor_lat].reshape(
+            ny2, factor_lat).mean(axis=1)
+        new_lons = target_dataset.lons[:nx2 * factor_lon].reshape(
+            nx2, factor_lon).mean(axis=1)
+    else:
+        new_lats = blocks(target_dataset.lats).mean(axis=block_axes)
+        new_lons = blocks(target_dataset.lons).mean(axis=block_axes)
+
+    return ds.Dataset(new_lats,
+                      new_lons,
+                      target_dataset.times,
+                      new_values,
+                      variable=target_dataset.variable,
+                      units=target_dataset.units,
+                      name=target_dataset.name,
+                      origin=target_dataset.origin)
+
+
 def ensemble(datasets):
     """
     Generate a single dataset which is the mean of the input datasets
@@ -401,10 +565,12 @@ def subset(target_dataset, subregion, subregion_name=None, extract=True, user_ma
         _are_bounds_contained_by_dataset(target_dataset, subregion)
 
         if target_dataset.lats.ndim == 2 and target_dataset.lons.ndim == 2:
+            start, end = utils.times_to_offsets(
+                [subregion.start, subregion.end], target_dataset.calendar)
             start_time_index = np.where(
-                target_dataset.times >= subregion.start)[0][0]
+                target_dataset.time_offsets >= start)[0][0]
             end_time_index = np.where(
-                target_dataset.times <= subregion.end)[0][-1]
+                target_dataset.time_offsets <= end)[0][-1]
             target_dataset = temporal_slice(
                 target_dataset, start_time_index, end_time_index)
             nt, ny, nx = target_dataset.values.shape
@@ -423,6 +589,18 @@ def subset(target_dataset, subregion, subregion_name=None, extract=True, user_ma
             # Get subregion indices into subregion data
             dataset_slices = _get_subregion_slice_indices(target_dataset,
                                                           subregion)
+            if isinstance(target_dataset, ds.LazyDataset):
+                # Record the selection so that only the subregion is read
+                subset_dataset = target_dataset.select(
+                    time=slice(dataset_slices["time_start"],
+                               dataset_slices["time_end"] + 1),
+                    lat=slice(dataset_slices["lat_start"],
+                              dataset_slices["lat_end"] + 1),
+                    lon=slice(dataset_slices["lon_start"],
+                              dataset_slices["lon_end"] + 1))
+                subset_dataset.name = subregion_name
+                return subset_dataset
+
             # Slice the values array with our calculated slice indices
             if target_dataset.values.ndim == 2:
                 subset_values = ma.zeros([len(target_dataset.values[
@@ -500,7 +678,9 @@ def temporal_slice(target_dataset, start_time_index, end_time_index):
     :param target_dataset: The Dataset object to subset.
     :type target_dataset: :class:`dataset.Dataset`
 
-    :returns: The subset-ed Dataset object
+    :returns: The subset-ed Dataset object. A
+        :class:`dataset.LazyDataset` is not modified and a new selection of
+        it is returned instead.
     :rtype: :class:`dataset.Dataset`
 
     :raises: ValueError
@@ -509,6 +689,8 @@ def temporal_slice(target_dataset, start_time_index, end_time_index):
     end_date = target_dataset.times[end_time_index]
     timeStart = min(np.nonzero(target_dataset.times >= start_date)[0])
     timeEnd = max(np.nonzero(target_dataset.times <= end_date)[0])
+    if isinstance(target_dataset, ds.LazyDataset):
+        return target_dataset.select(time=slice(timeStart, timeEnd + 1))
     target_dataset.times = target_dataset.times[timeStart:timeEnd + 1]
     target_dataset.values = target_dataset.values[timeStart:timeEnd + 1, :]
 
@@ -827,28 +1009,28 @@ def _rcmes_normalize_datetimes(datetimes, timestep):
     :type timestep: String
     """
 
+    datetimes = np.asarray(datetimes)
+    calendar = utils.get_calendar(datetimes)
+    offsets = utils.times_to_offsets(datetimes, calendar)
+
     normalDatetimes = []
     if timestep.lower() == 'monthly':
-        for inputDatetime in datetimes:
-            if inputDatetime.day != 1:
-                # Clean the inputDatetime
-                inputDatetimeString = inputDatetime.strftime('%Y%m%d')
-                normalInputDatetimeString = inputDatetimeString[:6] + '01'
-                inputDatetime = datetime.datetime.strptime(
-                    normalInputDatetimeString, '%Y%m%d')
-
-            normalDatetimes.append(inputDatetime)
+        years, months, days = utils.time_fields(offsets, calendar)
+        normalDatetimes = datetimes.copy()
+        # Clean the datetimes that are not on the first of the month
+        index = days != 1
+        normalDatetimes[index] = utils.fields_to_times(
+            years[index], months[index], np.ones(index.sum(), dtype=int),
+            calendar)
+        normalDatetimes = list(normalDatetimes)
 
     elif timestep.lower() == 'daily':
-        for inputDatetime in datetimes:
-            if (inputDatetime.hour != 0 or inputDatetime.minute != 0 or
-                    inputDatetime.second != 0):
-                datetimeString = inputDatetime.strftime('%Y%m%d%H%M%S')
-                normalDatetimeString = datetimeString[:8] + '000000'
-                inputDatetime = datetime.datetime.strptime(
-                    normalDatetimeString, '%Y%m%d%H%M%S')
-
-            normalDatetimes.append(inputDatetime)
+        normalDatetimes = datetimes.copy()
+        seconds = offsets % 86400
+        index = seconds != 0
+        normalDatetimes[index] = utils.offsets_to_times(
+            offsets[index] - seconds[index], calendar)
+        normalDatetimes = list(normalDatetimes)
 
     return normalDatetimes
 
@@ -859,17 +1041,12 @@ def mask_missing_data(dataset_array):
     the values at the grid point in all other datasets are masked.
     :param dataset_array: an array of OCW datasets
     '''
-
-    mask_array = np.zeros(dataset_array[0].values.shape)
+    mask_array = np.zeros(dataset_array[0].values.shape, dtype=bool)
     for dataset in dataset_array:
-        index = np.where(dataset.values.mask == True)
-        if index[0].size > 0:
-            mask_array[index] = 1
-    masked_array = []
+        mask_array |= ma.getmaskarray(dataset.values)
     for dataset in dataset_array:
         dataset.values = ma.array(dataset.values, mask=mask_array)
-        masked_array.append(dataset)
-    return [masked_dataset for masked_dataset in masked_array]
+    return list(dataset_array)
 
 
 def deseasonalize_dataset(dataset):
@@ -883,22 +1060,15 @@ def deseasonalize_dataset(dataset):
     :rtype: :class:`dataset.Dataset`
     '''
 
-    days = [d.month * 100. + d.day for d in dataset.times]
-    days_sorted = np.unique(days)
-    ndays = days_sorted.size
-    nt, ny, nx = dataset.values.shape
-    values_clim = ma.zeros([ndays, ny, nx])
-    for iday, day in enumerate(days_sorted):
-        t_index = np.where(days == day)[0]
-        values_clim[iday, :] = ma.mean(dataset.values[t_index, :], axis=0)
-    for iday, day in enumerate(days_sorted):
-        t_index = np.where(days == day)[0]
-        dataset.values[t_index, :] = dataset.values[
-            t_index, :] - values_clim[iday, :]
+    _, months, days = dataset.time_fields()
+    codes = np.unique(months * 100 + days, return_inverse=True)[1].ravel()
+    values_clim = _group_reduce(dataset.values, codes)
+    dataset.values = dataset.values - values_clim[codes]
     return dataset
 
 
-def _rcmes_spatial_regrid(spatial_values, lat, lon, lat2, lon2, order=1):
+def _rcmes_spatial_regrid(spatial_values, lat, lon, lat2, lon2, order=1,
+                          weights_cache=None):
     '''
     Spatial regrid from one set of lat,lon values onto a new set (lat2,lon2)
 
@@ -914,6 +1084,9 @@ def _rcmes_spatial_regrid(spatial_values, lat, lon, lat2, lon2, order=1):
     :type lon2: 2d numpy array. shape(latitudes, longitudes)
     :param order: Interpolation order flag.  1=bi-linear, 3=cubic spline
     :type order: [optional] Integer
+    :param weights_cache: (Optional) Cache of bi-linear interpolation weights
+        shared between calls on the same pair of grids. Only used if order=1.
+    :type weights_cache: :class:`regrid_weights.RegridWeightsCache`
 
     :returns: 2d masked numpy array with shape(len(lat2), len(lon2))
     :rtype: (float, float)
@@ -925,33 +1098,21 @@ def _rcmes_spatial_regrid(spatial_values, lat, lon, lat2, lon2, order=1):
     nlat2 = lat2.shape[0]
     nlon2 = lon2.shape[1]
 
-    # To make our lives easier down the road, let's
-    # turn these into arrays of x & y coords
-    loni = lon2.ravel()
-    lati = lat2.ravel()
+    if weights_cache is not None and order == 1:
+        key = RegridWeights.make_key(lat, lon, lat2, lon2,
+                                     method='rcmes_bilinear')
 
-    loni = loni.copy()  # NB. it won't run unless you do this...
-    lati = lati.copy()
+        def build_weights():
+            lati, loni = _rcmes_calc_indices(lat, lon, lat2, lon2)
+            return RegridWeights.from_fractional_indices(
+                lati.reshape([nlat2, nlon2]), loni.reshape([nlat2, nlon2]),
+                (nlat, nlon),
+                outside_mask=_rcmes_outside_domain_mask(lat, lon, lat2, lon2))
 
-    # Now, we'll set points outside the boundaries to lie along an edge
-    loni_max_indices = np.where(loni > lon.max())
-    loni_min_indices = np.where(loni < lon.min())
-    loni[loni_max_indices] = lon.max()
-    loni[loni_min_indices] = lon.min()
+        weights = weights_cache.get_or_build(key, build_weights)
+        return weights.apply(spatial_values)
 
-    # To deal with the "hard" break, we'll have to treat y differently,
-    # so we're just setting the min here...
-    lati_max_indices = np.where(lati > lat.max())
-    lati_min_indices = np.where(lati < lat.min())
-    lati[lati_max_indices] = lat.max()
-    lati[lati_min_indices] = lat.min()
-
-    # We need to convert these to (float) indicies
-    #   (xi should range from 0 to (nx - 1), etc)
-    loni = (nlon - 1) * (loni - lon.min()) / (lon.max() - lon.min())
-
-    # Deal with the "hard" break in the y-direction
-    lati = (nlat - 1) * (lati - lat.min()) / (lat.max() - lat.min())
+    lati, loni = _rcmes_calc_indices(lat, lon, lat2, lon2)
 
     """
     TODO: Review this docstring and see if it still holds true.
@@ -974,6 +1135,8 @@ def _rcmes_spatial_regrid(spatial_values, lat, lon, lat2, lon2, order=1):
     gradients when interpolating Preserve MDI mask, by only changing data part
     of masked array object.
     """
+    spatial_values = ma.array(spatial_values,
+                              mask=ma.getmaskarray(spatial_values))
     for shift in (-1, 1):
         for axis in (0, 1):
             q_shifted = np.roll(spatial_values, shift=shift, axis=axis)
@@ -991,18 +1154,15 @@ def _rcmes_spatial_regrid(spatial_values, lat, lon, lat2, lon2, order=1):
     regridded_values = regridded_values.reshape([nlat2, nlon2])
 
     # Set values to missing data outside of original domain
-    regridded_values = ma.masked_array(regridded_values,
-                                       mask=np.logical_or(
-                                           np.logical_or(lat2 >= lat.max(),
-                                                         lat2 <= lat.min()),
-                                           np.logical_or(lon2 <= lon.min(),
-                                                         lon2 >= lon.max())))
+    regridded_values = ma.masked_array(
+        regridded_values,
+        mask=_rcmes_outside_domain_mask(lat, lon, lat2, lon2))
 
     # Make second map using nearest neighbour interpolation -use this to
     # determine locations with MDI and mask these
     qmdi = np.zeros_like(spatial_values)
     spatial_indices_true = np.where(spatial_values.mask)
-    spatial_indices_false = np.where(not spatial_values.mask)
+    spatial_indices_false = np.where(~spatial_values.mask)
     qmdi[spatial_indices_true] = 1.
     qmdi[spatial_indices_false] = 0.
     qmdi_r = map_coordinates(qmdi, [lati, loni], order=order)
@@ -1015,6 +1175,60 @@ def _rcmes_spatial_regrid(spatial_values, lat, lon, lat2, lon2, order=1):
     return regridded_values
 
 
+def _rcmes_calc_indices(lat, lon, lat2, lon2):
+    '''
+    Convert the NEW (lat2, lon2) grid points into float indices on the
+    (lat, lon) grid. Points outside of the grid are set to lie along an edge.
+
+    :returns: Flattened (lat, lon) float indices
+    :rtype: (1d numpy array, 1d numpy array)
+    '''
+    nlat = lat.shape[0]
+    nlon = lon.shape[1]
+
+    # To make our lives easier down the road, let's
+    # turn these into arrays of x & y coords
+    loni = lon2.ravel()
+    lati = lat2.ravel()
+
+    loni = loni.copy()  # NB. it won't run unless you do this...
+    lati = lati.copy()
+
+    # Now, we'll set points outside the boundaries to lie along an edge
+    loni_max_indices = np.where(loni > lon.max())
+    loni_min_indices = np.where(loni < lon.min())
+    loni[loni_max_indices] = lon.max()
+    loni[loni_min_indices] = lon.min()
+
+    # To deal with the "hard" break, we'll have to treat y differently,
+    # so we're just setting the min here...
+    lati_max_indices = np.where(lati > lat.max())
+    lati_min_indices = np.where(lati < lat.min())
+    lati[lati_max_indices] = lat.max()
+    lati[lati_min_indices] = lat.min()
+
+    # We need to convert these to (float) indicies
+    #   (xi should range from 0 to (nx - 1), etc)
+    loni = (nlon - 1) * (loni - lon.min()) / (lon.max() - lon.min())
+
+    # Deal with the "hard" break in the y-direction
+    lati = (nlat - 1) * (lati - lat.min()) / (lat.max() - lat.min())
+
+    return lati, loni
+
+
+def _rcmes_outside_domain_mask(lat, lon, lat2, lon2):
+    '''
+    Mask the NEW (lat2, lon2) grid points outside of the (lat, lon) domain.
+
+    :returns: 2d boolean array with the shape of lat2
+    '''
+    return np.logical_or(np.logical_or(lat2 >= lat.max(),
+                                       lat2 <= lat.min()),
+                         np.logical_or(lon2 <= lon.min(),
+                                       lon2 >= lon.max()))
+
+
 def _rcmes_create_mask_using_threshold(masked_array, threshold=0.5):
     '''Mask an array if percent of values missing data is above a threshold.
 
@@ -1052,7 +1266,8 @@ def _rcmes_create_mask_using_threshold(masked_array, threshold=0.5):
     return mymask
 
 
-def _rcmes_calc_average_on_new_time_unit(data, dates, unit):
+def _rcmes_calc_average_on_new_time_unit(data, dates, unit, how='mean',
+                                         fields=None):
     """ Rebin 3d array and list of dates using the provided unit parameter
 
     :param data: Input data that needs to be averaged
@@ -1062,6 +1277,12 @@ def _rcmes_calc_average_on_new_time_unit(data, dates, unit):
     :param unit: Time unit to average the data into
     :type unit: String matching one of these values :
         full | annual | monthly | daily
+    :param how: (Optional) Reduction of the unmasked values in each bin:
+        mean | sum | min | max | count
+    :type how: String
+    :param fields: (Optional) Years, months and days of the dates, as from
+        :meth:`dataset.Dataset.time_fields`
+    :type fields: Tuple of integer numpy arrays
 
     :returns: meanstorem, newTimesList
     :rtype: 3D numpy masked array the same shape as the input array,
@@ -1076,67 +1297,129 @@ def _rcmes_calc_average_on_new_time_unit(data, dates, unit):
         raise ValueError('Error: unknown unit type selected '
                          'for time averaging: EXIT')
 
-    nt, ny, nx = data.shape
     if unit == 'full':
-        new_data = ma.mean(data, axis=0)
-        new_date = [dates[dates.size // 2]]
+        new_data = _group_reduce(data, np.zeros(len(dates), dtype=int),
+                                 how=how)[0]
+        return new_data, np.array([dates[dates.size // 2]])
+
+    calendar = utils.get_calendar(dates)
+    if fields is None:
+        fields = _datetime_fields(dates)
+    keys, first_index, codes = np.unique(
+        _time_unit_keys(fields, unit, calendar), return_index=True,
+        return_inverse=True)
+    new_data = _group_reduce(data, codes.ravel(), how=how)
+
+    years, months, days = [field[first_index] for field in fields]
     if unit == 'annual':
-        years = [d.year for d in dates]
-        years_sorted = np.unique(years)
-        new_data = ma.zeros([years_sorted.size, ny, nx])
-        it = 0
-        new_date = []
-        for year in years_sorted:
-            index = np.where(years == year)[0]
-            new_data[it, :] = ma.mean(data[index, :], axis=0)
-            new_date.append(datetime.datetime(year=year, month=7, day=2))
-            it = it + 1
-    if unit == 'monthly':
-        years = [d.year for d in dates]
-        years_sorted = np.unique(years)
-        months = [d.month for d in dates]
-        months_sorted = np.unique(months)
-
-        new_data = ma.zeros([years_sorted.size * months_sorted.size, ny, nx])
-        it = 0
-        new_date = []
-        for year in years_sorted:
-            for month in months_sorted:
-                index = np.where((years == year) & (months == month))[0]
-                new_data[it, :] = ma.mean(data[index, :], axis=0)
-                new_date.append(datetime.datetime(year=year,
-                                                  month=month,
-                                                  day=15))
-                it = it + 1
-    if unit == 'daily':
-        days = [d.year * 10000. + d.month * 100. + d.day for d in dates]
-        days_sorted = np.unique(days)
-
-        new_data = ma.zeros([days_sorted.size, ny, nx])
-        it = 0
-        new_date = []
-        for day in days_sorted:
-            index = np.where(days == day)[0]
-            new_data[it, :] = ma.mean(data[index, :], axis=0)
-            y = int(day // 10000)
-            m = int(day % 10000) // 100
-            d = int(day % 100)
-            new_date.append(datetime.datetime(year=y, month=m, day=d))
-            it = it + 1
-
-    return new_data, np.array(new_date)
+        months = np.full_like(years, 7)
+        days = np.full_like(years, 2)
+    elif unit == 'monthly':
+        days = np.full_like(years, 15)
+    new_date = utils.fields_to_times(years, months, days, calendar)
+
+    return new_data, new_date
+
+
+def _datetime_fields(dates):
+    """ Split dates into arrays of years, months and days
+
+    :param dates: Dates to split
+    :type dates: Python datetime or cftime datetime objects
+
+    :returns: Integer arrays of years, months and days
+    """
+    calendar = utils.get_calendar(dates)
+    return utils.time_fields(utils.times_to_offsets(dates, calendar),
+                             calendar)
+
+
+def _group_reduce(values, codes, how='mean'):
+    """ Reduce groups of values along the time axis in one pass
+
+    :param values: Masked array of shape (times, ...)
+    :type values: :class:`numpy.ma.MaskedArray`
+    :param codes: Group number of each time, from 0 to the number of groups
+        - 1. Every group must have at least one time.
+    :type codes: :class:`numpy.ndarray`
+    :param how: Reduction of the unmasked values of each group:
+        mean | sum | min | max | count
+    :type how: String
+
+    :returns: Masked array of shape (groups, ...). Groups without an
+        unmasked value are masked.
+    :raises: ValueError
+    """
+    if how not in ('mean', 'sum', 'min', 'max', 'count'):
+        error = ("Reduction '%s' is not supported. Use 'mean', 'sum', "
+                 "'min', 'max' or 'count'." % how)
+        logger.error(error)
+        raise ValueError(error)
+
+    values = ma.asanyarray(values)
+    codes = np.asarray(codes)
+    data = ma.getdata(values)
+    mask = values.mask
+    if np.any(np.diff(codes) < 0):
+        order = np.argsort(codes, kind='stable')
+        codes = codes[order]
+        data = data[order]
+        if mask is not ma.nomask:
+            mask = mask[order]
+    starts = np.flatnonzero(np.r_[True, np.diff(codes) != 0])
+
+    if mask is ma.nomask:
+        group_sizes = np.diff(np.r_[starts, len(codes)])
+        counts = np.empty((len(starts),) + data.shape[1:], dtype=np.intp)
+        counts[:] = group_sizes.reshape((-1,) + (1,) * (data.ndim - 1))
+    else:
+        counts = np.add.reduceat(~mask, starts, axis=0, dtype=np.intp)
+        if how != 'count':
+            if how == 'min' or how == 'max':
+                fill = _reduction_identity(data.dtype, how)
+            else:
+                fill = 0
+            data = np.where(mask, fill, data)
+
+    if how == 'count':
+        return ma.array(counts)
+    if how == 'min':
+        new_data = np.minimum.reduceat(data, starts, axis=0)
+    elif how == 'max':
+        new_data = np.maximum.reduceat(data, starts, axis=0)
+    else:
+        new_data = np.add.reduceat(data, starts, axis=0)
+        if how == 'mean':
+            with np.errstate(invalid='ignore', divide='ignore'):
+                new_data = new_data / counts
+    return ma.array(new_data, mask=counts == 0)
+
+
+def _reduction_identity(dtype, how):
+    """ Value of dtype that never wins a min or max reduction """
+    if np.issubdtype(dtype, np.floating):
+        return np.inf if how == 'min' else -np.inf
+    info = np.iinfo(dtype)
+    return info.max if how == 'min' else info.min
 
 
 def _rcmes_calc_average_on_new_time_unit_K(data, dates, unit):
     """ Rebin 3d array and list of dates using the provided unit parameter
 
+    Each time unit is averaged on its own slice of data. Points with more
+    than 75% of missing data in a time unit are masked.
+
     :param data: Input data that needs to be averaged
     :type data: 3D masked numpy array of shape (times, lats, lons)
     :param dates: List of dates that correspond to the given data values
     :type dates: Python datetime objects
     :param unit: Time unit to average the data into
     :type unit: String matching one of these values :
-                full | annual | monthly | daily
+                full | annual | seasonal | monthly | pentad | daily
+                Seasons are DJF, MAM, JJA and SON, with December in the
+                season of the following year. Pentads are the 73 five-day
+                periods of a year, with February 29 in the pentad of
+                February 28.
 
     :returns: meanstorem, newTimesList
     :rtype: 3D numpy masked array the same shape as the input array,
@@ -1145,136 +1428,144 @@ def _rcmes_calc_average_on_new_time_unit_K(data, dates, unit):
     """
 
     # Check if the user-selected temporal grid is valid. If not, EXIT
-    acceptable = ((unit == 'full') | (unit == 'annual') |
-                  (unit == 'monthly') | (unit == 'daily'))
+    acceptable = unit in ('full', 'annual', 'seasonal', 'monthly', 'pentad',
+                          'daily')
     if not acceptable:
         raise ValueError('Error: unknown unit type selected '
                          'for time averaging: EXIT')
 
-    # Calculate arrays of: annual timeseries: year (2007,2007),
-    #                      monthly time series: year-month (200701,200702),
-    #                      daily timeseries: year-month-day (20070101,20070102)
-    #  depending on user-selected averaging period.
+    dates = np.asarray(dates)
+    calendar = utils.get_calendar(dates)
+    fields = _datetime_fields(dates)
+    timeunits = _time_unit_keys(fields, unit, calendar)
+    unique_times, first_index, codes = np.unique(
+        timeunits, return_index=True, return_inverse=True)
+    codes = codes.ravel()
 
-    # Year list
-    if unit == 'annual':
-        timeunits = np.array([int(d.strftime("%Y")) for d in dates])
-        unique_times = np.unique(timeunits)
-
-    # YearMonth format list
-    if unit == 'monthly':
-        timeunits = np.array([int(d.strftime("%Y%m")) for d in dates])
-        unique_times = np.unique(timeunits)
-
-    # YearMonthDay format list
-    if unit == 'daily':
-        timeunits = np.array([int(d.strftime("%Y%m%d")) for d in dates])
-        unique_times = np.unique(timeunits)
-
-    # TODO: add pentad setting using Julian days?
-
-    # Full list: a special case
+    # construct new times list
     if unit == 'full':
-        # Calculating means data over the entire time range:
-        # i.e., annual-mean climatology
-        timeunits = []
-        for i in np.arange(len(dates)):
-            # i.e. we just want the same value for all times.
-            timeunits.append(999)
-        timeunits = np.array(timeunits, dtype=int)
-        unique_times = np.unique(timeunits)
-
-    # empty list to store new times
-    newTimesList = []
+        # Mid-point of the entire time span
+        halfway = dates[0] + (dates[-1] - dates[0]) / 2
+        start_fields = ([halfway.year], [halfway.month], [halfway.day])
+    else:
+        start_fields = _time_unit_start(
+            [field[first_index] for field in fields], unit, calendar)
+    newTimesList = list(utils.fields_to_times(*start_fields,
+                                              calendar=calendar))
 
     # Decide whether or not you need to do any time averaging.
     #   i.e. if data are already on required time unit then just
-    #        pass data through and calculate and return representative
-    #        datetimes.
-    processing_required = True
-    if len(timeunits) == (len(unique_times)):
-        processing_required = False
+    #        pass data through.
+    if len(timeunits) == len(unique_times):
+        return data, newTimesList
+
+    # Contiguous time units are sliced, others are gathered by index
+    contiguous = np.all(np.diff(codes) >= 0)
+    if contiguous:
+        bounds = np.r_[np.flatnonzero(np.r_[True, np.diff(codes) != 0]),
+                       len(codes)]
+    else:
+        order = np.argsort(codes, kind='stable')
+        bounds = np.searchsorted(codes[order], np.arange(len(unique_times)
+                                                         + 1))
+
+    meanstore = np.zeros((len(unique_times),) + data.shape[1:])
+    datamask_store = np.zeros(meanstore.shape, dtype=bool)
+    for i in range(len(unique_times)):
+        if contiguous:
+            chunk = data[bounds[i]:bounds[i + 1]]
+        else:
+            chunk = data[order[bounds[i]:bounds[i + 1]]]
+        chunk = ma.asanyarray(chunk)
+        meanstore[i] = ma.getdata(ma.average(chunk, axis=0))
+        if data.ndim == 3:
+            # Calculate missing data mask within each time unit
+            datamask_store[i] = _rcmes_create_mask_using_threshold(
+                chunk, threshold=0.75)
 
-    # 1D data arrays, i.e. time series
     if data.ndim == 1:
-        # Create array to store the resulting data
-        meanstore = np.zeros(len(unique_times))
-
-        # Calculate the means across each unique time unit
-        i = 0
-        for myunit in unique_times:
-            if processing_required:
-                datam = ma.masked_array(data, timeunits != myunit)
-                meanstore[i] = ma.average(datam)
-
-            # construct new times list
-            yyyy, mm, dd = _create_new_year_month_day(myunit, dates)
-            newTimesList.append(datetime.datetime(yyyy, mm, dd, 0, 0, 0, 0))
-            i = i + 1
-
-    # 3D data arrays
-    if data.ndim == 3:
-        # Create array to store the resulting data
-        meanstore = np.zeros([len(unique_times), data.shape[1], data.shape[2]])
-
-        # Calculate the means across each unique time unit
-        i = 0
-        datamask_store = []
-        for myunit in unique_times:
-            if processing_required:
-                mask = np.zeros_like(data)
-                mask[timeunits != myunit, :, :] = 1.0
-                # Calculate missing data mask within each time unit...
-                datamask_at_this_timeunit = np.zeros_like(data)
-                datamask_at_this_timeunit[:] = _rcmes_create_mask_using_threshold(
-                    data[timeunits == myunit, :, :], threshold=0.75)
-                # Store results for masking later
-                datamask_store.append(datamask_at_this_timeunit[0])
-                # Calculate means for each pixel in this time unit, ignoring
-                # missing data (using masked array).
-                datam = ma.masked_array(data, np.logical_or(mask,
-                                                            datamask_at_this_timeunit))
-                meanstore[i, :, :] = ma.average(datam, axis=0)
-            # construct new times list
-            yyyy, mm, dd = _create_new_year_month_day(myunit, dates)
-            newTimesList.append(datetime.datetime(yyyy, mm, dd))
-            i += 1
-
-        if not processing_required:
-            meanstorem = data
-
-        if processing_required:
-            # Create masked array (using missing data mask defined above)
-            datamask_store = np.array(datamask_store)
-            meanstorem = ma.masked_array(meanstore, datamask_store)
+        return meanstore, newTimesList
 
+    # Create masked array (using missing data mask defined above)
+    meanstorem = ma.masked_array(meanstore, datamask_store)
     return meanstorem, newTimesList
 
 
-def _create_new_year_month_day(time_unit, dates):
-    smyunit = str(time_unit)
-    if len(smyunit) == 4:  # YYYY
-        yyyy = int(smyunit[0:4])
-        mm = 1
-        dd = 1
-    elif len(smyunit) == 6:  # YYYYMM
-        yyyy = int(smyunit[0:4])
-        mm = int(smyunit[4:6])
-        dd = 1
-    elif len(smyunit) == 8:  # YYYYMMDD
-        yyyy = int(smyunit[0:4])
-        mm = int(smyunit[4:6])
-        dd = int(smyunit[6:8])
-    elif len(smyunit) == 3:  # Full time range
-        # Need to set an appropriate time representing the mid-point of the
-        # entire time span
-        dt = dates[-1] - dates[0]
-        halfway = dates[0] + (dt / 2)
-        yyyy = int(halfway.year)
-        mm = int(halfway.month)
-        dd = int(halfway.day)
-
-    return (yyyy, mm, dd)
+def _time_unit_keys(fields, unit, calendar='standard'):
+    """ Integer key of the time unit of each date
+
+    :param fields: Years, months and days of the dates
+    :type fields: Tuple of integer numpy arrays
+    :param unit: full | annual | seasonal | monthly | pentad | daily
+    :type unit: String
+    :param calendar: The calendar of the dates
+    :type calendar: String
+
+    :returns: Integer array with one key per date. Keys increase with time.
+    """
+    years, months, days = fields
+    if unit == 'full':
+        return np.zeros(len(years), dtype=int)
+    if unit == 'annual':
+        return years
+    if unit == 'seasonal':
+        # December belongs to DJF of the following year
+        return (years + (months == 12)) * 4 + (months % 12) // 3
+    if unit == 'monthly':
+        return years * 12 + months - 1
+    if unit == 'pentad':
+        return years * 73 + _day_of_year(months, days, calendar) // 5
+    return (years * 12 + months - 1) * 31 + days - 1
+
+
+# Day of the year (from 0) of the first day of each month in a 365 day year
+_NOLEAP_MONTH_START_DAYS = np.array([0, 31, 59, 90, 120, 151, 181, 212, 243,
+                                     273, 304, 334])
+
+
+def _day_of_year(months, days, calendar='standard'):
+    """ Day of the year (from 0) of dates, ignoring February 29
+
+    February 29 gets the day of February 28, so that a day of the year
+    has the same month and day in all years.
+    """
+    if calendar == '360_day':
+        return (months - 1) * 30 + days - 1
+    day_of_year = _NOLEAP_MONTH_START_DAYS[months - 1] + days - 1
+    return day_of_year - ((months == 2) & (days == 29))
+
+
+def _time_unit_start(fields, unit, calendar='standard'):
+    """ First day of the time units of dates
+
+    :param fields: Years, months and days of the dates
+    :type fields: Tuple of integer numpy arrays
+    :param unit: annual | seasonal | monthly | pentad | daily
+    :type unit: String
+    :param calendar: The calendar of the dates
+    :type calendar: String
+
+    :returns: Years, months and days of the first days
+    """
+    years, months, days = fields
+    ones = np.ones_like(years)
+    if unit == 'annual':
+        return years, ones, ones
+    if unit == 'seasonal':
+        start_months = np.where((months == 12) | (months < 3), 12,
+                                months - months % 3)
+        return years - (months < 3), start_months, ones
+    if unit == 'monthly':
+        return years, months, ones
+    if unit == 'pentad':
+        start = _day_of_year(months, days, calendar) // 5 * 5
+        if calendar == '360_day':
+            return years, start // 30 + 1, start % 30 + 1
+        start_months = np.searchsorted(_NOLEAP_MONTH_START_DAYS, start,
+                                       side='right')
+        return (years, start_months,
+                start - _NOLEAP_MONTH_START_DAYS[start_months - 1] + 1)
+    return years, months, days
 
 
 def _congrid(a, newdims, method='linear', centre=False, minusone=False):
@@ -1455,12 +1746,17 @@ def _are_bounds_contained_by_dataset(dataset, bounds):
                  " lon_max: %s" % (bounds.lon_max, lon_min, lon_max))
         errors.append(error)
 
-    if not start <= bounds.start <= end:
+    start_offset, end_offset = dataset.time_offsets[[
+        np.argmin(dataset.time_offsets), np.argmax(dataset.time_offsets)]]
+    bounds_start, bounds_end = utils.times_to_offsets(
+        [bounds.start, bounds.end], dataset.calendar)
+
+    if not start_offset <= bounds_start <= end_offset:
         error = ("bounds.start: %s is not between start: %s and end: %s" %
                  (bounds.start, start, end))
         errors.append(error)
 
-    if not start <= bounds.end <= end:
+    if not start_offset <= bounds_end <= end_offset:
         error = ("bounds.end: %s is not between start: %s and end: %s" %
                  (bounds.end, start, end))
         errors.append(error)
@@ -1489,8 +1785,18 @@ def _get_subregion_slice_indices(target_dataset, subregion):
     lonStart = min(np.nonzero(target_dataset.lons >= subregion.lon_min)[0])
     lonEnd = max(np.nonzero(target_dataset.lons <= subregion.lon_max)[0])
 
-    timeStart = min(np.nonzero(target_dataset.times >= subregion.start)[0])
-    timeEnd = max(np.nonzero(target_dataset.times <= subregion.end)[0])
+    offsets = target_dataset.time_offsets
+    start, end = utils.times_to_offsets([subregion.start, subregion.end],
+                                        target_dataset.calendar)
+    if np.all(np.diff(offsets) >= 0):
+        timeStart = np.searchsorted(offsets, start, side='left')
+        timeEnd = np.searchsorted(offsets, end, side='right') - 1
+        if timeStart > timeEnd:
+            raise ValueError('No times of the Dataset are within the '
+                             'subregion')
+    else:
+        timeStart = min(np.nonzero(offsets >= start)[0])
+        timeEnd = max(np.nonzero(offsets <= end)[0])
 
     return {
         "lat_start": latStart,
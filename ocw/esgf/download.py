@@ -17,56 +17,152 @@
 # under the License.
 #
 '''
-RCMES module to download a file from ESGF.
+RCMES module to download files from ESGF.
 
+Files are streamed to disk in chunks through a pooled HTTP session
+authenticated with the ESGF X.509 certificate. Partial downloads are
+resumed with HTTP Range requests, the checksums published by the ESGF
+search service are verified, and files already downloaded are skipped.
 '''
 
-import urllib2
-import httplib
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import os
 from os.path import expanduser, join
 
+import requests
+
 from ocw.esgf.constants import ESGF_CREDENTIALS
 
+# Number of bytes written to disk at a time
+CHUNK_SIZE = 1024 * 1024
+
 
-class HTTPSClientAuthHandler(urllib2.HTTPSHandler):
+def create_session(max_workers=1):
     '''
-    HTTP handler that transmits an X509 certificate as part of the request
+    Create an HTTP session for downloading from ESGF.
+
+    The session presents the certificate retrieved by
+    :func:`ocw.esgf.logon.logon`, keeps the ESGF cookies and pools up to
+    max_workers connections per host.
+
+    :param max_workers: the number of concurrent transfers the session is for
     '''
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_maxsize=max_workers)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+
+    certFile = expanduser(ESGF_CREDENTIALS)
+    if os.path.exists(certFile):
+        session.cert = (certFile, certFile)
+    return session
 
-    def __init__(self, key, cert):
-        urllib2.HTTPSHandler.__init__(self)
-        self.key = key
-        self.cert = cert
 
-    def https_open(self, req):
-        return self.do_open(self.getConnection, req)
+def _file_checksum(path, checksum_type):
+    ''' Compute the checksum of a file, reading it in chunks. '''
+    digest = hashlib.new(checksum_type.replace('-', '').lower())
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
 
-    def getConnection(self, host, timeout=300):
-        return httplib.HTTPSConnection(host, key_file=self.key, cert_file=self.cert)
 
+def _is_complete(path, size=None, checksum=None, checksum_type='SHA256'):
+    ''' Whether a file exists and matches the expected size and checksum. '''
+    if not os.path.isfile(path):
+        return False
+    if size is not None and os.path.getsize(path) != int(size):
+        return False
+    if checksum is not None and \
+            _file_checksum(path, checksum_type) != checksum.lower():
+        return False
+    return True
 
-def download(url, toDirectory="/tmp"):
+
+def download(url, toDirectory="/tmp", size=None, checksum=None,
+             checksum_type='SHA256', session=None):
     '''
     Function to download a single file from ESGF.
 
+    The file is written to toDirectory under the last part of the URL. It is
+    first streamed to a '.part' file, which a later call resumes from if the
+    transfer is interrupted. A file that is already present with the expected
+    size and checksum is not downloaded again. When neither is known an
+    existing file is assumed to be complete, since files only get their final
+    name once fully downloaded.
+
     :param url: the URL of the file to download
     :param toDirectory: target directory where the file will be written
-    '''
+    :param size: (optional) the expected size of the file in bytes
+    :param checksum: (optional) the expected hexadecimal checksum of the file
+    :param checksum_type: the hash algorithm of the checksum, e.g. SHA256 or
+        MD5
+    :param session: (optional) the session from :func:`create_session` to
+        download through
 
-    # setup HTTP handler
-    certFile = expanduser(ESGF_CREDENTIALS)
-    opener = urllib2.build_opener(HTTPSClientAuthHandler(certFile, certFile))
-    opener.add_handler(urllib2.HTTPCookieProcessor())
+    :returns: the local path of the file
 
-    # download file
+    :raises ValueError: if the downloaded file does not have the expected
+        size or checksum. The file is removed.
+    '''
     localFilePath = join(toDirectory, url.split('/')[-1])
+    if _is_complete(localFilePath, size, checksum, checksum_type):
+        print("\nSkipping url: %s, already downloaded to: %s" %
+              (url, localFilePath))
+        return localFilePath
+
+    if session is None:
+        session = create_session()
+
+    partFilePath = localFilePath + '.part'
+    offset = os.path.getsize(partFilePath) if os.path.exists(partFilePath) else 0
+    headers = {'Range': 'bytes=%d-' % offset} if offset else {}
+
     print("\nDownloading url: %s to local path: %s ..." % (url, localFilePath))
-    localFile = open(localFilePath, 'w')
-    webFile = opener.open(url)
-    localFile.write(webFile.read())
-
-    # cleanup
-    localFile.close()
-    webFile.close()
-    opener.close()
+    response = session.get(url, headers=headers, stream=True)
+    try:
+        if offset and response.status_code == 416:
+            # The partial file already holds the whole file
+            pass
+        else:
+            response.raise_for_status()
+            # Servers ignoring the Range header send the whole file
+            mode = 'ab' if response.status_code == 206 else 'wb'
+            with open(partFilePath, mode) as localFile:
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    localFile.write(chunk)
+    finally:
+        response.close()
+
+    if not _is_complete(partFilePath, size, checksum, checksum_type):
+        os.remove(partFilePath)
+        raise ValueError('esgf.download: %s does not match the expected '
+                         'size or checksum.' % url)
+    os.rename(partFilePath, localFilePath)
     print("... done")
+    return localFilePath
+
+
+def download_files(files, toDirectory="/tmp", max_workers=4):
+    '''
+    Function to download several files from ESGF in parallel.
+
+    :param files: the files to download. Each is either a URL or a dictionary
+        of the keyword arguments of :func:`download`, e.g. with 'url', 'size',
+        'checksum' and 'checksum_type' keys.
+    :param toDirectory: target directory where the files will be written
+    :param max_workers: the number of files downloaded at the same time
+
+    :returns: the local paths of the files, in the order of files
+    '''
+    session = create_session(max_workers)
+    files = [f if isinstance(f, dict) else {'url': f} for f in files]
+
+    def download_file(f):
+        return download(toDirectory=toDirectory, session=session, **f)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        paths = list(executor.map(download_file, files))
+    session.close()
+    return paths
@@ -0,0 +1,726 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+'''
+Classes:
+    RegridWeights - Sparse source to target grid interpolation weights.
+
+    RegridWeightsCache - In-memory LRU and on-disk store of RegridWeights.
+
+    CurvilinearGridIndex - KD-tree spatial index of a curvilinear grid.
+'''
+
+import os
+import hashlib
+import logging
+import tempfile
+import zipfile
+from collections import OrderedDict
+
+import numpy as np
+import numpy.ma as ma
+import scipy.sparse
+from scipy.spatial import cKDTree
+
+logger = logging.getLogger(__name__)
+
+# Default number of source grid values regridded in one slab
+DEFAULT_CHUNK_VALUES = 2 ** 24
+
+
+class RegridWeights(object):
+    '''Sparse source to target grid interpolation weights.
+
+    Each row of the weight matrix holds the weights of the source grid points
+    that contribute to one target grid point. Regridding a stack of spatial
+    fields is a single sparse matrix product.
+    '''
+
+    def __init__(self, matrix, source_shape, target_shape, outside_mask=None,
+                 key=None, normalize=False):
+        '''Default RegridWeights constructor
+
+        :param matrix: Weight matrix of shape (target points, source points).
+        :type matrix: :class:`scipy.sparse.csr_matrix`
+
+        :param source_shape: Shape (lats, lons) of the source grid.
+        :type source_shape: :func:`tuple`
+
+        :param target_shape: Shape (lats, lons) of the target grid.
+        :type target_shape: :func:`tuple`
+
+        :param outside_mask: (Optional) Boolean array with target_shape that
+            is True for target points outside of the source domain.
+        :type outside_mask: :class:`numpy.ndarray`
+
+        :param key: (Optional) The cache key of the weights.
+        :type key: :mod:`string`
+
+        :param normalize: If True, the weights of each target point are
+            divided by the sum of the weights of its unmasked source points
+            when they are applied.
+        :type normalize: :class:`bool`
+
+        :raises: ValueError
+        '''
+        source_shape = tuple(int(n) for n in source_shape)
+        target_shape = tuple(int(n) for n in target_shape)
+        if matrix.shape != (np.prod(target_shape), np.prod(source_shape)):
+            error = ("Weight matrix of shape %s does not map source shape %s "
+                     "to target shape %s" % (matrix.shape, source_shape,
+                                             target_shape))
+            logger.error(error)
+            raise ValueError(error)
+        if outside_mask is None:
+            outside_mask = np.zeros(target_shape, dtype=bool)
+
+        self.matrix = scipy.sparse.csr_matrix(matrix)
+        self.matrix.eliminate_zeros()
+        self.source_shape = source_shape
+        self.target_shape = target_shape
+        self.outside_mask = np.asarray(outside_mask, dtype=bool).reshape(
+            target_shape)
+        self.key = key
+        self.normalize = normalize
+
+    @classmethod
+    def from_fractional_indices(cls, lat_indices, lon_indices, source_shape,
+                                outside_mask=None, mask_outside=True,
+                                key=None):
+        '''Build bilinear interpolation weights from fractional indices.
+
+        The weights reproduce
+        ``scipy.ndimage.map_coordinates(values, [lat_indices, lon_indices],
+        order=1)`` for the target points inside of the source grid.
+
+        :param lat_indices: Fractional source row index of each target point.
+        :type lat_indices: :class:`numpy.ndarray`
+
+        :param lon_indices: Fractional source column index of each target
+            point.
+        :type lon_indices: :class:`numpy.ndarray`
+
+        :param source_shape: Shape (lats, lons) of the source grid.
+        :type source_shape: :func:`tuple`
+
+        :param outside_mask: (Optional) Boolean array that is True for target
+            points outside of the source domain. Masked indices and indices
+            outside of the source grid are added to it.
+        :type outside_mask: :class:`numpy.ndarray`
+
+        :param mask_outside: (Optional) If False, only the masked indices
+            are added to outside_mask. Target points with indices outside of
+            the source grid then get a value of 0, as map_coordinates gives
+            them.
+        :type mask_outside: :class:`bool`
+
+        :param key: (Optional) The cache key of the weights.
+        :type key: :mod:`string`
+
+        :returns: The bilinear interpolation weights.
+        :rtype: :class:`RegridWeights`
+        '''
+        target_shape = np.shape(lat_indices)
+        ny, nx = source_shape
+        invalid = ma.getmaskarray(lat_indices) | ma.getmaskarray(lon_indices)
+
+        y = ma.getdata(lat_indices).astype(float).ravel()
+        x = ma.getdata(lon_indices).astype(float).ravel()
+        valid = ((y >= 0) & (y <= ny - 1) & (x >= 0) & (x <= nx - 1) &
+                 ~invalid.ravel())
+        masked = ~valid.reshape(target_shape) if mask_outside else invalid
+        if outside_mask is None:
+            outside_mask = masked
+        else:
+            outside_mask = np.asarray(outside_mask, dtype=bool) | masked
+        rows = np.nonzero(valid)[0]
+        y = y[valid]
+        x = x[valid]
+
+        y0 = np.minimum(np.floor(y), max(ny - 2, 0)).astype(int)
+        x0 = np.minimum(np.floor(x), max(nx - 2, 0)).astype(int)
+        y1 = np.minimum(y0 + 1, ny - 1)
+        x1 = np.minimum(x0 + 1, nx - 1)
+        wy = y - y0
+        wx = x - x0
+
+        row_index = np.concatenate([rows] * 4)
+        column_index = np.concatenate([y0 * nx + x0, y1 * nx + x0,
+                                       y0 * nx + x1, y1 * nx + x1])
+        weights = np.concatenate([(1. - wy) * (1. - wx), wy * (1. - wx),
+                                  (1. - wy) * wx, wy * wx])
+        matrix = scipy.sparse.csr_matrix(
+            (weights, (row_index, column_index)),
+            shape=(int(np.prod(target_shape)), ny * nx))
+
+        return cls(matrix, source_shape, target_shape, outside_mask, key=key)
+
+    @classmethod
+    def conservative(cls, lats, lons, new_lats, new_lons, boundary_check=True,
+                     key=None):
+        '''Build first order conservative weights between regular grids.
+
+        The weight of a source cell is the fraction of the target cell area
+        that it overlaps. Cell bounds are taken halfway between the grid
+        points and areas are computed on the sphere. The weights are
+        renormalized over the unmasked source cells when they are applied,
+        so that area integrals are preserved.
+
+        :param lats: 1D array of the source latitudes.
+        :type lats: :class:`numpy.ndarray`
+
+        :param lons: 1D array of the source longitudes.
+        :type lons: :class:`numpy.ndarray`
+
+        :param new_lats: 1D array of the target latitudes.
+        :type new_lats: :class:`numpy.ndarray`
+
+        :param new_lons: 1D array of the target longitudes.
+        :type new_lons: :class:`numpy.ndarray`
+
+        :param boundary_check: Mask the target cells that are not entirely
+            covered by the source grid. Otherwise only the target cells that
+            do not overlap it at all are masked.
+        :type boundary_check: :class:`bool`
+
+        :param key: (Optional) The cache key of the weights.
+        :type key: :mod:`string`
+
+        :returns: The conservative weights.
+        :rtype: :class:`RegridWeights`
+
+        :raises: ValueError
+        '''
+        grids = [np.asarray(ma.getdata(grid), dtype=float)
+                 for grid in (lats, lons, new_lats, new_lons)]
+        if any(grid.ndim != 1 or grid.size < 2 for grid in grids):
+            error = ("Conservative regridding requires 1D latitudes and "
+                     "longitudes with at least two points")
+            logger.error(error)
+            raise ValueError(error)
+        lats, lons, new_lats, new_lons = grids
+
+        lat_bounds = np.clip(_cell_bounds(lats), -90., 90.)
+        new_lat_bounds = np.clip(_cell_bounds(new_lats), -90., 90.)
+        lat_weights = _overlap_fractions(np.sin(np.radians(lat_bounds)),
+                                         np.sin(np.radians(new_lat_bounds)))
+        lon_weights = _overlap_fractions(_cell_bounds(lons),
+                                         _cell_bounds(new_lons), period=360.)
+
+        coverage = np.outer(lat_weights.sum(axis=1), lon_weights.sum(axis=1))
+        if boundary_check:
+            outside_mask = coverage < 1. - 1.e-6
+        else:
+            outside_mask = coverage <= 0.
+
+        matrix = scipy.sparse.kron(scipy.sparse.csr_matrix(lat_weights),
+                                   scipy.sparse.csr_matrix(lon_weights),
+                                   format='csr')
+        return cls(matrix, (lats.size, lons.size),
+                   (new_lats.size, new_lons.size), outside_mask, key=key,
+                   normalize=True)
+
+    @staticmethod
+    def make_key(lats, lons, new_lats, new_lons, **options):
+        '''Calculate the cache key of a source and target grid pair.
+
+        :param lats: Latitudes of the source grid.
+        :type lats: :class:`numpy.ndarray`
+
+        :param lons: Longitudes of the source grid.
+        :type lons: :class:`numpy.ndarray`
+
+        :param new_lats: Latitudes of the target grid.
+        :type new_lats: :class:`numpy.ndarray`
+
+        :param new_lons: Longitudes of the target grid.
+        :type new_lons: :class:`numpy.ndarray`
+
+        :param options: Any other settings (method, boundary check, ...)
+            that change the weights.
+
+        :returns: A hexadecimal digest identifying the weights.
+        :rtype: :mod:`string`
+        '''
+        digest = hashlib.sha1()
+        for coordinate in (lats, lons, new_lats, new_lons):
+            coordinate = np.ascontiguousarray(ma.getdata(coordinate),
+                                              dtype=np.float64)
+            digest.update(str(coordinate.shape).encode('utf-8'))
+            digest.update(coordinate.tobytes())
+        for option in sorted(options):
+            digest.update(('%s=%r' % (option, options[option])).encode('utf-8'))
+        return digest.hexdigest()
+
+    def apply(self, values, time_chunk_size=None):
+        '''Regrid values with the weights.
+
+        Target points are masked if they are outside of the source domain or
+        if any source point contributing to them is masked. Normalized
+        weights instead ignore the masked source points and only mask the
+        target points without any unmasked source point. The output is
+        allocated once and the leading (time) axis is regridded in slabs
+        with one sparse matrix product per slab.
+
+        :param values: Values on the source grid with shape (lats, lons) or
+            (times, lats, lons).
+        :type values: :class:`numpy.ma.MaskedArray`
+
+        :param time_chunk_size: (Optional) Number of time steps per slab.
+            By default a slab holds about DEFAULT_CHUNK_VALUES source values.
+        :type time_chunk_size: :class:`int`
+
+        :returns: Regridded values with shape target_shape or
+            (times,) + target_shape.
+        :rtype: :class:`numpy.ma.MaskedArray`
+
+        :raises: ValueError
+        '''
+        values = ma.asanyarray(values)
+        if values.shape[-2:] != self.source_shape:
+            error = ("Values of shape %s do not match the source grid shape "
+                     "%s" % (values.shape, self.source_shape))
+            logger.error(error)
+            raise ValueError(error)
+
+        leading_shape = values.shape[:-2]
+        npoint = self.matrix.shape[1]
+        ntarget = self.matrix.shape[0]
+        data = ma.getdata(values).reshape(-1, npoint)
+        mask = ma.getmaskarray(values).reshape(-1, npoint)
+        nslice = data.shape[0]
+
+        if time_chunk_size is None:
+            time_chunk_size = max(DEFAULT_CHUNK_VALUES // max(npoint, 1), 1)
+        if time_chunk_size < 1:
+            error = "time_chunk_size must be a positive integer"
+            logger.error(error)
+            raise ValueError(error)
+
+        new_data = np.empty((nslice, ntarget))
+        new_mask = np.empty((nslice, ntarget), dtype=bool)
+        outside_mask = self.outside_mask.ravel()
+        for start in range(0, nslice, time_chunk_size):
+            end = min(start + time_chunk_size, nslice)
+            slab_mask = mask[start:end]
+            slab = np.where(slab_mask, 0., data[start:end])
+            new_data[start:end] = self.matrix.dot(slab.T).T
+            if self.normalize:
+                valid_weights = self.matrix.dot(
+                    (~slab_mask).T.astype(float)).T
+                with np.errstate(invalid='ignore', divide='ignore'):
+                    new_data[start:end] /= valid_weights
+                new_mask[start:end] = (valid_weights <= 0.) | outside_mask
+            else:
+                new_mask[start:end] = (self.matrix.dot(
+                    slab_mask.T.astype(float)).T > 0.) | outside_mask
+
+        new_shape = leading_shape + self.target_shape
+        return ma.array(new_data.reshape(new_shape),
+                        mask=new_mask.reshape(new_shape))
+
+    def save(self, path):
+        '''Save the weights to a numpy ``.npz`` file.
+
+        The file is written next to path and renamed into place, so that
+        readers never see a partially written file.
+
+        :param path: The output file path. ``.npz`` is appended if it is
+            missing.
+        :type path: :mod:`string`
+        '''
+        if not path.endswith('.npz'):
+            path += '.npz'
+        handle, temp_path = tempfile.mkstemp(
+            suffix='.npz', dir=os.path.dirname(os.path.abspath(path)))
+        try:
+            with os.fdopen(handle, 'wb') as f:
+                np.savez(f,
+                         data=self.matrix.data,
+                         indices=self.matrix.indices,
+                         indptr=self.matrix.indptr,
+                         source_shape=np.array(self.source_shape),
+                         target_shape=np.array(self.target_shape),
+                         outside_mask=self.outside_mask,
+                         key=np.array(self.key if self.key else ''),
+                         normalize=np.array(self.normalize))
+            os.rename(temp_path, path)
+        except Exception:
+            os.remove(temp_path)
+            raise
+
+    @classmethod
+    def load(cls, path):
+        '''Load weights saved with :meth:`save`.
+
+        :param path: The ``.npz`` file path.
+        :type path: :mod:`string`
+
+        :returns: The loaded weights.
+        :rtype: :class:`RegridWeights`
+        '''
+        with np.load(path) as npz:
+            source_shape = tuple(npz['source_shape'])
+            target_shape = tuple(npz['target_shape'])
+            matrix = scipy.sparse.csr_matrix(
+                (npz['data'], npz['indices'], npz['indptr']),
+                shape=(int(np.prod(target_shape)), int(np.prod(source_shape))))
+            key = str(npz['key']) or None
+            normalize = bool(npz['normalize']) if 'normalize' in npz else False
+            return cls(matrix, source_shape, target_shape,
+                       npz['outside_mask'], key=key, normalize=normalize)
+
+
+class RegridWeightsCache(object):
+    '''In-memory LRU and optional on-disk store of RegridWeights.
+
+    A single cache can be shared by every regridding call of a run so that
+    datasets on the same native grid reuse the weights computed for the
+    first one.
+    '''
+
+    def __init__(self, max_entries=16, cache_dir=None):
+        '''Default RegridWeightsCache constructor
+
+        :param max_entries: The number of weights kept in memory.
+        :type max_entries: :class:`int`
+
+        :param cache_dir: (Optional) Directory where weights are stored as
+            ``<key>.npz`` files and shared between runs.
+        :type cache_dir: :mod:`string`
+        '''
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        self._weights = OrderedDict()
+
+        if cache_dir and not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+
+    def get(self, key):
+        '''Look up weights by key.
+
+        :param key: The weights key from :meth:`RegridWeights.make_key`.
+        :type key: :mod:`string`
+
+        :returns: The cached weights or None if they are not cached.
+        :rtype: :class:`RegridWeights`
+        '''
+        if key in self._weights:
+            weights = self._weights.pop(key)
+            self._weights[key] = weights
+            return weights
+
+        path = self._path(key)
+        if path and os.path.exists(path):
+            try:
+                weights = RegridWeights.load(path)
+            except (IOError, ValueError, KeyError, EOFError,
+                    zipfile.BadZipfile) as error:
+                logger.warning('Unable to read regrid weights %s: %s',
+                               path, error)
+                return None
+            self._remember(key, weights)
+            return weights
+
+        return None
+
+    def put(self, key, weights):
+        '''Store weights under key.
+
+        :param key: The weights key from :meth:`RegridWeights.make_key`.
+        :type key: :mod:`string`
+
+        :param weights: The weights to store.
+        :type weights: :class:`RegridWeights`
+        '''
+        weights.key = key
+        self._remember(key, weights)
+        path = self._path(key)
+        if path:
+            weights.save(path)
+
+    def get_or_build(self, key, builder):
+        '''Look up weights by key, building and storing them if missing.
+
+        :param key: The weights key from :meth:`RegridWeights.make_key`.
+        :type key: :mod:`string`
+
+        :param builder: Function without arguments returning the
+            :class:`RegridWeights` for key.
+        :type builder: :class:`callable`
+
+        :returns: The weights for key.
+        :rtype: :class:`RegridWeights`
+        '''
+        weights = self.get(key)
+        if weights is None:
+            weights = builder()
+            self.put(key, weights)
+        return weights
+
+    def clear(self):
+        '''Remove all weights kept in memory.'''
+        self._weights.clear()
+
+    def __contains__(self, key):
+        path = self._path(key)
+        return key in self._weights or bool(path and os.path.exists(path))
+
+    def __len__(self):
+        return len(self._weights)
+
+    def _remember(self, key, weights):
+        self._weights.pop(key, None)
+        self._weights[key] = weights
+        while len(self._weights) > self.max_entries:
+            self._weights.popitem(last=False)
+
+    def _path(self, key):
+        if not self.cache_dir:
+            return None
+        return os.path.join(self.cache_dir, key + '.npz')
+
+
+class CurvilinearGridIndex(object):
+    '''KD-tree spatial index of a curvilinear grid.
+
+    The grid points are indexed as unit vectors in 3-D Cartesian coordinates
+    so that distances are valid across the dateline and near the poles. The
+    tree is built once and all target points are located with one batched
+    query.
+    '''
+
+    def __init__(self, lats, lons):
+        '''Default CurvilinearGridIndex constructor
+
+        :param lats: 2D array of the grid latitudes.
+        :type lats: :class:`numpy.ndarray`
+
+        :param lons: 2D array of the grid longitudes.
+        :type lons: :class:`numpy.ndarray`
+
+        :raises: ValueError
+        '''
+        lats = np.asarray(ma.getdata(lats), dtype=float)
+        lons = np.asarray(ma.getdata(lons), dtype=float)
+        if lats.ndim != 2 or lats.shape != lons.shape:
+            error = ("Curvilinear grid latitudes %s and longitudes %s must be "
+                     "2D arrays of the same shape" % (lats.shape, lons.shape))
+            logger.error(error)
+            raise ValueError(error)
+
+        self.shape = lats.shape
+        self.points = _to_cartesian(lats, lons)
+        self.tree = cKDTree(self.points.reshape(-1, 3))
+
+    def fractional_indices(self, new_lats, new_lons, boundary_check=True,
+                           max_iterations=10, tolerance=1.e-6):
+        '''Calculate the fractional (row, column) indices of target points.
+
+        Each target point starts at its nearest grid point and the bilinear
+        mapping of the grid cell is inverted with Gauss-Newton iterations.
+
+        :param new_lats: Latitudes of the target points.
+        :type new_lats: :class:`numpy.ndarray`
+
+        :param new_lons: Longitudes of the target points.
+        :type new_lons: :class:`numpy.ndarray`
+
+        :param boundary_check: Mask the target points that are outside of the
+            grid. Otherwise they are moved to the nearest grid boundary.
+        :type boundary_check: :class:`bool`
+
+        :param max_iterations: Maximum number of Gauss-Newton iterations.
+        :type max_iterations: :class:`int`
+
+        :param tolerance: Convergence and boundary tolerance in index units.
+        :type tolerance: :class:`float`
+
+        :returns: Masked arrays of (row, column) float indices with the shape
+            of new_lats.
+        :rtype: :func:`tuple`
+        '''
+        target_shape = np.shape(new_lats)
+        targets = _to_cartesian(new_lats, new_lons).reshape(-1, 3)
+        ny, nx = self.shape
+
+        _, nearest = self.tree.query(targets)
+        rows, columns = np.unravel_index(nearest, self.shape)
+        nearest_rows = rows.astype(float)
+        nearest_columns = columns.astype(float)
+        rows = nearest_rows.copy()
+        columns = nearest_columns.copy()
+
+        if ny > 1 and nx > 1:
+            with np.errstate(invalid='ignore', divide='ignore'):
+                for _ in range(max_iterations):
+                    delta_rows, delta_columns = self._newton_step(
+                        targets, rows, columns)
+                    rows += delta_rows
+                    columns += delta_columns
+                    step = np.nanmax(np.abs(np.concatenate(
+                        [delta_rows, delta_columns]))) if rows.size else 0.
+                    if not step > tolerance:
+                        break
+
+        # Points where the iterations failed fall back to the nearest point
+        failed = ~(np.isfinite(rows) & np.isfinite(columns))
+        outside = ((rows < -tolerance) | (rows > ny - 1 + tolerance) |
+                   (columns < -tolerance) | (columns > nx - 1 + tolerance) |
+                   failed)
+        rows[failed] = nearest_rows[failed]
+        columns[failed] = nearest_columns[failed]
+        rows = np.clip(rows, 0., ny - 1.).reshape(target_shape)
+        columns = np.clip(columns, 0., nx - 1.).reshape(target_shape)
+        if not boundary_check:
+            outside = np.zeros(target_shape, dtype=bool)
+        outside = outside.reshape(target_shape)
+
+        return (ma.array(rows, mask=outside),
+                ma.array(columns, mask=outside))
+
+    def inverse_distance_weights(self, new_lats, new_lons, neighbors=4,
+                                 power=2., boundary_check=True, key=None):
+        '''Calculate inverse distance interpolation weights.
+
+        :param new_lats: Latitudes of the target points.
+        :type new_lats: :class:`numpy.ndarray`
+
+        :param new_lons: Longitudes of the target points.
+        :type new_lons: :class:`numpy.ndarray`
+
+        :param neighbors: The number of nearest grid points used for each
+            target point.
+        :type neighbors: :class:`int`
+
+        :param power: The power of the distance in the weights.
+        :type power: :class:`float`
+
+        :param boundary_check: Mask the target points that are outside of the
+            grid.
+        :type boundary_check: :class:`bool`
+
+        :param key: (Optional) The cache key of the weights.
+        :type key: :mod:`string`
+
+        :returns: The inverse distance weights.
+        :rtype: :class:`RegridWeights`
+        '''
+        target_shape = np.shape(new_lats)
+        targets = _to_cartesian(new_lats, new_lons).reshape(-1, 3)
+        neighbors = int(min(neighbors, self.tree.n))
+
+        distances, points = self.tree.query(targets, k=neighbors)
+        distances = distances.reshape(len(targets), neighbors)
+        points = points.reshape(len(targets), neighbors)
+
+        with np.errstate(divide='ignore'):
+            weights = 1. / distances ** power
+        # Target points on top of a grid point take its value
+        exact = distances[:, 0] == 0.
+        weights[exact] = 0.
+        weights[exact, 0] = 1.
+        weights /= weights.sum(axis=1)[:, np.newaxis]
+
+        rows = np.repeat(np.arange(len(targets)), neighbors)
+        matrix = scipy.sparse.csr_matrix(
+            (weights.ravel(), (rows, points.ravel())),
+            shape=(len(targets), self.tree.n))
+
+        outside_mask = None
+        if boundary_check:
+            outside_mask = ma.getmaskarray(self.fractional_indices(
+                new_lats, new_lons, boundary_check=True)[0])
+
+        return RegridWeights(matrix, self.shape, target_shape,
+                             outside_mask=outside_mask, key=key)
+
+    def _newton_step(self, targets, rows, columns):
+        '''Gauss-Newton update of the fractional indices of targets.'''
+        ny, nx = self.shape
+        row0 = np.clip(np.floor(rows), 0, ny - 2).astype(int)
+        column0 = np.clip(np.floor(columns), 0, nx - 2).astype(int)
+        dy = (rows - row0)[:, np.newaxis]
+        dx = (columns - column0)[:, np.newaxis]
+
+        p00 = self.points[row0, column0]
+        p10 = self.points[row0 + 1, column0]
+        p01 = self.points[row0, column0 + 1]
+        p11 = self.points[row0 + 1, column0 + 1]
+
+        position = (p00 * (1. - dy) * (1. - dx) + p10 * dy * (1. - dx) +
+                    p01 * (1. - dy) * dx + p11 * dy * dx)
+        d_row = (p10 - p00) * (1. - dx) + (p11 - p01) * dx
+        d_column = (p01 - p00) * (1. - dy) + (p11 - p10) * dy
+        residual = targets - position
+
+        a = np.einsum('ij,ij->i', d_row, d_row)
+        b = np.einsum('ij,ij->i', d_row, d_column)
+        c = np.einsum('ij,ij->i', d_column, d_column)
+        e = np.einsum('ij,ij->i', d_row, residual)
+        f = np.einsum('ij,ij->i', d_column, residual)
+        determinant = a * c - b * b
+
+        return ((c * e - b * f) / determinant,
+                (a * f - b * e) / determinant)
+
+
+def _cell_bounds(centers):
+    '''Calculate the bounds of cells halfway between monotonic centers.
+
+    :returns: Array of shape (len(centers), 2) with the lower and upper
+        bound of each cell.
+    '''
+    edges = np.empty(centers.size + 1)
+    edges[1:-1] = 0.5 * (centers[1:] + centers[:-1])
+    edges[0] = centers[0] - 0.5 * (centers[1] - centers[0])
+    edges[-1] = centers[-1] + 0.5 * (centers[-1] - centers[-2])
+    return np.sort(np.column_stack((edges[:-1], edges[1:])), axis=1)
+
+
+def _overlap_fractions(bounds, new_bounds, period=None):
+    '''Calculate the fraction of each new cell overlapped by each cell.
+
+    :param bounds: (lower, upper) bounds of the cells.
+    :type bounds: :class:`numpy.ndarray`
+
+    :param new_bounds: (lower, upper) bounds of the new cells.
+    :type new_bounds: :class:`numpy.ndarray`
+
+    :param period: (Optional) Period of a cyclic axis such as longitude.
+    :type period: :class:`float`
+
+    :returns: Array of shape (len(new_bounds), len(bounds)).
+    '''
+    shifts = [0.] if period is None else [-period, 0., period]
+    new_lower = new_bounds[:, 0][:, np.newaxis]
+    new_upper = new_bounds[:, 1][:, np.newaxis]
+    overlap = np.zeros((len(new_bounds), len(bounds)))
+    for shift in shifts:
+        overlap += np.clip(np.minimum(new_upper, bounds[:, 1] + shift) -
+                           np.maximum(new_lower, bounds[:, 0] + shift),
+                           0., None)
+    return overlap / (new_upper - new_lower)
+
+
+def _to_cartesian(lats, lons):
+    '''Convert latitudes and longitudes in degrees to unit vectors.'''
+    lats = np.radians(np.asarray(ma.getdata(lats), dtype=float))
+    lons = np.radians(np.asarray(ma.getdata(lons), dtype=float))
+    cos_lats = np.cos(lats)
+    return np.stack((cos_lats * np.cos(lons), cos_lats * np.sin(lons),
+                     np.sin(lats)), axis=-1)
@@ -0,0 +1,218 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+import datetime
+import os
+import shutil
+import tempfile
+import unittest
+
+import netCDF4
+import numpy as np
+
+from ocw.catalog import Catalog
+from ocw.dataset import Bounds
+
+
+class TestCatalog(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.europe = create_netcdf_file(
+            os.path.join(self.directory, 'europe_2000.nc'), 'pr',
+            np.arange(35., 45.), np.arange(0., 10.),
+            'days since 2000-01-01', calendar='standard')
+        self.asia = create_netcdf_file(
+            os.path.join(self.directory, 'sub', 'asia_2001.nc'), 'tas',
+            np.arange(30., 40.), np.arange(100., 110.),
+            'days since 2001-01-01', calendar='noleap')
+        self.pacific = create_netcdf_file(
+            os.path.join(self.directory, 'pacific_2002.nc'), 'pr',
+            np.arange(-5., 5.), np.arange(180., 200.),
+            'days since 2002-02-25', calendar='360_day')
+        self.catalog = Catalog()
+
+    def tearDown(self):
+        self.catalog.close()
+        shutil.rmtree(self.directory)
+
+    def test_scan_indexes_files(self):
+        updated = self.catalog.scan(self.directory)
+        self.assertEqual(updated, sorted([self.europe, self.asia,
+                                          self.pacific]))
+
+    def test_scan_is_incremental(self):
+        self.catalog.scan(self.directory)
+        self.assertEqual(self.catalog.scan(self.directory), [])
+
+        mtime = os.path.getmtime(self.europe) + 10
+        os.utime(self.europe, (mtime, mtime))
+        self.assertEqual(self.catalog.scan(self.directory), [self.europe])
+
+    def test_scan_removes_vanished_files(self):
+        self.catalog.scan(self.directory)
+        os.remove(self.asia)
+        self.catalog.scan(self.directory)
+        self.assertEqual(self.catalog.find('tas'), [])
+
+    def test_scan_not_recursive(self):
+        updated = self.catalog.scan(self.directory, recursive=False)
+        self.assertEqual(updated, [self.europe, self.pacific])
+
+    def test_scan_skips_invalid_files(self):
+        with open(os.path.join(self.directory, 'broken.nc'), 'w') as f:
+            f.write('not netcdf')
+        updated = self.catalog.scan(self.directory)
+        self.assertEqual(len(updated), 3)
+
+    def test_get(self):
+        metadata = self.catalog.get(self.europe)
+        self.assertEqual(metadata['lat_name'], 'lat')
+        self.assertEqual(metadata['lon_name'], 'lon')
+        self.assertEqual(metadata['time_name'], 'time')
+        self.assertEqual((metadata['lat_min'], metadata['lat_max']),
+                         (35., 44.))
+        self.assertEqual((metadata['lon_min'], metadata['lon_max']), (0., 9.))
+        self.assertEqual(metadata['start_time'], '2000-01-01 00:00:00')
+        self.assertEqual(metadata['end_time'], '2000-01-10 00:00:00')
+        self.assertEqual(metadata['calendar'], 'standard')
+        self.assertEqual(list(metadata['variables']),
+                         ['lat', 'lon', 'time', 'pr'])
+        self.assertEqual(metadata['variables']['pr'],
+                         {'dimensions': ('time', 'lat', 'lon'),
+                          'units': 'mm/day'})
+
+    def test_get_rotated_grid_with_time_bounds(self):
+        path = create_rotated_netcdf_file(
+            os.path.join(self.directory, 'cordex_2000.nc'))
+        metadata = self.catalog.get(path)
+        self.assertEqual(metadata['lat_name'], 'lat')
+        self.assertEqual(metadata['lon_name'], 'lon')
+        self.assertEqual(metadata['time_name'], 'time')
+        self.assertEqual((metadata['lat_min'], metadata['lat_max']),
+                         (40., 56.))
+        self.assertEqual((metadata['lon_min'], metadata['lon_max']),
+                         (-5., 4.5))
+        self.assertEqual(metadata['end_time'], '2000-01-10 00:00:00')
+
+        self.catalog.scan(self.directory)
+        bounds = Bounds(lat_min=50, lat_max=60, lon_min=-10, lon_max=-4)
+        self.assertEqual(self.catalog.find('tas', bounds), [path])
+
+    def test_get_normalizes_longitudes(self):
+        metadata = self.catalog.get(self.pacific)
+        self.assertEqual((metadata['lon_min'], metadata['lon_max']),
+                         (-179., 180.))
+
+    def test_get_non_standard_calendar(self):
+        metadata = self.catalog.get(self.pacific)
+        self.assertEqual(metadata['calendar'], '360_day')
+        self.assertEqual(metadata['start_time'], '2002-02-25 00:00:00')
+        self.assertEqual(metadata['end_time'], '2002-03-04 00:00:00')
+
+    def test_get_refreshes_modified_file(self):
+        self.catalog.get(self.europe)
+        create_netcdf_file(self.europe, 'tas', np.arange(35., 45.),
+                           np.arange(0., 10.), 'days since 2000-01-01')
+        mtime = os.path.getmtime(self.europe) + 10
+        os.utime(self.europe, (mtime, mtime))
+        self.assertIn('tas', self.catalog.get(self.europe)['variables'])
+
+    def test_find_variable(self):
+        self.catalog.scan(self.directory)
+        self.assertEqual(self.catalog.find('pr'),
+                         [self.europe, self.pacific])
+        self.assertEqual(self.catalog.find('tas'), [self.asia])
+        self.assertEqual(self.catalog.find('missing'), [])
+
+    def test_find_spatial_bounds(self):
+        self.catalog.scan(self.directory)
+        bounds = Bounds(lat_min=40, lat_max=60, lon_min=-10, lon_max=5)
+        self.assertEqual(self.catalog.find('pr', bounds), [self.europe])
+
+    def test_find_temporal_bounds(self):
+        self.catalog.scan(self.directory)
+        bounds = Bounds(start=datetime.datetime(2002, 3, 1),
+                        end=datetime.datetime(2002, 12, 1))
+        self.assertEqual(self.catalog.find('pr', bounds), [self.pacific])
+        bounds = Bounds(start=datetime.datetime(2000, 1, 10),
+                        end=datetime.datetime(2000, 2, 1))
+        self.assertEqual(self.catalog.find('pr', bounds), [self.europe])
+
+    def test_persistent_catalog(self):
+        path = os.path.join(self.directory, 'catalog.sqlite')
+        catalog = Catalog(path)
+        catalog.scan(self.directory)
+        catalog.close()
+
+        catalog = Catalog(path)
+        self.assertEqual(catalog.scan(self.directory), [])
+        self.assertEqual(catalog.find('tas'), [self.asia])
+        catalog.close()
+
+
+def create_netcdf_file(file_path, variable_name, lats, lons, time_units,
+                       calendar=None):
+    '''Write a file with ten daily time steps of a variable.'''
+    directory = os.path.dirname(file_path)
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    netcdf = netCDF4.Dataset(file_path, 'w')
+    netcdf.createDimension('time', 10)
+    netcdf.createDimension('lat', len(lats))
+    netcdf.createDimension('lon', len(lons))
+    netcdf.createVariable('lat', 'f8', ('lat',))[:] = lats
+    netcdf.createVariable('lon', 'f8', ('lon',))[:] = lons
+    times = netcdf.createVariable('time', 'f8', ('time',))
+    times[:] = np.arange(10)
+    times.units = time_units
+    if calendar is not None:
+        times.calendar = calendar
+    values = netcdf.createVariable(variable_name, 'f4', ('time', 'lat', 'lon'))
+    values[:] = np.ones((10, len(lats), len(lons)))
+    values.units = 'mm/day'
+    netcdf.close()
+    return file_path
+
+
+def create_rotated_netcdf_file(file_path):
+    '''Write a CORDEX style file with time bounds and a rotated grid.'''
+    netcdf = netCDF4.Dataset(file_path, 'w')
+    netcdf.createDimension('time', 10)
+    netcdf.createDimension('bnds', 2)
+    netcdf.createDimension('rlat', 4)
+    netcdf.createDimension('rlon', 5)
+    times = netcdf.createVariable('time', 'f8', ('time',))
+    times[:] = np.arange(10)
+    times.units = 'days since 2000-01-01'
+    times.bounds = 'time_bnds'
+    time_bnds = netcdf.createVariable('time_bnds', 'f8', ('time', 'bnds'))
+    time_bnds[:] = np.column_stack((np.arange(10), np.arange(1, 11)))
+    netcdf.createVariable('rlat', 'f8', ('rlat',))[:] = np.arange(-2., 2.)
+    netcdf.createVariable('rlon', 'f8', ('rlon',))[:] = np.arange(-2., 3.)
+    rlons, rlats = np.meshgrid(np.arange(5.), np.arange(4.))
+    netcdf.createVariable('lat', 'f8', ('rlat', 'rlon'))[:] = (
+        40. + 4. * rlats + rlons)
+    netcdf.createVariable('lon', 'f8', ('rlat', 'rlon'))[:] = (
+        -5. + 2. * rlons + rlats / 2.)
+    netcdf.createVariable('tas', 'f4', ('time', 'rlat', 'rlon'))[:] = 1.
+    netcdf.close()
+    return file_path
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -17,8 +17,12 @@
 
 import unittest
 import datetime as dt
+import numpy as np
+from pydap.client import open_url
+from pydap.handlers.lib import BaseHandler
+from pydap.model import BaseType, DatasetType, GridType
 import ocw.data_source.dap as dap
-from ocw.dataset import Dataset
+from ocw.dataset import Bounds, Dataset
 
 
 class TestDap(unittest.TestCase):
@@ -72,5 +76,88 @@ class TestDap(unittest.TestCase):
         self.assertEquals(self.dataset.origin['source'], 'dap')
         self.assertEquals(self.dataset.origin['url'], self.url)
 
+
+class TestDapSubsetting(unittest.TestCase):
+    '''Load from a pydap dataset served in process instead of over HTTP.'''
+
+    def setUp(self):
+        self.values = np.arange(12 * 4 * 6, dtype='f4').reshape(12, 4, 6)
+        times = np.arange(12.)
+        lats = np.array([-10., 0., 10., 20.])
+        lons = np.array([-120., -60., 0., 60., 120., 180.])
+
+        self.remote = DatasetType('test')
+        self.remote['time'] = BaseType(
+            'time', times, dimensions=('time',),
+            attributes={'units': 'months since 2000-01-01 00:00:00'})
+        grid = GridType('tas')
+        grid['tas'] = BaseType('tas', self.values,
+                               dimensions=('time', 'lat', 'lon'))
+        grid['time'] = BaseType('time', times, dimensions=('time',))
+        grid['lat'] = BaseType('lat', lats, dimensions=('lat',))
+        grid['lon'] = BaseType('lon', lons, dimensions=('lon',))
+        self.remote['tas'] = grid
+
+        self.handler = BaseHandler(self.remote)
+        self.open_url = dap.open_url
+        dap.open_url = lambda url: open_url(url, application=self.handler)
+
+    def tearDown(self):
+        dap.open_url = self.open_url
+
+    def test_load_everything(self):
+        dataset = dap.load('http://localhost/test', 'tas')
+        np.testing.assert_array_equal(dataset.values, self.values)
+        self.assertEqual(dataset.times[0], dt.datetime(2000, 1, 1))
+        self.assertEqual(dataset.times[-1], dt.datetime(2000, 12, 1))
+
+    def test_load_within_bounds(self):
+        bounds = Bounds(lat_min=0, lat_max=10, lon_min=0, lon_max=60,
+                        start=dt.datetime(2000, 3, 1),
+                        end=dt.datetime(2000, 5, 1))
+        dataset = dap.load('http://localhost/test', 'tas', bounds=bounds)
+        np.testing.assert_array_equal(dataset.lats, [0., 10.])
+        np.testing.assert_array_equal(dataset.lons, [0., 60.])
+        self.assertEqual(list(dataset.times), [dt.datetime(2000, 3, 1),
+                                               dt.datetime(2000, 4, 1),
+                                               dt.datetime(2000, 5, 1)])
+        np.testing.assert_array_equal(dataset.values,
+                                      self.values[2:5, 1:3, 2:4])
+
+    def test_bounds_outside_dataset(self):
+        bounds = Bounds(start=dt.datetime(2010, 1, 1))
+        with self.assertRaises(ValueError):
+            dap.load('http://localhost/test', 'tas', bounds=bounds)
+
+    def test_load_in_chunks(self):
+        # Only two time steps fit in a request
+        bounds = Bounds(start=dt.datetime(2000, 2, 1))
+        dataset = dap.load('http://localhost/test', 'tas', bounds=bounds,
+                           max_request_bytes=2 * 4 * 6 * 4, max_workers=3)
+        np.testing.assert_array_equal(dataset.values, self.values[1:])
+
+    def test_fetch_retries(self):
+        class Flaky(object):
+            calls = 0
+
+            def __getitem__(self, index):
+                Flaky.calls += 1
+                if Flaky.calls < 3:
+                    raise IOError('Connection reset')
+                return np.ones(2)
+
+        sleep = dap.time.sleep
+        dap.time.sleep = lambda seconds: None
+        try:
+            values = dap._fetch(Flaky(), (slice(0, 2),), retries=2)
+            np.testing.assert_array_equal(values, np.ones(2))
+
+            Flaky.calls = 0
+            with self.assertRaises(IOError):
+                dap._fetch(Flaky(), (slice(0, 2),), retries=1)
+        finally:
+            dap.time.sleep = sleep
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -17,10 +17,16 @@
 
 '''Unit tests for the Dataset.py module'''
 
+import os
+import shutil
+import tempfile
 import unittest
-from ocw.dataset import Dataset, Bounds
+from ocw.dataset import Dataset, LazyDataset, Bounds
+import cftime
 import numpy as np
+import numpy.ma as ma
 import datetime as dt
+import netCDF4
 
 
 class TestDatasetAttributes(unittest.TestCase):
@@ -187,6 +193,38 @@ class TestDatasetFunctions(unittest.TestCase):
                                     self.value, self.variable)
         self.assertEqual(self.test_dataset.temporal_resolution(), 'yearly')
 
+    def test_time_fields(self):
+        years, months, days = self.test_dataset.time_fields()
+        np.testing.assert_array_equal(years, [2000] * 12)
+        np.testing.assert_array_equal(months, range(1, 13))
+        np.testing.assert_array_equal(days, [1] * 12)
+
+    def test_time_offsets(self):
+        self.assertEqual(self.test_dataset.calendar, 'standard')
+        np.testing.assert_array_equal(
+            self.test_dataset.time_offsets,
+            self.time.astype('datetime64[s]').astype(np.int64))
+
+    def test_times_assignment_resets_time_fields(self):
+        self.test_dataset.time_fields()
+        self.test_dataset.times = np.array([dt.datetime(2001, x, 2)
+                                            for x in range(1, 13)])
+        years, _, days = self.test_dataset.time_fields()
+        np.testing.assert_array_equal(years, [2001] * 12)
+        np.testing.assert_array_equal(days, [2] * 12)
+
+    def test_360_day_calendar(self):
+        times = netCDF4.num2date(np.arange(12) * 30. + 29.,
+                                 'days since 2000-01-01', calendar='360_day')
+        dataset = Dataset(self.lat, self.lon, times, self.value)
+        self.assertEqual(dataset.calendar, '360_day')
+        _, months, days = dataset.time_fields()
+        np.testing.assert_array_equal(months, range(1, 13))
+        np.testing.assert_array_equal(days, [30] * 12)
+        self.assertEqual(dataset.temporal_boundaries(),
+                         (times[0], times[-1]))
+        self.assertEqual(dataset.temporal_resolution(), 'monthly')
+
     def test_str_(self):
         dataset = self.test_dataset
         lat_min, lat_max, lon_min, lon_max = dataset.spatial_boundaries()
@@ -215,6 +253,164 @@ class TestDatasetFunctions(unittest.TestCase):
         self.assertEqual(str(self.test_dataset), output)
 
 
+class RecordingSource(object):
+    '''Array wrapper that records the keys it is indexed with.'''
+
+    def __init__(self, values):
+        self.values = values
+        self.shape = values.shape
+        self.keys = []
+
+    def __getitem__(self, key):
+        self.keys.append(key)
+        return self.values[key]
+
+
+class TestLazyDataset(unittest.TestCase):
+
+    def setUp(self):
+        # Decreasing lats and lons in [0, 360) are normalized on construction
+        self.lats = np.array([20., 10., 0., -10.])
+        self.lons = np.array([0., 90., 180., 270.])
+        self.times = np.array([dt.datetime(2000, x, 1) for x in range(1, 7)])
+        self.source_values = np.arange(96.).reshape(6, 4, 4)
+        self.source = RecordingSource(self.source_values)
+        self.lazy_dataset = LazyDataset(self.lats.copy(), self.lons.copy(),
+                                        self.times, self.source)
+        self.dataset = Dataset(self.lats.copy(), self.lons.copy(), self.times,
+                               self.source_values.copy())
+
+    def test_values_match_dataset(self):
+        self.assertEqual(self.source.keys, [])
+        np.testing.assert_array_equal(self.lazy_dataset.lats,
+                                      self.dataset.lats)
+        np.testing.assert_array_equal(self.lazy_dataset.lons,
+                                      self.dataset.lons)
+        np.testing.assert_array_equal(self.lazy_dataset.values,
+                                      self.dataset.values)
+
+    def test_values_are_read_once(self):
+        self.lazy_dataset.values
+        self.lazy_dataset.values
+        self.assertTrue(self.lazy_dataset.is_loaded)
+        self.assertEqual(len(self.source.keys), 1)
+
+    def test_select_reads_hyperslab(self):
+        selected = self.lazy_dataset.select(time=slice(1, 3),
+                                            lat=slice(0, 2)).select(
+            lon=np.array([2, 3]))
+        self.assertFalse(selected.is_loaded)
+        np.testing.assert_array_equal(selected.times, self.times[1:3])
+        np.testing.assert_array_equal(selected.lons, self.dataset.lons[2:])
+        np.testing.assert_array_equal(selected.values,
+                                      self.dataset.values[1:3, :2, 2:])
+        # Only the flipped and shifted rows and columns that were selected
+        self.assertEqual(self.source.keys,
+                         [(slice(1, 3), slice(2, 4), slice(0, 2))])
+
+    def test_select_across_shifted_columns(self):
+        selected = self.lazy_dataset.select(lon=np.array([1, 2]))
+        np.testing.assert_array_equal(selected.values,
+                                      self.dataset.values[:, :, 1:3])
+
+    def test_select_after_load(self):
+        self.lazy_dataset.values
+        selected = self.lazy_dataset.select(time=slice(0, 1))
+        np.testing.assert_array_equal(selected.values,
+                                      self.dataset.values[:1])
+        self.assertEqual(len(self.source.keys), 1)
+
+    def test_fixed_indices(self):
+        source = np.arange(192.).reshape(6, 2, 4, 4)
+        lazy_dataset = LazyDataset(self.lats.copy(), self.lons.copy(),
+                                   self.times, source, fixed_indices={1: 1})
+        dataset = Dataset(self.lats.copy(), self.lons.copy(), self.times,
+                          source[:, 1].copy())
+        np.testing.assert_array_equal(lazy_dataset.values, dataset.values)
+
+    def test_invalid_source_shape(self):
+        with self.assertRaises(ValueError):
+            LazyDataset(self.lats, self.lons, self.times,
+                        np.ones((6, 2, 4, 4)))
+
+
+class TestDatasetSaveLoad(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'dataset')
+        values = ma.masked_greater(np.arange(60.).reshape(3, 4, 5), 50)
+        times = np.array([dt.datetime(2000, month, 1)
+                          for month in range(1, 4)])
+        self.dataset = Dataset(np.arange(4.), np.arange(5.), times, values,
+                               variable='pr', units='mm/day',
+                               origin={'source': 'local', 'path': 'pr.nc'},
+                               name='obs')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_round_trip(self):
+        self.dataset.save(self.path)
+        dataset = Dataset.load(self.path)
+        np.testing.assert_array_equal(dataset.lats, self.dataset.lats)
+        np.testing.assert_array_equal(dataset.lons, self.dataset.lons)
+        np.testing.assert_array_equal(dataset.times, self.dataset.times)
+        np.testing.assert_array_equal(dataset.values, self.dataset.values)
+        np.testing.assert_array_equal(ma.getmaskarray(dataset.values),
+                                      ma.getmaskarray(self.dataset.values))
+        self.assertEqual(dataset.values.dtype, self.dataset.values.dtype)
+        self.assertEqual(dataset.variable, 'pr')
+        self.assertEqual(dataset.units, 'mm/day')
+        self.assertEqual(dataset.name, 'obs')
+        self.assertEqual(dataset.origin, self.dataset.origin)
+
+    def test_values_are_memory_mapped(self):
+        self.dataset.save(self.path)
+        self.assertIsInstance(Dataset.load(self.path).values.base, np.memmap)
+        self.assertNotIsInstance(
+            Dataset.load(self.path, mmap=False).values.base, np.memmap)
+
+    def test_mapped_values_are_copy_on_write(self):
+        self.dataset.save(self.path)
+        dataset = Dataset.load(self.path)
+        dataset.values[0, 0, 0] = -1
+        self.assertEqual(Dataset.load(self.path).values[0, 0, 0], 0)
+
+    def test_unmasked_values(self):
+        self.dataset.save(self.path)
+        self.dataset.values = ma.array(np.ones((3, 4, 5), dtype=np.float32))
+        self.dataset.save(self.path)
+        self.assertFalse(os.path.exists(os.path.join(self.path, 'mask.npy')))
+        values = Dataset.load(self.path).values
+        self.assertIs(values.mask, ma.nomask)
+        self.assertEqual(values.dtype, np.float32)
+
+    def test_non_standard_calendar(self):
+        self.dataset.times = np.array([cftime.Datetime360Day(2000, 2, day)
+                                       for day in (28, 29, 30)])
+        self.dataset.save(self.path)
+        dataset = Dataset.load(self.path)
+        self.assertEqual(dataset.calendar, '360_day')
+        np.testing.assert_array_equal(dataset.times, self.dataset.times)
+        np.testing.assert_array_equal(dataset.time_offsets,
+                                      self.dataset.time_offsets)
+
+    def test_lazy_dataset(self):
+        netcdf = netCDF4.Dataset('lazy_save.nc', 'w', diskless=True)
+        netcdf.createDimension('time', 3)
+        netcdf.createDimension('lat', 4)
+        netcdf.createDimension('lon', 5)
+        variable = netcdf.createVariable('pr', 'f8', ('time', 'lat', 'lon'))
+        variable[:] = ma.getdata(self.dataset.values)
+        dataset = LazyDataset(self.dataset.lats, self.dataset.lons,
+                              self.dataset.times, variable)
+        dataset.save(self.path)
+        np.testing.assert_array_equal(Dataset.load(self.path).values,
+                                      ma.getdata(self.dataset.values))
+        netcdf.close()
+
+
 class TestBounds(unittest.TestCase):
 
     def setUp(self):
@@ -0,0 +1,144 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+import datetime
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import numpy.ma as ma
+
+from ocw.dataset import Bounds, Dataset
+from ocw.dataset_cache import DatasetCache
+
+
+class TestDatasetCache(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = DatasetCache(os.path.join(self.directory, 'cache'))
+        self.input_path = os.path.join(self.directory, 'input.nc')
+        with open(self.input_path, 'w') as f:
+            f.write('data')
+        self.loader_opts = {'loader_name': 'local',
+                            'file_path': self.input_path,
+                            'variable_name': 'pr'}
+        self.dataset = Dataset(np.arange(4.), np.arange(5.),
+                               np.array([datetime.datetime(2000, 1, 1)]),
+                               ma.array(np.ones((1, 4, 5))), variable='pr')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_key_depends_on_options(self):
+        key = self.cache.key(self.loader_opts)
+        self.assertEqual(key, self.cache.key(dict(self.loader_opts)))
+        self.loader_opts['variable_name'] = 'tas'
+        self.assertNotEqual(key, self.cache.key(self.loader_opts))
+
+    def test_key_depends_on_bounds(self):
+        self.loader_opts['bounds'] = Bounds(lat_min=0, lat_max=10)
+        key = self.cache.key(self.loader_opts)
+        self.loader_opts['bounds'] = Bounds(lat_min=0, lat_max=10)
+        self.assertEqual(key, self.cache.key(self.loader_opts))
+        self.loader_opts['bounds'] = Bounds(lat_min=0, lat_max=20)
+        self.assertNotEqual(key, self.cache.key(self.loader_opts))
+
+    def test_key_depends_on_input_files(self):
+        key = self.cache.key(self.loader_opts)
+        mtime = os.path.getmtime(self.input_path) + 10
+        os.utime(self.input_path, (mtime, mtime))
+        self.assertNotEqual(key, self.cache.key(self.loader_opts))
+
+    def test_key_expands_glob_patterns(self):
+        self.loader_opts['file_path'] = os.path.join(self.directory, '*.nc')
+        key = self.cache.key(self.loader_opts)
+        with open(os.path.join(self.directory, 'other.nc'), 'w') as f:
+            f.write('data')
+        self.assertNotEqual(key, self.cache.key(self.loader_opts))
+
+    def test_key_depends_on_listed_files(self):
+        list_path = os.path.join(self.directory, 'files.txt')
+        with open(list_path, 'w') as f:
+            f.write(self.input_path + '\n')
+        loader_opts = {'loader_name': 'local_split', 'file_list': list_path,
+                       'variable_name': 'pr'}
+        key = self.cache.key(loader_opts)
+        mtime = os.path.getmtime(self.input_path) + 10
+        os.utime(self.input_path, (mtime, mtime))
+        self.assertNotEqual(key, self.cache.key(loader_opts))
+
+    def test_get_missing(self):
+        self.assertIsNone(self.cache.get(self.cache.key(self.loader_opts)))
+
+    def test_put_and_get(self):
+        key = self.cache.key(self.loader_opts)
+        self.cache.put(key, self.dataset)
+        dataset = self.cache.get(key)
+        self.assertIsInstance(dataset, Dataset)
+        np.testing.assert_array_equal(dataset.values, self.dataset.values)
+
+        self.cache.put(key, [self.dataset, self.dataset])
+        datasets = self.cache.get(key)
+        self.assertEqual(len(datasets), 2)
+
+    def test_get_stale(self):
+        key = self.cache.key(self.loader_opts)
+        self.cache.put(key, self.dataset)
+        entry = os.path.join(self.cache.directory, key, 'entry.json')
+        past = os.path.getmtime(entry) - 120
+        os.utime(entry, (past, past))
+        self.assertIsNotNone(self.cache.get(key, max_age=300))
+        self.assertIsNone(self.cache.get(key, max_age=60))
+
+    def test_invalidate(self):
+        key = self.cache.key(self.loader_opts)
+        self.cache.put(key, self.dataset)
+        self.cache.invalidate(key)
+        self.assertIsNone(self.cache.get(key))
+
+    def test_clear(self):
+        key = self.cache.key(self.loader_opts)
+        self.cache.put(key, self.dataset)
+        self.cache.clear()
+        self.assertEqual(self.cache.size(), 0)
+
+    def test_least_recently_used_eviction(self):
+        self.cache.put('first', self.dataset)
+        entry_size = self.cache.size()
+        self.cache.max_bytes = 2 * entry_size
+        self.cache.put('second', self.dataset)
+
+        # Using the first entry makes the second the least recently used
+        past = os.path.getmtime(os.path.join(self.cache.directory,
+                                             'second')) - 10
+        os.utime(os.path.join(self.cache.directory, 'first'), (past, past))
+        os.utime(os.path.join(self.cache.directory, 'second'),
+                 (past - 10, past - 10))
+        self.cache.get('first')
+
+        self.cache.put('third', self.dataset)
+        self.assertIsNotNone(self.cache.get('first'))
+        self.assertIsNone(self.cache.get('second'))
+        self.assertIsNotNone(self.cache.get('third'))
+        self.assertLessEqual(self.cache.size(), self.cache.max_bytes)
+
+
+if __name__ == '__main__':
+    unittest.main()
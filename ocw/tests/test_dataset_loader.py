@@ -17,9 +17,13 @@
 
 import unittest
 import os
+import shutil
+import tempfile
 import netCDF4
 import numpy as np
+from ocw.catalog import Catalog
 from ocw.dataset import Dataset
+from ocw.dataset_cache import DatasetCache
 from ocw.dataset_loader import DatasetLoader
 
 
@@ -90,6 +94,80 @@ class TestDatasetLoader(unittest.TestCase):
         np.testing.assert_array_equal(self.loader.datasets[1].values,
                                       self.values2)
 
+    def testConcurrentDataSources(self):
+        '''
+        Test that concurrently loaded datasets keep the config order
+        '''
+        self.loader = DatasetLoader(self.new_data_source_config, self.config,
+                                    self.new_data_source_config)
+        self.loader.add_source_loader('foo', build_dataset)
+        self.loader.load_datasets(max_workers=3,
+                                  per_source_limits={'foo': 1})
+        sources = [dataset.origin['source']
+                   for dataset in self.loader.datasets]
+        self.assertEqual(sources, ['foo', 'local', 'foo'])
+        self.assertEqual([stats['loader_name']
+                          for stats in self.loader.load_stats],
+                         ['foo', 'local', 'foo'])
+        self.assertEqual(self.loader.load_stats[0]['nbytes'],
+                         self.values2.nbytes)
+        self.assertIsNone(self.loader.load_stats[1]['error'])
+
+    def testContinueOnError(self):
+        '''
+        Test that a failing dataset can be skipped
+        '''
+        self.loader = DatasetLoader({'loader_name': 'broken'}, self.config)
+        self.loader.add_source_loader('broken', broken_loader)
+        self.assertRaises(ValueError, self.loader.load_datasets, 2)
+
+        self.loader.load_datasets(max_workers=2, continue_on_error=True)
+        self.assertEqual(len(self.loader.datasets), 1)
+        self.assertEqual(self.loader.datasets[0].origin['source'], 'local')
+        self.assertIsInstance(self.loader.load_stats[0]['error'], ValueError)
+
+    def testCachedDataSource(self):
+        '''
+        Ensures that loaded datasets are read back from the cache
+        '''
+        cache_dir = tempfile.mkdtemp()
+        calls = []
+
+        def counting_loader(**kwargs):
+            calls.append(kwargs)
+            return build_dataset(**kwargs)
+
+        self.loader = DatasetLoader(self.new_data_source_config,
+                                    cache=DatasetCache(cache_dir))
+        self.loader.add_source_loader('foo', counting_loader)
+        self.loader.load_datasets()
+        self.loader.load_datasets()
+        self.assertEqual(len(calls), 1)
+        np.testing.assert_array_equal(self.loader.datasets[0].values,
+                                      self.values2)
+
+        self.loader.invalidate_cache()
+        self.loader.load_datasets()
+        self.assertEqual(len(calls), 2)
+        shutil.rmtree(cache_dir)
+
+    def testCatalogDataSource(self):
+        '''
+        Ensures that the files of a variable can be looked up in a catalog
+        '''
+        catalog = Catalog()
+        catalog.add(self.file_path)
+        config = {'loader_name': 'catalog', 'variable_name': 'value'}
+        self.loader = DatasetLoader(config, catalog=catalog)
+        self.loader.load_datasets()
+        np.testing.assert_array_equal(self.loader.datasets[0].values,
+                                      self.values)
+
+        config['variable_name'] = 'missing'
+        self.loader.set_loader_opts(config)
+        self.assertRaises(ValueError, self.loader.load_datasets)
+        catalog.close()
+
 
 def build_dataset(*args, **kwargs):
     '''
@@ -99,6 +177,13 @@ def build_dataset(*args, **kwargs):
     return Dataset(*args, origin=origin, **kwargs)
 
 
+def broken_loader(**kwargs):
+    '''
+    Data source loader which always fails.
+    '''
+    raise ValueError('broken')
+
+
 def create_netcdf_object():
     # To create the temporary netCDF file
     file_path = '/tmp/temporaryNetcdf.nc'
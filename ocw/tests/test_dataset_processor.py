@@ -22,8 +22,10 @@ import os
 from ocw import dataset_processor as dp
 from ocw import dataset as ds
 from ocw.data_source import local
+from ocw.regrid_weights import RegridWeightsCache
 import numpy as np
 import numpy.ma as ma
+import netCDF4
 
 import logging
 logging.basicConfig(level=logging.CRITICAL)
@@ -333,6 +335,107 @@ class TestTemporalRebin(unittest.TestCase):
         with self.assertRaises(ValueError):
             dp.temporal_rebin(self.two_years_daily_dataset, "days")
 
+    def test_monthly_rebin_skips_empty_months(self):
+        dataset = ds.Dataset(self.ten_year_monthly_dataset.lats,
+                             self.ten_year_monthly_dataset.lons,
+                             self.ten_year_monthly_dataset.times[[0, 14]],
+                             self.ten_year_monthly_dataset.values[[0, 14]])
+        monthly_dataset = dp.temporal_rebin(dataset, "monthly")
+        np.testing.assert_array_equal(
+            monthly_dataset.times, [datetime.datetime(2000, 1, 15),
+                                    datetime.datetime(2001, 3, 15)])
+
+    def test_masked_values_rebin(self):
+        values = self.ten_year_monthly_dataset.values
+        self.ten_year_monthly_dataset.values = ma.array(
+            values * np.arange(120)[:, np.newaxis, np.newaxis])
+        self.ten_year_monthly_dataset.values[0] = ma.masked
+        self.ten_year_monthly_dataset.values[12:24] = ma.masked
+        annual_dataset = dp.temporal_rebin(self.ten_year_monthly_dataset,
+                                           "annual")
+        np.testing.assert_array_equal(annual_dataset.values[0], 6.)
+        self.assertTrue(annual_dataset.values.mask[1].all())
+        self.assertFalse(annual_dataset.values.mask[2:].any())
+
+    def test_360_day_calendar_rebin(self):
+        times = netCDF4.num2date(np.arange(720.), 'days since 2000-01-01',
+                                 calendar='360_day')
+        dataset = ds.Dataset(self.ten_year_monthly_dataset.lats,
+                             self.ten_year_monthly_dataset.lons, times,
+                             np.ones((720, 90, 180)))
+        monthly_dataset = dp.temporal_rebin(dataset, "monthly")
+        self.assertEqual(len(monthly_dataset.times), 24)
+        self.assertEqual(monthly_dataset.calendar, '360_day')
+        self.assertEqual(monthly_dataset.times[1].month, 2)
+        daily_dataset = dp.temporal_rebin(dataset, "daily")
+        self.assertEqual(daily_dataset.times[59].day, 30)
+
+    def test_rebin_reductions(self):
+        self.ten_year_monthly_dataset.values[:, 0, 0] = np.arange(120)
+        expected = {'sum': 66., 'min': 0., 'max': 11., 'count': 12}
+        for how in expected:
+            annual_dataset = dp.temporal_rebin(self.ten_year_monthly_dataset,
+                                               "annual", how=how)
+            self.assertEqual(annual_dataset.values[0, 0, 0], expected[how])
+
+
+class TestRcmesCalcAverageOnNewTimeUnitK(unittest.TestCase):
+
+    def setUp(self):
+        self.dates = np.array([datetime.datetime(2000, 1, 1) +
+                               datetime.timedelta(days=day)
+                               for day in range(366)])
+        self.values = ma.array(np.ones((366, 2, 2)) *
+                               np.arange(366)[:, np.newaxis, np.newaxis])
+
+    def test_monthly_means(self):
+        means, times = dp._rcmes_calc_average_on_new_time_unit_K(
+            self.values, self.dates, 'monthly')
+        self.assertEqual(means.shape, (12, 2, 2))
+        np.testing.assert_array_equal(means[:2, 0, 0], [15., 45.])
+        self.assertEqual(times[1], datetime.datetime(2000, 2, 1))
+
+    def test_missing_data_threshold(self):
+        self.values[:24, 0, 0] = ma.masked
+        self.values[:23, 1, 1] = ma.masked
+        means, _ = dp._rcmes_calc_average_on_new_time_unit_K(
+            self.values, self.dates, 'monthly')
+        self.assertTrue(means.mask[0, 0, 0])
+        self.assertFalse(means.mask[0, 1, 1])
+        self.assertEqual(means[0, 1, 1], 26.5)
+        self.assertEqual(means.mask.sum(), 1)
+
+    def test_seasonal_units(self):
+        means, times = dp._rcmes_calc_average_on_new_time_unit_K(
+            self.values, self.dates, 'seasonal')
+        self.assertEqual(times, [datetime.datetime(1999, 12, 1),
+                                 datetime.datetime(2000, 3, 1),
+                                 datetime.datetime(2000, 6, 1),
+                                 datetime.datetime(2000, 9, 1),
+                                 datetime.datetime(2000, 12, 1)])
+        self.assertEqual(means[0, 0, 0], 29.5)
+        self.assertEqual(means[-1, 0, 0], 350.)
+
+    def test_pentad_units(self):
+        means, times = dp._rcmes_calc_average_on_new_time_unit_K(
+            self.values, self.dates, 'pentad')
+        self.assertEqual(len(times), 73)
+        # February 29 is in the pentad starting on February 25
+        self.assertEqual(times[11], datetime.datetime(2000, 2, 25))
+        self.assertEqual(means[11, 0, 0], 57.5)
+        self.assertEqual(times[12], datetime.datetime(2000, 3, 2))
+
+    def test_time_series(self):
+        means, times = dp._rcmes_calc_average_on_new_time_unit_K(
+            np.arange(366.), self.dates, 'annual')
+        np.testing.assert_array_equal(means, [182.5])
+        self.assertEqual(times, [datetime.datetime(2000, 1, 1)])
+
+    def test_invalid_unit(self):
+        with self.assertRaises(ValueError):
+            dp._rcmes_calc_average_on_new_time_unit_K(
+                self.values, self.dates, 'weekly')
+
 
 class TestRcmesSpatialRegrid(unittest.TestCase):
 
@@ -399,6 +502,163 @@ class TestSpatialRegrid(unittest.TestCase):
             self.input_dataset, self.new_lats, self.new_lons)
         np.testing.assert_array_equal(new_dataset.lats, self.new_lats)
 
+    def test_points_outside_of_the_grid(self):
+        self.input_dataset.lats = np.arange(-10., 11., 2.)
+        self.input_dataset.lons = np.arange(-10., 11., 2.)
+        self.input_dataset.values = ma.ones(
+            (len(self.input_dataset.times), 11, 11))
+        new_lats = np.array([-20., 0., 20.])
+        new_lons = np.array([0.])
+        new_dataset = dp.spatial_regrid(self.input_dataset, new_lats,
+                                        new_lons)
+        np.testing.assert_array_equal(new_dataset.values.mask[0, :, 0],
+                                      [True, False, True])
+        # Without the boundary check only points south of the grid are
+        # masked, the other points off the grid are 0
+        new_dataset = dp.spatial_regrid(self.input_dataset, new_lats,
+                                        new_lons, boundary_check=False)
+        np.testing.assert_array_equal(new_dataset.values.mask[0, :, 0],
+                                      [True, False, False])
+        self.assertEqual(new_dataset.values[0, 2, 0], 0.)
+
+    def test_regular_grid_interpolated_values(self):
+        lons, lats = np.meshgrid(self.input_dataset.lons,
+                                 self.input_dataset.lats)
+        self.input_dataset.values = np.tile(lats + 2. * lons,
+                                            (len(self.input_dataset.times),
+                                             1, 1))
+        new_lats = np.arange(-80., 80.5, 0.5)
+        new_lons = np.arange(-170., 170.5, 0.5)
+        new_dataset = dp.spatial_regrid(
+            self.input_dataset, new_lats, new_lons)
+        new_lons, new_lats = np.meshgrid(new_lons, new_lats)
+        np.testing.assert_array_almost_equal(new_dataset.values[0],
+                                             new_lats + 2. * new_lons)
+
+    def test_curvilinear_grid_interpolated_values(self):
+        lons, lats = np.meshgrid(self.input_dataset.lons,
+                                 self.input_dataset.lats)
+        self.input_dataset.lats = lats
+        self.input_dataset.lons = lons
+        self.input_dataset.values = np.tile(lats + 2. * lons,
+                                            (len(self.input_dataset.times),
+                                             1, 1))
+        new_lats = np.arange(-40., 40.5, 0.5)
+        new_lons = np.arange(-80., 80.5, 0.5)
+        new_dataset = dp.spatial_regrid(
+            self.input_dataset, new_lats, new_lons)
+        new_lons, new_lats = np.meshgrid(new_lons, new_lats)
+        np.testing.assert_array_almost_equal(new_dataset.values[0],
+                                             new_lats + 2. * new_lons, 2)
+
+    def test_inverse_distance_method(self):
+        new_dataset = dp.spatial_regrid(self.input_dataset, self.new_lats,
+                                        self.new_lons,
+                                        method='inverse_distance')
+        self.assertEqual(new_dataset.values.shape,
+                         self.regridded_dataset.values.shape)
+
+    def test_time_chunk_size(self):
+        new_dataset = dp.spatial_regrid(self.input_dataset, self.new_lats,
+                                        self.new_lons, time_chunk_size=7)
+        np.testing.assert_array_equal(new_dataset.values,
+                                      self.regridded_dataset.values)
+
+    def test_conservative_method(self):
+        self.input_dataset.values = ma.array(
+            np.ones(self.input_dataset.values.shape))
+        self.input_dataset.values[:, 0, 0] = ma.masked
+        new_lats = np.arange(-80., 81., 10.)
+        new_lons = np.arange(-170., 171., 10.)
+        new_dataset = dp.spatial_regrid(self.input_dataset, new_lats,
+                                        new_lons, method='conservative')
+        self.assertFalse(ma.getmaskarray(new_dataset.values).any())
+        np.testing.assert_array_almost_equal(
+            new_dataset.values, np.ones(new_dataset.values.shape))
+
+    def test_invalid_method(self):
+        with self.assertRaises(ValueError):
+            dp.spatial_regrid(self.input_dataset, self.new_lats,
+                              self.new_lons, method='cubic')
+
+    def test_weights_cache_matches_interpolation(self):
+        values = ma.array(np.random.RandomState(0).rand(
+            *self.input_dataset.values.shape))
+        values[:, 10, 20] = ma.masked
+        self.input_dataset.values = values
+        new_lats = np.arange(-80., 80.5, 3.)
+        new_lons = np.arange(-170., 170.5, 3.)
+        cache = RegridWeightsCache()
+        expected = dp.spatial_regrid(self.input_dataset, new_lats, new_lons)
+        new_dataset = dp.spatial_regrid(self.input_dataset, new_lats,
+                                        new_lons, weights_cache=cache)
+        self.assertEqual(len(cache), 1)
+        np.testing.assert_array_equal(new_dataset.values.mask,
+                                      expected.values.mask)
+        np.testing.assert_array_almost_equal(new_dataset.values,
+                                             expected.values)
+
+    def test_regular_grid_outside_domain_is_masked(self):
+        new_lats = np.arange(-100., 101., 10.)
+        new_lons = np.arange(-170., 171., 10.)
+        new_dataset = dp.spatial_regrid(
+            self.input_dataset, new_lats, new_lons)
+        outside = np.abs(new_lats) > 89
+        self.assertTrue(new_dataset.values.mask[:, outside, :].all())
+        self.assertFalse(new_dataset.values.mask[:, ~outside, :].any())
+
+
+class TestSpatialCoarsen(unittest.TestCase):
+
+    def setUp(self):
+        self.input_dataset = ten_year_monthly_dataset()
+        self.input_dataset.values = ma.array(
+            np.random.RandomState(0).rand(*self.input_dataset.values.shape))
+
+    def test_returned_grid(self):
+        new_dataset = dp.spatial_coarsen(self.input_dataset, 3, 4)
+        np.testing.assert_array_equal(new_dataset.lats,
+                                      np.arange(-87., 90., 6.))
+        np.testing.assert_array_equal(new_dataset.lons,
+                                      np.arange(-176., 180., 8.))
+        self.assertEqual(new_dataset.values.shape, (120, 30, 45))
+        np.testing.assert_array_equal(new_dataset.times,
+                                      self.input_dataset.times)
+
+    def test_reductions(self):
+        block = self.input_dataset.values[:, 2:4, 4:6]
+        for how in ('mean', 'sum', 'max'):
+            new_dataset = dp.spatial_coarsen(self.input_dataset, 2, 2,
+                                             how=how)
+            expected = getattr(block.reshape(120, 4), how)(axis=1)
+            np.testing.assert_array_almost_equal(
+                new_dataset.values[:, 1, 2], expected)
+
+    def test_masked_values(self):
+        self.input_dataset.values[:, 0, 0] = ma.masked
+        self.input_dataset.values[:, 2:4, 0:2] = ma.masked
+        new_dataset = dp.spatial_coarsen(self.input_dataset, 2, 2)
+        np.testing.assert_array_almost_equal(
+            new_dataset.values[:, 0, 0],
+            self.input_dataset.values[:, 0:2, 0:2].mean(axis=(1, 2)))
+        np.testing.assert_array_equal(new_dataset.values.mask[0, :2, 0],
+                                      [False, True])
+
+    def test_min_valid_fraction(self):
+        self.input_dataset.values[:, 0, 0] = ma.masked
+        new_dataset = dp.spatial_coarsen(self.input_dataset, 2, 2,
+                                         min_valid_fraction=0.8)
+        self.assertTrue(new_dataset.values.mask[:, 0, 0].all())
+        self.assertEqual(new_dataset.values.mask.sum(), 120)
+
+    def test_invalid_arguments(self):
+        with self.assertRaises(ValueError):
+            dp.spatial_coarsen(self.input_dataset, 2, 2, how='median')
+        with self.assertRaises(ValueError):
+            dp.spatial_coarsen(self.input_dataset, 0, 2)
+        with self.assertRaises(ValueError):
+            dp.spatial_coarsen(self.input_dataset, 2, 1.5)
+
 
 class TestNormalizeDatasetDatetimes(unittest.TestCase):
 
@@ -631,6 +891,23 @@ class TestFailingSubset(unittest.TestCase):
             dp.subset(self.target_dataset, self.subregion)
 
 
+class TestMaskMissingData(unittest.TestCase):
+
+    def test_missing_values_masked_in_all_datasets(self):
+        first = ten_year_monthly_dataset()
+        second = ten_year_monthly_dataset()
+        first.values = ma.array(first.values)
+        second.values = ma.array(second.values)
+        first.values[0, 1, 2] = ma.masked
+        second.values[3, 4, 5] = ma.masked
+        datasets = dp.mask_missing_data([first, second])
+        self.assertEqual(len(datasets), 2)
+        for dataset in datasets:
+            self.assertEqual(dataset.values.mask.sum(), 2)
+            self.assertTrue(dataset.values.mask[0, 1, 2])
+            self.assertTrue(dataset.values.mask[3, 4, 5])
+
+
 class TestNetCDFWrite(unittest.TestCase):
 
     def setUp(self):
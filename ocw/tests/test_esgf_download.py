@@ -0,0 +1,161 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+import threading
+import unittest
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+
+import ocw.esgf.download as download
+
+FILES = {
+    '/data/tas_2000.nc': b'tas' * 1000,
+    '/data/pr_2000.nc': b'pr' * 2000,
+}
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class FileHandler(BaseHTTPRequestHandler):
+    '''Serve FILES, honouring Range headers unless the server ignores them.'''
+
+    def do_GET(self):
+        self.server.requests.append((self.path, self.headers.get('Range')))
+        body = FILES[self.path]
+        match = re.match(r'bytes=(\d+)-', self.headers.get('Range') or '')
+        if match and self.server.ranges:
+            start = int(match.group(1))
+            if start >= len(body):
+                self.send_response(416)
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header('Content-Range', 'bytes %d-%d/%d' %
+                             (start, len(body) - 1, len(body)))
+            body = body[start:]
+        else:
+            self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestDownload(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), FileHandler)
+        self.server.requests = []
+        self.server.ranges = True
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+        self.directory = tempfile.mkdtemp()
+        self.url = 'http://127.0.0.1:%d/data/tas_2000.nc' % (
+            self.server.server_port)
+        self.path = os.path.join(self.directory, 'tas_2000.nc')
+        self.body = FILES['/data/tas_2000.nc']
+        self.checksum = hashlib.sha256(self.body).hexdigest()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+        shutil.rmtree(self.directory)
+
+    def read(self, path):
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def test_download(self):
+        path = download.download(self.url, self.directory,
+                                 size=len(self.body), checksum=self.checksum)
+        self.assertEqual(path, self.path)
+        self.assertEqual(self.read(path), self.body)
+        self.assertFalse(os.path.exists(path + '.part'))
+
+    def test_resume_partial_file(self):
+        with open(self.path + '.part', 'wb') as f:
+            f.write(self.body[:1000])
+        download.download(self.url, self.directory, checksum=self.checksum)
+        self.assertEqual(self.server.requests,
+                         [('/data/tas_2000.nc', 'bytes=1000-')])
+        self.assertEqual(self.read(self.path), self.body)
+
+    def test_resume_complete_partial_file(self):
+        with open(self.path + '.part', 'wb') as f:
+            f.write(self.body)
+        download.download(self.url, self.directory, checksum=self.checksum)
+        self.assertEqual(self.read(self.path), self.body)
+
+    def test_server_without_range_support(self):
+        self.server.ranges = False
+        with open(self.path + '.part', 'wb') as f:
+            f.write(b'stale')
+        download.download(self.url, self.directory, checksum=self.checksum)
+        self.assertEqual(self.read(self.path), self.body)
+
+    def test_checksum_mismatch(self):
+        with self.assertRaises(ValueError):
+            download.download(self.url, self.directory, checksum='0' * 64)
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_md5_checksum(self):
+        download.download(self.url, self.directory,
+                          checksum=hashlib.md5(self.body).hexdigest(),
+                          checksum_type='MD5')
+        self.assertEqual(self.read(self.path), self.body)
+
+    def test_skip_downloaded_file(self):
+        with open(self.path, 'wb') as f:
+            f.write(self.body)
+        download.download(self.url, self.directory, size=len(self.body),
+                          checksum=self.checksum)
+        self.assertEqual(self.server.requests, [])
+
+    def test_replace_corrupt_file(self):
+        with open(self.path, 'wb') as f:
+            f.write(b'x' * len(self.body))
+        download.download(self.url, self.directory, size=len(self.body),
+                          checksum=self.checksum)
+        self.assertEqual(self.read(self.path), self.body)
+
+    def test_download_files(self):
+        pr_url = 'http://127.0.0.1:%d/data/pr_2000.nc' % (
+            self.server.server_port)
+        paths = download.download_files(
+            [{'url': self.url, 'checksum': self.checksum}, pr_url],
+            self.directory, max_workers=2)
+        self.assertEqual(paths, [self.path,
+                                 os.path.join(self.directory, 'pr_2000.nc')])
+        self.assertEqual(self.read(paths[1]), FILES['/data/pr_2000.nc'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -24,10 +24,15 @@ except ImportError:
 import datetime
 import unittest
 import os
+import shutil
+import tempfile
+import h5py
 import netCDF4
 import numpy as np
 
 import ocw.data_source.local as local
+import ocw.dataset_processor as dsp
+from ocw.dataset import Bounds, LazyDataset
 
 
 class test_load_file(unittest.TestCase):
@@ -106,6 +111,63 @@ class test_load_file(unittest.TestCase):
         self.assertEqual(set(ds.origin.keys()), expected_keys)
         self.assertEqual(ds.origin['source'], 'local')
 
+    def test_lazy_load_file(self):
+        dataset = local.load_file(self.file_path, 'value', lazy=True)
+        self.assertIsInstance(dataset, LazyDataset)
+        self.assertFalse(dataset.is_loaded)
+        np.testing.assert_array_equal(dataset.values,
+                                      self.values[:, 0, :, :])
+
+    def test_lazy_load_file_subset(self):
+        dataset = local.load_file(self.file_path, 'value', elevation_index=1,
+                                  lazy=True)
+        bounds = Bounds(lat_min=1, lat_max=3, lon_min=151, lon_max=152,
+                        start=datetime.datetime(2001, 2, 1),
+                        end=datetime.datetime(2001, 3, 1))
+        subset = dsp.subset(dataset, bounds)
+        self.assertFalse(subset.is_loaded)
+        np.testing.assert_array_equal(subset.values,
+                                      self.values[1:, 1, 1:4, 1:3])
+        subset = dsp.temporal_slice(subset, 1, 1)
+        np.testing.assert_array_equal(subset.values,
+                                      self.values[2:, 1, 1:4, 1:3])
+
+    def test_load_file_elevation_index(self):
+        dataset = local.load_file(self.file_path, 'value', elevation_index=1)
+        np.testing.assert_array_equal(dataset.values, self.values[:, 1])
+
+    def test_load_file_level_first(self):
+        file_path = create_invalid_dimensions_netcdf_object(
+            '/tmp/temporaryLevelFirstNetcdf.nc')
+        self.addCleanup(os.remove, file_path)
+        values = netCDF4.Dataset(file_path).variables['value'][:]
+        dataset = local.load_file(file_path, 'value', elevation_index=1)
+        np.testing.assert_array_equal(dataset.values, values[1])
+
+    def test_load_file_multiple_levels(self):
+        dataset = local.load_file(self.file_path, 'value',
+                                  elevation_index=[1, 0])
+        self.assertEqual(dataset.values.shape, (3, 2, 5, 5))
+        np.testing.assert_array_equal(dataset.values,
+                                      self.values[:, [1, 0]])
+
+    def test_load_file_with_bounds(self):
+        bounds = Bounds(lat_min=1, lat_max=3, lon_min=151, lon_max=152,
+                        start=datetime.datetime(2001, 2, 1),
+                        end=datetime.datetime(2001, 3, 1))
+        dataset = local.load_file(self.file_path, 'value', bounds=bounds)
+        self.assertNotIsInstance(dataset, LazyDataset)
+        np.testing.assert_array_equal(dataset.lats, self.latitudes[1:4])
+        np.testing.assert_array_equal(dataset.lons, self.longitudes[1:3])
+        self.assertEqual(len(dataset.times), 2)
+        np.testing.assert_array_equal(dataset.values,
+                                      self.values[1:, 0, 1:4, 1:3])
+
+    def test_load_file_with_bounds_outside(self):
+        bounds = Bounds(lat_min=-20, lat_max=-10)
+        with self.assertRaises(ValueError):
+            local.load_file(self.file_path, 'value', bounds=bounds)
+
 
 class TestLoadMultipleFiles(unittest.TestCase):
 
@@ -154,6 +216,13 @@ class TestLoadMultipleFiles(unittest.TestCase):
                                             dataset_name='foo')
         self.assertEqual(dataset[0].name, 'foo')
 
+    def test_load_multiple_files_with_bounds(self):
+        bounds = Bounds(lat_min=0, lat_max=1, lon_min=153, lon_max=154)
+        dataset = local.load_multiple_files(self.file_path, "value",
+                                            bounds=bounds)
+        np.testing.assert_array_equal(dataset[0].values,
+                                      self.values[:, 0, :2, 3:])
+
     def test_dataset_origin(self):
         dataset = local.load_multiple_files(self.file_path, 'value')
         expected_keys = set(['source', 'path', 'lat_name', 'lon_name',
@@ -232,6 +301,185 @@ class TestLoadDatasetFromMultipleNetcdfFiles(unittest.TestCase):
         new_values = self.values[:, 0, :, :]
         self.assertTrue(np.allclose(self.dataset.values, new_values))
 
+    def test_load_dataset_from_multiple_netcdf_files_in_threads(self):
+        second_file_path = create_netcdf_object(
+            '/tmp/temporaryNetcdf_2.nc')
+        self.addCleanup(os.remove, second_file_path)
+        with netCDF4.Dataset(second_file_path, 'r+') as netcdf:
+            netcdf.variables['time'][:] = np.arange(3, 6)
+            netcdf.variables['value'][:] = -self.values
+        dataset = local.load_dataset_from_multiple_netcdf_files(
+            variable_name='value', file_path='',
+            filename_pattern=[second_file_path, self.file_path],
+            max_workers=2)
+        self.assertEqual(len(dataset.times), 6)
+        self.assertEqual(dataset.times[-1], datetime.datetime(2001, 6, 1))
+        np.testing.assert_array_equal(dataset.values[:3],
+                                      self.values[:, 0])
+        np.testing.assert_array_equal(dataset.values[3:],
+                                      -self.values[:, 0])
+
+    def test_load_dataset_from_multiple_netcdf_files_with_bounds(self):
+        bounds = Bounds(lat_min=2, lat_max=4, lon_min=150, lon_max=150,
+                        start=datetime.datetime(2001, 3, 1))
+        dataset = local.load_dataset_from_multiple_netcdf_files(
+            variable_name='value', file_path='',
+            filename_pattern=[self.file_path], bounds=bounds)
+        self.assertEqual(dataset.lats.shape, (3, 1))
+        np.testing.assert_array_equal(dataset.times,
+                                      [datetime.datetime(2001, 3, 1)])
+        np.testing.assert_array_equal(dataset.values,
+                                      self.values[2:, 0, 2:, :1])
+
+
+class TestLoadGranuleFiles(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.lats = np.arange(30., 35.)
+        self.lons = np.arange(-100., -96.)
+        self.values = np.arange(120.).reshape(6, 5, 4)
+        self.values[0, 0, 0] = -1.
+        for ihour in range(6):
+            # Three hourly granules on each of two days
+            day, hour = divmod(ihour, 3)
+            stamp = datetime.datetime(2000, 1, 1 + day, hour)
+            nldas_path = os.path.join(
+                self.directory,
+                stamp.strftime('NLDAS_FORA0125_H.A%Y%m%d.%H%M.002.nc'))
+            with netCDF4.Dataset(nldas_path, 'w') as netcdf:
+                netcdf.createDimension('lat_110', 5)
+                netcdf.createDimension('lon_110', 4)
+                netcdf.createVariable('lat_110', 'd', ('lat_110',))[:] = \
+                    self.lats
+                netcdf.createVariable('lon_110', 'd', ('lon_110',))[:] = \
+                    self.lons
+                variable = netcdf.createVariable(
+                    'APCPsfc_110_SFC_acc1h', 'f', ('lat_110', 'lon_110'))
+                variable[:] = self.values[ihour]
+                variable.units = 'kg/m^2'
+            gpm_path = os.path.join(
+                self.directory,
+                stamp.strftime('3B-HHR.MS.MRG.3IMERG.%Y%m%d-S%H%M%S-E002959'
+                               '.0000.V03D.HDF5'))
+            with h5py.File(gpm_path, 'w') as hdf:
+                grid = hdf.create_group('Grid')
+                grid['lat'] = self.lats
+                grid['lon'] = self.lons
+                grid['precipitationCal'] = self.values[ihour].T
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_load_NLDAS_forcingA_files(self):
+        dataset = local.load_NLDAS_forcingA_files(
+            file_path=self.directory + '/', filename_pattern=['NLDAS*.nc'])
+        self.assertEqual(dataset.times[4], datetime.datetime(2000, 1, 2, 1))
+        self.assertEqual(dataset.units, 'kg/m^2')
+        np.testing.assert_array_equal(dataset.values, self.values)
+
+    def test_load_NLDAS_forcingA_files_daily_window(self):
+        bounds = Bounds(lat_min=31, lat_max=32, lon_min=-99, lon_max=-99)
+        dataset = local.load_NLDAS_forcingA_files(
+            file_path=self.directory + '/', filename_pattern=['NLDAS*.nc'],
+            bounds=bounds, temporal_resolution='daily', how='sum',
+            max_workers=3)
+        np.testing.assert_array_equal(dataset.times,
+                                      [datetime.datetime(2000, 1, 1),
+                                       datetime.datetime(2000, 1, 2)])
+        np.testing.assert_array_equal(dataset.lons, [[-99.], [-99.]])
+        np.testing.assert_array_equal(
+            dataset.values,
+            self.values.reshape(2, 3, 5, 4).sum(axis=1)[:, 1:3, 1:2])
+
+    def test_load_GPM_IMERG_files(self):
+        dataset = local.load_GPM_IMERG_files(
+            file_path=self.directory + '/', filename_pattern=['3B-HHR*'],
+            max_workers=2)
+        self.assertEqual(len(dataset.times), 6)
+        np.testing.assert_array_equal(dataset.values.mask[0, 0, 0], True)
+        np.testing.assert_array_equal(dataset.values[1:], self.values[1:])
+
+    def test_load_GPM_IMERG_files_daily_mean(self):
+        dataset = local.load_GPM_IMERG_files(
+            file_path=self.directory + '/', filename_pattern=['3B-HHR*'],
+            temporal_resolution='daily')
+        # The negative value of the first granule is masked out of the mean
+        self.assertEqual(dataset.values[0, 0, 0],
+                         (self.values[1, 0, 0] + self.values[2, 0, 0]) / 2.)
+        np.testing.assert_array_almost_equal(
+            dataset.values[1], self.values[3:].mean(axis=0))
+
+    def test_invalid_temporal_resolution(self):
+        with self.assertRaises(ValueError):
+            local.load_GPM_IMERG_files(
+                file_path=self.directory + '/', filename_pattern=['3B-HHR*'],
+                temporal_resolution='weekly')
+
+
+class TestLoadWRFRain(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.lats, self.lons = np.meshgrid(np.arange(20., 23.),
+                                           np.arange(-90., -86.),
+                                           indexing='ij')
+        # Two files of the 2000 cycle and two of the 2001 cycle with six
+        # hourly steps each. The first file of every cycle is spin-up.
+        self.rates = np.random.RandomState(0).rand(4, 6, 3, 4).astype('f')
+        starts = [datetime.datetime(2000, 12, 30),
+                  datetime.datetime(2000, 12, 31),
+                  datetime.datetime(2001, 1, 1),
+                  datetime.datetime(2001, 1, 2)]
+        for ifile, start in enumerate(starts):
+            accumulated = np.cumsum(self.rates[ifile], axis=0)
+            if ifile % 2:
+                accumulated += self.rates[ifile - 1].sum(axis=0)
+            path = os.path.join(self.directory, start.strftime(
+                'wrfout_d01_%Y-%m-%d_%H:%M:%S'))
+            with netCDF4.Dataset(path, 'w') as netcdf:
+                netcdf.BUCKET_MM = 1.
+                netcdf.createDimension('Time', 6)
+                netcdf.createDimension('south_north', 3)
+                netcdf.createDimension('west_east', 4)
+                dims = ('Time', 'south_north', 'west_east')
+                netcdf.createVariable('XLAT', 'f', dims)[:] = self.lats
+                netcdf.createVariable('XLONG', 'f', dims)[:] = self.lons
+                # Split the accumulation between the two fields and reset
+                # the RAINNC bucket every 1 mm
+                netcdf.createVariable('RAINC', 'f', dims)[:] = \
+                    0.5 * accumulated
+                buckets = np.floor(0.5 * accumulated)
+                netcdf.createVariable('RAINNC', 'f', dims)[:] = \
+                    0.5 * accumulated - buckets
+                netcdf.createVariable('I_RAINNC', 'i', dims)[:] = buckets
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_hourly_rates(self):
+        dataset = local.load_WRF_2d_files_RAIN(
+            file_path=self.directory + '/', filename_pattern=['wrfout*'])
+        self.assertEqual(dataset.units, 'mm/hr')
+        self.assertEqual(len(dataset.times), 12)
+        self.assertEqual(dataset.times[6], datetime.datetime(2001, 1, 2))
+        np.testing.assert_array_almost_equal(
+            dataset.values, np.concatenate([self.rates[1], self.rates[3]]),
+            5)
+
+    def test_daily_totals_in_window(self):
+        bounds = Bounds(lat_min=21, lat_max=22, lon_min=-89, lon_max=-89)
+        dataset = local.load_WRF_2d_files_RAIN(
+            file_path=self.directory + '/', filename_pattern=['wrfout*'],
+            bounds=bounds, temporal_resolution='daily')
+        self.assertEqual(dataset.units, 'mm/day')
+        np.testing.assert_array_equal(dataset.times,
+                                      [datetime.datetime(2000, 12, 31),
+                                       datetime.datetime(2001, 1, 2)])
+        np.testing.assert_array_almost_equal(
+            dataset.values,
+            self.rates[[1, 3]].sum(axis=1)[:, 1:3, 1:2], 5)
+
 
 class test_get_netcdf_variable_names(unittest.TestCase):
     file_path = "http://zipper.jpl.nasa.gov/dist/"
@@ -274,9 +522,8 @@ class test_get_netcdf_variable_names(unittest.TestCase):
                                                        "tasmax")
 
 
-def create_netcdf_object():
+def create_netcdf_object(file_path='/tmp/temporaryNetcdf.nc'):
     # To create the temporary netCDF file
-    file_path = '/tmp/temporaryNetcdf.nc'
     netCDF_file = netCDF4.Dataset(file_path, 'w', format='NETCDF4')
     # To create dimensions
     netCDF_file.createDimension('lat_dim', 5)
@@ -330,9 +577,9 @@ def create_netcdf_object():
     return file_path
 
 
-def create_invalid_dimensions_netcdf_object():
+def create_invalid_dimensions_netcdf_object(
+        file_path='/tmp/temporaryNetcdf.nc'):
     # To create the temporary netCDF file
-    file_path = '/tmp/temporaryNetcdf.nc'
     netCDF_file = netCDF4.Dataset(file_path, 'w', format='NETCDF4')
     # To create dimensions
     netCDF_file.createDimension('lat_dim', 5)
@@ -371,6 +618,7 @@ def create_invalid_dimensions_netcdf_object():
     values[:] = fvalues
     # Assign time info to time variable
     netCDF_file.variables['time'].units = 'months since 2001-01-01 00:00:00'
+    netCDF_file.variables['value'].units = 'foo_units'
     netCDF_file.close()
     return file_path
 
@@ -19,7 +19,11 @@
 import ocw.data_source.podaac_datasource as podaac
 import unittest
 import os
+import shutil
+import tempfile
 import datetime as dt
+import numpy as np
+from netCDF4 import Dataset as netcdf_dataset
 from ocw.dataset import Dataset
 
 
@@ -72,5 +76,105 @@ class TestPodaacDataSource(unittest.TestCase):
         #https://podaac.jpl.nasa.gov/forum/viewtopic.php?f=53&t=424&p=790
         pass
 
+
+class FakePodaac(object):
+    '''Stand-in for the PO.DAAC toolkit which never touches the network.'''
+    statuses = []
+    downloads = []
+
+    def granule_subset(self, input_file_path):
+        return 'token'
+
+    def subset_status(self, token):
+        return FakePodaac.statuses.pop(0)
+
+    def extract_l4_granule(self, dataset_id, path):
+        FakePodaac.downloads.append(dataset_id)
+        granule = netcdf_dataset(os.path.join(path, 'granule.nc'), 'w')
+        granule.createDimension('time', 1)
+        granule.createDimension('lat', 3)
+        granule.createDimension('lon', 4)
+        granule.createVariable('lat', 'f8', ('lat',))[:] = [-10., 0., 10.]
+        granule.createVariable('lon', 'f8', ('lon',))[:] = [0., 10., 20., 30.]
+        times = granule.createVariable('time', 'f8', ('time',))
+        times[:] = [86400.]
+        times.units = 'seconds since 1991-09-01 12:00:00'
+        granule.createVariable('sst', 'f4', ('time', 'lat', 'lon'))[:] = 1.
+        granule.close()
+        return 'granule.nc'
+
+
+class TestPodaacOffline(unittest.TestCase):
+
+    def setUp(self):
+        self.podaac = podaac.Podaac
+        self.sleep = podaac.time.sleep
+        podaac.Podaac = FakePodaac
+        self.delays = []
+        podaac.time.sleep = self.delays.append
+        FakePodaac.statuses = []
+        FakePodaac.downloads = []
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        podaac.Podaac = self.podaac
+        podaac.time.sleep = self.sleep
+        shutil.rmtree(self.directory)
+
+    def test_subset_polls_with_backoff(self):
+        FakePodaac.statuses = ['queued'] * 4 + ['done']
+        self.assertEqual(podaac.subset_granule('subset.json',
+                                               max_poll_interval=4), 'token')
+        self.assertEqual(self.delays, [1, 2, 4, 4])
+
+    def test_subset_error(self):
+        FakePodaac.statuses = ['queued', 'error']
+        with self.assertRaises(RuntimeError):
+            podaac.subset_granule('subset.json')
+
+    def test_subset_timeout(self):
+        FakePodaac.statuses = ['queued'] * 10
+        with self.assertRaises(RuntimeError):
+            podaac.subset_granule('subset.json', timeout=0)
+
+    def test_subset_async(self):
+        FakePodaac.statuses = ['queued', 'done']
+        future = podaac.subset_granule_async('subset.json')
+        self.assertEqual(future.result(), 'token')
+
+    def test_load_granule(self):
+        dataset = podaac.load_level4_granule('sst', 'PODAAC-TEST', 'test')
+        self.assertEqual(dataset.times[0], dt.datetime(1991, 9, 2, 12))
+        self.assertEqual(dataset.values.shape, (1, 3, 4))
+        self.assertEqual(dataset.name, 'test')
+
+    def test_load_granule_from_cache(self):
+        podaac.load_level4_granule('sst', 'PODAAC-TEST',
+                                   cache_dir=self.directory)
+        dataset = podaac.load_level4_granule('sst', 'PODAAC-TEST', 'cached',
+                                             cache_dir=self.directory)
+        self.assertEqual(FakePodaac.downloads, ['PODAAC-TEST'])
+        self.assertEqual(dataset.name, 'cached')
+        np.testing.assert_array_equal(dataset.values, np.ones((1, 3, 4)))
+
+    def test_cached_granule_expires(self):
+        podaac.load_level4_granule('sst', 'PODAAC-TEST',
+                                   cache_dir=self.directory, cache_ttl=60)
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                past = os.path.getmtime(os.path.join(root, name)) - 120
+                os.utime(os.path.join(root, name), (past, past))
+        podaac.load_level4_granule('sst', 'PODAAC-TEST',
+                                   cache_dir=self.directory, cache_ttl=60)
+        self.assertEqual(FakePodaac.downloads, ['PODAAC-TEST'] * 2)
+
+    def test_load_granules(self):
+        datasets = podaac.load_level4_granules(
+            'sst', ['PODAAC-A', 'PODAAC-B'], names=['a', 'b'])
+        self.assertEqual([dataset.name for dataset in datasets], ['a', 'b'])
+        self.assertEqual(sorted(FakePodaac.downloads),
+                         ['PODAAC-A', 'PODAAC-B'])
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -20,8 +20,18 @@ import datetime
 import numpy as np
 import pickle
 import os
+import shutil
+import tempfile
+import threading
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
 import ocw.data_source.rcmed as rcmed
 
+# The tests below replace rcmed.urlopen with canned responses
+_urlopen = rcmed.urlopen
+
 
 class CustomAssertions:
     # Custom Assertions to handle Numpy Arrays
@@ -191,6 +201,143 @@ class test_rcmed(unittest.TestCase, CustomAssertions):
         self.assertEquals(ds.origin['dataset_id'], self.dataset_id)
         self.assertEquals(ds.origin['parameter_id'], self.parameter_id)
 
+    def test_function_get_data_small_blocks(self):
+        rcmed.urlopen = self.return_text
+        url = rcmed._generate_query_url(self.dataset_id, self.parameter_id,
+                                        self.min_lat, self.max_lat,
+                                        self.min_lon, self.max_lon,
+                                        self.start_time, self.end_time,
+                                        'daily')
+        lats, lons, times, values = rcmed._get_data(url)
+        block_lats, block_lons, block_times, block_values = rcmed._get_data(
+            url, block_size=100)
+        np.testing.assert_array_equal(block_lats, lats)
+        np.testing.assert_array_equal(block_lons, lons)
+        np.testing.assert_array_equal(block_times, times)
+        np.testing.assert_array_equal(block_values, values)
+        self.assertEqual(len(values), len(self.times) * 20 * 14)
+
+    def test_function_reshape_values_unsorted(self):
+        lats = np.array([1., 0., 1., 0.], dtype=np.float32)
+        lons = np.array([5., 5., 6., 6.], dtype=np.float32)
+        times = np.array(['2000-01-02', '2000-01-01', '2000-01-01',
+                          '2000-01-02'], dtype='datetime64[s]')
+        values = np.array([1., 2., 3., 4.], dtype=np.float32)
+        unique_values = rcmed._make_unique(lats, lons, times)
+        reshaped = rcmed._reshape_values(values, unique_values)
+        self.assertEqual(reshaped.shape, (2, 2, 2))
+        self.assertEqual(reshaped[1, 1, 0], 1.)
+        self.assertEqual(reshaped[0, 0, 0], 2.)
+        self.assertEqual(reshaped[0, 1, 1], 3.)
+        self.assertEqual(reshaped[1, 0, 1], 4.)
+        # Cells without a row are masked
+        self.assertEqual(reshaped.count(), 4)
+
+
+class CannedRCMEDHandler(BaseHTTPRequestHandler):
+    '''Serve the canned RCMED responses and record the requested paths.'''
+
+    def do_GET(self):
+        self.server.requests.append(self.path)
+        if 'param_info=yes' in self.path:
+            file_name = 'parameters_metadata_text.txt'
+        else:
+            file_name = 'parameter_dataset_text.txt'
+        with open(os.path.join(os.path.dirname(__file__), file_name),
+                  'rb') as f:
+            body = f.read()
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class test_rcmed_tiles(unittest.TestCase):
+
+    def setUp(self):
+        self.server = HTTPServer(('127.0.0.1', 0), CannedRCMEDHandler)
+        self.server.requests = []
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+
+        self.url = rcmed.URL
+        rcmed.URL = 'http://127.0.0.1:{0}/query-api/query.php?'.format(
+            self.server.server_port)
+        rcmed.urlopen = _urlopen
+        rcmed._PARAMETERS_METADATA.clear()
+        self.cache_dir = tempfile.mkdtemp()
+        self.values = np.load(os.path.join(os.path.dirname(__file__),
+                                           'parameter_values.npy'))
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+        rcmed.URL = self.url
+        rcmed._PARAMETERS_METADATA.clear()
+        shutil.rmtree(self.cache_dir)
+
+    def load(self, **kwargs):
+        return rcmed.parameter_dataset(2, 15, 50, 70, 1, 15,
+                                       datetime.datetime(2002, 8, 1),
+                                       datetime.datetime(2002, 10, 1),
+                                       **kwargs)
+
+    def test_tiles_are_stitched(self):
+        # The stand-in returns the whole dataset for every tile
+        dataset = self.load(tile_months=1, tile_degrees=10)
+        query_urls = [path for path in self.server.requests
+                      if 'param_info' not in path]
+        self.assertEqual(len(query_urls), 3 * 2 * 2)
+        september = [url for url in query_urls
+                     if 'timeStart=20020901T0000Z' in url]
+        self.assertEqual(len(september), 2 * 2)
+        self.assertIn('timeEnd=20020930T2359Z', september[0])
+        np.testing.assert_array_equal(dataset.values.flatten(),
+                                      self.values.flatten())
+
+    def test_sub_daily_time_tiles(self):
+        tiles = rcmed._time_tiles(datetime.datetime(2002, 1, 1),
+                                  datetime.datetime(2002, 3, 1, 18), 1)
+        self.assertEqual(tiles[0], (datetime.datetime(2002, 1, 1),
+                                    datetime.datetime(2002, 1, 31, 23, 59,
+                                                      59)))
+        self.assertEqual(tiles[-1][1], datetime.datetime(2002, 3, 1, 18))
+        url = rcmed._generate_query_url(2, 15, 50, 70, 1, 15, tiles[0][0],
+                                        tiles[0][1], '6-hourly')
+        self.assertIn('timeEnd=20020131T2359Z', url)
+
+    def test_session_pool_follows_max_workers(self):
+        self.load(max_workers=8)
+        adapter = rcmed._session.get_adapter(rcmed.URL)
+        self.assertEqual(adapter._pool_maxsize, 8)
+
+    def test_metadata_is_memoized(self):
+        self.load()
+        self.load()
+        metadata_urls = [path for path in self.server.requests
+                         if 'param_info' in path]
+        self.assertEqual(len(metadata_urls), 1)
+
+    def test_cached_responses(self):
+        self.load(tile_months=1, cache_dir=self.cache_dir)
+        self.assertEqual(len(self.server.requests), 4)
+
+        rcmed._PARAMETERS_METADATA.clear()
+        dataset = self.load(tile_months=1, cache_dir=self.cache_dir)
+        self.assertEqual(len(self.server.requests), 4)
+        np.testing.assert_array_equal(dataset.values.flatten(),
+                                      self.values.flatten())
+
+    def test_expired_cached_responses(self):
+        self.load(cache_dir=self.cache_dir)
+        rcmed._PARAMETERS_METADATA.clear()
+        self.load(cache_dir=self.cache_dir, cache_ttl=0)
+        self.assertEqual(len(self.server.requests), 4)
+
 
 def _force_bytes(s, encoding='utf-8'):
     if hasattr(s, 'encode'):
@@ -0,0 +1,286 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import numpy.ma as ma
+from scipy.ndimage import map_coordinates
+
+from ocw.regrid_weights import (RegridWeights, RegridWeightsCache,
+                                 CurvilinearGridIndex)
+
+
+class TestRegridWeights(unittest.TestCase):
+
+    def setUp(self):
+        self.values = np.arange(20.).reshape(4, 5) ** 2
+        lat_indices, lon_indices = np.meshgrid(np.linspace(0, 3, 7),
+                                               np.linspace(0, 4, 9),
+                                               indexing='ij')
+        self.lat_indices = ma.array(lat_indices)
+        self.lon_indices = ma.array(lon_indices)
+        self.weights = RegridWeights.from_fractional_indices(
+            self.lat_indices, self.lon_indices, self.values.shape)
+
+    def test_matches_map_coordinates(self):
+        expected = map_coordinates(self.values,
+                                   [self.lat_indices.ravel(),
+                                    self.lon_indices.ravel()],
+                                   order=1).reshape(self.lat_indices.shape)
+        np.testing.assert_array_almost_equal(
+            self.weights.apply(self.values), expected)
+
+    def test_apply_on_time_stack(self):
+        stack = np.array([self.values, 2. * self.values])
+        regridded = self.weights.apply(stack)
+        self.assertEqual(regridded.shape, (2,) + self.lat_indices.shape)
+        np.testing.assert_array_almost_equal(regridded[1], 2. * regridded[0])
+
+    def test_time_chunks_match_single_product(self):
+        stack = ma.array(np.random.RandomState(0).rand(5, 4, 5))
+        stack[2, 1, 1] = ma.masked
+        expected = self.weights.apply(stack)
+        regridded = self.weights.apply(stack, time_chunk_size=2)
+        np.testing.assert_array_equal(regridded.mask, expected.mask)
+        np.testing.assert_array_almost_equal(regridded, expected)
+
+    def test_invalid_time_chunk_size(self):
+        with self.assertRaises(ValueError):
+            self.weights.apply(self.values, time_chunk_size=0)
+
+    def test_masked_source_points_propagate(self):
+        values = ma.array(self.values, mask=np.zeros(self.values.shape))
+        values[1, 1] = ma.masked
+        regridded = self.weights.apply(values)
+        # Target points touching source point (1, 1) with a non-zero weight
+        touched = ((np.abs(self.lat_indices - 1) < 1) &
+                   (np.abs(self.lon_indices - 1) < 1))
+        np.testing.assert_array_equal(regridded.mask, touched)
+
+    def test_masked_indices_are_outside(self):
+        self.lat_indices[0, 0] = ma.masked
+        weights = RegridWeights.from_fractional_indices(
+            self.lat_indices, self.lon_indices, self.values.shape)
+        self.assertTrue(weights.apply(self.values).mask[0, 0])
+        self.assertEqual(weights.apply(self.values).mask.sum(), 1)
+
+    def test_invalid_values_shape(self):
+        with self.assertRaises(ValueError):
+            self.weights.apply(np.ones((3, 3)))
+
+    def test_key_depends_on_coordinates_and_options(self):
+        lats = np.arange(5.)
+        lons = np.arange(6.)
+        key = RegridWeights.make_key(lats, lons, lats, lons, method='a')
+        self.assertEqual(
+            key, RegridWeights.make_key(lats, lons, lats, lons, method='a'))
+        self.assertNotEqual(
+            key, RegridWeights.make_key(lats, lons, lats, lons, method='b'))
+        self.assertNotEqual(
+            key, RegridWeights.make_key(lats + 1, lons, lats, lons,
+                                        method='a'))
+
+
+class TestConservativeWeights(unittest.TestCase):
+
+    def setUp(self):
+        self.lats = np.arange(0.25, 10., 0.5)
+        self.lons = np.arange(0.25, 10., 0.5)
+        self.new_lats = np.arange(1., 10., 2.)
+        self.new_lons = np.arange(1., 10., 2.)
+        self.weights = RegridWeights.conservative(
+            self.lats, self.lons, self.new_lats, self.new_lons)
+        self.values = np.random.RandomState(0).rand(20, 20)
+
+    def test_area_integral_is_preserved(self):
+        areas = np.diff(np.sin(np.radians(np.arange(0., 10.1, 0.5))))
+        new_areas = 4. * np.diff(np.sin(np.radians(np.arange(0., 10.1, 2.))))
+        regridded = self.weights.apply(self.values)
+        self.assertAlmostEqual((regridded * new_areas[:, np.newaxis]).sum(),
+                               (self.values * areas[:, np.newaxis]).sum())
+
+    def test_constant_field(self):
+        regridded = self.weights.apply(np.ones((20, 20)))
+        np.testing.assert_array_almost_equal(regridded, np.ones((5, 5)))
+
+    def test_masked_values_are_ignored(self):
+        values = ma.array(np.ones((20, 20)))
+        values[:2, :2] = 100.
+        values[:2, :2] = ma.masked
+        values[4:8, 4:8] = ma.masked
+        regridded = self.weights.apply(values)
+        self.assertAlmostEqual(regridded[0, 0], 1.)
+        np.testing.assert_array_equal(np.argwhere(regridded.mask), [[1, 1]])
+
+    def test_partially_covered_cells(self):
+        new_lats = np.array([5., 11.])
+        new_lons = np.array([5., 6.])
+        weights = RegridWeights.conservative(self.lats, self.lons, new_lats,
+                                             new_lons)
+        np.testing.assert_array_equal(weights.outside_mask,
+                                      [[False, False], [True, True]])
+        weights = RegridWeights.conservative(self.lats, self.lons, new_lats,
+                                             new_lons, boundary_check=False)
+        self.assertFalse(weights.outside_mask.any())
+
+    def test_cyclic_longitudes(self):
+        lons = np.arange(-179.5, 180., 1.)
+        weights = RegridWeights.conservative(self.lats, lons, self.new_lats,
+                                             np.array([179., 180., 181.]))
+        self.assertFalse(weights.outside_mask.any())
+        values = np.tile(np.where(np.abs(lons) > 179., 1., 0.), (20, 1))
+        np.testing.assert_array_almost_equal(weights.apply(values)[:, 1],
+                                             np.ones(5))
+
+    def test_curvilinear_grid(self):
+        with self.assertRaises(ValueError):
+            RegridWeights.conservative(np.ones((2, 2)), np.ones((2, 2)),
+                                       self.new_lats, self.new_lons)
+
+
+class TestRegridWeightsCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        lat_indices, lon_indices = np.meshgrid(np.linspace(0, 1, 3),
+                                               np.linspace(0, 1, 3),
+                                               indexing='ij')
+        self.weights = RegridWeights.from_fractional_indices(
+            ma.array(lat_indices), ma.array(lon_indices), (2, 2))
+        self.builds = 0
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def build(self):
+        self.builds += 1
+        return self.weights
+
+    def test_weights_are_built_once(self):
+        cache = RegridWeightsCache()
+        cache.get_or_build('key', self.build)
+        cache.get_or_build('key', self.build)
+        self.assertEqual(self.builds, 1)
+
+    def test_least_recently_used_eviction(self):
+        cache = RegridWeightsCache(max_entries=2)
+        cache.put('a', self.weights)
+        cache.put('b', self.weights)
+        cache.get('a')
+        cache.put('c', self.weights)
+        self.assertEqual(len(cache), 2)
+        self.assertTrue('a' in cache)
+        self.assertFalse('b' in cache)
+
+    def test_on_disk_store(self):
+        RegridWeightsCache(cache_dir=self.cache_dir).put('key', self.weights)
+        self.assertTrue(os.path.exists(os.path.join(self.cache_dir,
+                                                    'key.npz')))
+
+        weights = RegridWeightsCache(cache_dir=self.cache_dir).get('key')
+        self.assertEqual(weights.key, 'key')
+        self.assertEqual(weights.source_shape, self.weights.source_shape)
+        self.assertEqual(weights.target_shape, self.weights.target_shape)
+        values = np.array([[1., 2.], [3., 4.]])
+        np.testing.assert_array_equal(weights.apply(values),
+                                      self.weights.apply(values))
+
+    def test_on_disk_store_keeps_normalization(self):
+        weights = RegridWeights.conservative(np.arange(4.), np.arange(4.),
+                                             np.array([1., 2.]),
+                                             np.array([1., 2.]))
+        RegridWeightsCache(cache_dir=self.cache_dir).put('key', weights)
+        weights = RegridWeightsCache(cache_dir=self.cache_dir).get('key')
+        self.assertTrue(weights.normalize)
+
+        self.assertEqual(os.listdir(self.cache_dir), ['key.npz'])
+
+    def test_partially_written_file(self):
+        RegridWeightsCache(cache_dir=self.cache_dir).put('key', self.weights)
+        path = os.path.join(self.cache_dir, 'key.npz')
+        with open(path, 'rb') as f:
+            contents = f.read()
+        with open(path, 'wb') as f:
+            f.write(contents[:len(contents) // 2])
+        self.assertIsNone(RegridWeightsCache(cache_dir=self.cache_dir).get(
+            'key'))
+
+
+class TestCurvilinearGridIndex(unittest.TestCase):
+
+    def setUp(self):
+        # Grid rotated by 30 degrees and crossing the dateline
+        rows, columns = np.mgrid[0:40, 0:50].astype(float)
+        angle = np.radians(30.)
+        self.lats = 10. + 0.5 * (columns * np.sin(angle) +
+                                 rows * np.cos(angle))
+        lons = 170. + 0.5 * (columns * np.cos(angle) - rows * np.sin(angle))
+        self.lons = np.where(lons > 180., lons - 360., lons)
+        self.grid_index = CurvilinearGridIndex(self.lats, self.lons)
+
+    def test_grid_points_are_found(self):
+        rows, columns = self.grid_index.fractional_indices(self.lats,
+                                                           self.lons)
+        expected_rows, expected_columns = np.mgrid[0:40, 0:50]
+        np.testing.assert_array_almost_equal(rows, expected_rows)
+        np.testing.assert_array_almost_equal(columns, expected_columns)
+
+    def test_cell_centers_are_interpolated(self):
+        lats = 0.25 * (self.lats[:-1, :-1] + self.lats[1:, :-1] +
+                       self.lats[:-1, 1:] + self.lats[1:, 1:])
+        lons = 0.25 * (self.lons[:-1, :-1] + self.lons[1:, :-1] +
+                       self.lons[:-1, 1:] + self.lons[1:, 1:])
+        # Cells across the dateline are averaged in the wrong branch
+        inside = np.abs(self.lons[:-1, :-1] - self.lons[1:, 1:]) < 180.
+        rows, columns = self.grid_index.fractional_indices(lats[inside],
+                                                           lons[inside])
+        expected_rows, expected_columns = np.mgrid[0:39, 0:49] + 0.5
+        np.testing.assert_array_almost_equal(rows, expected_rows[inside], 2)
+        np.testing.assert_array_almost_equal(columns,
+                                             expected_columns[inside], 2)
+
+    def test_outside_points_are_masked(self):
+        rows, columns = self.grid_index.fractional_indices(
+            np.array([-60., self.lats[20, 20]]),
+            np.array([0., self.lons[20, 20]]))
+        np.testing.assert_array_equal(rows.mask, [True, False])
+        np.testing.assert_array_equal(columns.mask, [True, False])
+
+    def test_outside_points_without_boundary_check(self):
+        rows, columns = self.grid_index.fractional_indices(
+            np.array([-60.]), np.array([0.]), boundary_check=False)
+        self.assertFalse(ma.getmaskarray(rows).any())
+        self.assertTrue(0. <= rows[0] <= 39.)
+        self.assertTrue(0. <= columns[0] <= 49.)
+
+    def test_inverse_distance_weights(self):
+        weights = self.grid_index.inverse_distance_weights(
+            np.array([self.lats[5, 5], self.lats[5, 5] + 0.1]),
+            np.array([self.lons[5, 5], self.lons[5, 5] + 0.1]))
+        np.testing.assert_array_almost_equal(
+            np.asarray(weights.matrix.sum(axis=1)).ravel(), [1., 1.])
+        regridded = weights.apply(self.lats)
+        self.assertAlmostEqual(regridded[0], self.lats[5, 5])
+        self.assertTrue(abs(regridded[1] - self.lats[5, 5] - 0.1) < 0.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -63,6 +63,46 @@ class TestDecodeTimes(unittest.TestCase):
         self.assertEqual(new_times[0], start_time)
         self.assertEqual(new_times[-1], end_time)
 
+    def create_time_variable(self, units, values, calendar=None):
+        netcdf = netCDF4.Dataset('time_%d.nc' % id(self), 'w',
+                                 diskless=True)
+        self.addCleanup(netcdf.close)
+        netcdf.createDimension('time', len(values))
+        time = netcdf.createVariable('time', 'd', ('time',))
+        time[:] = values
+        time.units = units
+        if calendar:
+            time.calendar = calendar
+        return netcdf
+
+    def test_months_past_end_of_month(self):
+        netcdf = self.create_time_variable('months since 2000-01-31 06:00',
+                                           np.arange(-2, 14))
+        times = utils.decode_time_values(netcdf, 'time')
+        base = datetime.datetime(2000, 1, 31, 6)
+        self.assertEqual(list(times),
+                         [base + relativedelta(months=x)
+                          for x in range(-2, 14)])
+
+    def test_non_standard_calendar_offsets(self):
+        netcdf = self.create_time_variable('hours since 2001-02-28',
+                                           np.arange(0., 48., 6.), 'noleap')
+        offsets, calendar = utils.decode_time_offsets(netcdf, 'time')
+        self.assertEqual(calendar, 'noleap')
+        times = utils.offsets_to_times(offsets, calendar)
+        self.assertEqual((times[4].month, times[4].day), (3, 1))
+        np.testing.assert_array_equal(
+            offsets, utils.times_to_offsets(netCDF4.num2date(
+                np.arange(0., 48., 6.), 'hours since 2001-02-28',
+                calendar='noleap')))
+
+    def test_360_day_calendar(self):
+        netcdf = self.create_time_variable('days since 2000-01-01',
+                                           np.arange(58., 61.), '360_day')
+        times = utils.decode_time_values(netcdf, 'time')
+        self.assertEqual([(x.month, x.day) for x in times],
+                         [(2, 29), (2, 30), (3, 1)])
+
 
 class TestTimeUnitsParse(unittest.TestCase):
 
@@ -111,6 +151,42 @@ class TestBaseTimeStringParse(unittest.TestCase):
         )
 
 
+class TestCalendarTimes(unittest.TestCase):
+
+    def test_standard_calendar(self):
+        times = np.array([datetime.datetime(1999, 12, 31, 6),
+                          datetime.datetime(2000, 2, 29)])
+        self.assertEqual(utils.get_calendar(times), 'standard')
+        offsets = utils.times_to_offsets(times)
+        np.testing.assert_array_equal(
+            offsets, times.astype('datetime64[s]').astype(np.int64))
+        years, months, days = utils.time_fields(offsets)
+        np.testing.assert_array_equal(years, [1999, 2000])
+        np.testing.assert_array_equal(months, [12, 2])
+        np.testing.assert_array_equal(days, [31, 29])
+        np.testing.assert_array_equal(utils.offsets_to_times(offsets), times)
+
+    def test_non_standard_calendars(self):
+        for calendar in ['360_day', 'noleap', '365_day', 'all_leap',
+                         'julian']:
+            times = netCDF4.num2date(np.arange(0., 800., 7.5),
+                                     'days since 1999-12-01',
+                                     calendar=calendar)
+            offsets = utils.times_to_offsets(times)
+            years, months, days = utils.time_fields(
+                offsets, utils.get_calendar(times))
+            np.testing.assert_array_equal(years, [t.year for t in times])
+            np.testing.assert_array_equal(months, [t.month for t in times])
+            np.testing.assert_array_equal(days, [t.day for t in times])
+
+    def test_fields_to_times(self):
+        times = utils.fields_to_times([2000], [2], [30], '360_day')
+        self.assertEqual((times[0].year, times[0].month, times[0].day),
+                         (2000, 2, 30))
+        times = utils.fields_to_times([2000], [2], [29])
+        self.assertEqual(times[0], datetime.datetime(2000, 2, 29))
+
+
 class TestNormalizeLatLonValues(unittest.TestCase):
 
     def setUp(self):
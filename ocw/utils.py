@@ -26,7 +26,7 @@ import numpy.ma as ma
 from mpl_toolkits.basemap import shiftgrid, Basemap
 from matplotlib.path import Path
 from dateutil.relativedelta import relativedelta
-from netCDF4 import num2date
+from netCDF4 import num2date, date2num
 import scipy.interpolate as interpolate
 from scipy.ndimage import map_coordinates
 
@@ -39,40 +39,124 @@ def decode_time_values(dataset, time_var_name):
     :param time_var_name: The name of the time variable in dataset.
     :type time_var_name: :mod:`string`
 
-    :returns: The list of converted datetime values.
+    :returns: The converted time values. Times of non-standard calendars
+        such as 360_day and noleap are cftime datetime objects, which can
+        represent every date of their calendar.
+    :rtype: :class:`numpy.ndarray`
 
     :raises ValueError: If the time units value couldn't be parsed, if the
         base time value couldn't be parsed, or if the time_var_name could not
         be found in the dataset.
     '''
-    time_data = dataset.variables[time_var_name]
+    offsets, calendar = decode_time_offsets(dataset, time_var_name)
+    return offsets_to_times(offsets, calendar)
+
+
+def decode_time_offsets(dataset, time_var_name):
+    ''' Decode NetCDF time values into integer time offsets.
+
+    The offsets are computed with integer arithmetic on the whole time
+    variable, in the representation of :func:`times_to_offsets`.
+
+    :param dataset: The dataset from which time values should be extracted.
+    :type dataset: netCDF4.Dataset
+    :param time_var_name: The name of the time variable in dataset.
+    :type time_var_name: :mod:`string`
+
+    :returns: The offsets and calendar of the times as a tuple in the form
+        (offsets, calendar).
+    :rtype: :func:`tuple` of (:class:`numpy.ndarray`, :mod:`string`)
+
+    :raises ValueError: If the time units value couldn't be parsed, if the
+        base time value couldn't be parsed, or if the time_var_name could not
+        be found in the dataset.
+    '''
+    return decode_time_variable_offsets(dataset.variables[time_var_name])
+
+
+def decode_time_variable_offsets(time_data):
+    ''' Decode the values of a time variable into integer time offsets.
+
+    This is :func:`decode_time_offsets` for a variable on its own, such as
+    the time variable of an OPeNDAP dataset.
+
+    :param time_data: The time variable, with a units attribute and an
+        optional calendar attribute.
+    :type time_data: netCDF4.Variable
+
+    :returns: The offsets and calendar of the times as a tuple in the form
+        (offsets, calendar).
+    :rtype: :func:`tuple` of (:class:`numpy.ndarray`, :mod:`string`)
+
+    :raises ValueError: If the time units value couldn't be parsed or if the
+        base time value couldn't be parsed.
+    '''
     time_format = time_data.units
     if time_format[-1].lower() == 'z':
         time_format = time_format[:-1]
     if time_format[-3:].lower() == 'utc':
         time_format = time_format[:-3]
 
-    time_units = parse_time_units(time_format)
-    time_base = parse_time_base(time_format)
+    time_units, time_base = _parse_time_units_and_base(time_format)
+    calendar = getattr(time_data, 'calendar', 'standard').lower()
+    calendar = _CALENDAR_ALIASES.get(calendar, calendar)
+    time_values = np.asarray(ma.getdata(time_data[:]))
+    base_seconds = (time_base.hour * 3600 + time_base.minute * 60 +
+                    time_base.second)
 
-    times = []
     if time_units == 'months':
-        # datetime.timedelta doesn't support a 'months' option. To remedy
-        # this, a month == 30 days for our purposes.
-        for time_val in time_data:
-            times.append(time_base + relativedelta(months=int(time_val)))
-    else:
-        try:
-            times_calendar = time_data.calendar
-        except:
-            times_calendar = 'standard'
+        # Whole months are added to the base date as relativedelta does,
+        # moving days past the end of a month to its last day.
+        months = (time_base.year * 12 + time_base.month - 1 +
+                  np.trunc(time_values).astype(np.int64))
+        years, months = months // 12, months % 12 + 1
+        if calendar in STANDARD_CALENDARS:
+            month_starts = ((years - 1970) * 12 + months - 1).astype(
+                'datetime64[M]')
+            month_lengths = ((month_starts + 1).astype('datetime64[D]') -
+                             month_starts.astype('datetime64[D]')).astype(
+                np.int64)
+        elif calendar in _YEAR_DAYS:
+            month_lengths = np.diff(np.append(_MONTH_START_DAYS[calendar],
+                                              _YEAR_DAYS[calendar]))[months - 1]
+        else:
+            times = [time_base + relativedelta(months=int(time_val))
+                     for time_val in time_values]
+            return times_to_offsets(times, 'standard'), 'standard'
+        days = np.minimum(time_base.day, month_lengths)
+        dates = fields_to_times(years, months, days, calendar)
+        return times_to_offsets(dates, calendar) + base_seconds, calendar
+
+    if time_units == 'years' or not (calendar in STANDARD_CALENDARS or
+                                     calendar in _YEAR_DAYS):
+        times = num2date(time_values, units=time_format, calendar=calendar)
+        return times_to_offsets(times, calendar), calendar
 
-        times = num2date(
-            time_data[:], units=time_format, calendar=times_calendar)
-        if times_calendar == '360_day':
-            for it, t in enumerate(times):
-                times[it] = dt.datetime.strptime(str(t), '%Y-%m-%d 00:00:00')
-    return times
+    base_date = fields_to_times([time_base.year], [time_base.month],
+                                [time_base.day], calendar)
+    base_offset = times_to_offsets(base_date, calendar)[0] + base_seconds
+    offsets = np.round(np.asarray(time_values, dtype=np.float64) *
+                       _TIME_UNIT_SECONDS[time_units]).astype(np.int64)
+    return base_offset + offsets, calendar
+
+
+_TIME_UNIT_SECONDS = {'seconds': 1, 'minutes': 60, 'hours': 3600,
+                      'days': 86400}
+
+
+_PARSED_TIME_FORMATS = {}
+
+
+def _parse_time_units_and_base(time_format):
+    ''' Parse and remember the units and base time of a time units string.
+
+    Collections of files usually share a handful of time units strings, so
+    the formats of :func:`parse_time_base` are only tried once per string.
+    '''
+    if time_format not in _PARSED_TIME_FORMATS:
+        _PARSED_TIME_FORMATS[time_format] = (parse_time_units(time_format),
+                                             parse_time_base(time_format))
+    return _PARSED_TIME_FORMATS[time_format]
 
 
 def parse_time_units(time_format):
@@ -184,6 +268,165 @@ def parse_base_time_string(time_format):
     return time_format.split('since')[1].strip()
 
 
+# Calendars that follow the Gregorian calendar for all modern dates
+STANDARD_CALENDARS = ('standard', 'gregorian', 'proleptic_gregorian')
+
+# Day of the year (from 0) of the first day of each month
+_MONTH_START_DAYS = {
+    'noleap': np.array([0, 31, 59, 90, 120, 151, 181, 212, 243, 273, 304,
+                        334]),
+    'all_leap': np.array([0, 31, 60, 91, 121, 152, 182, 213, 244, 274, 305,
+                          335]),
+    '360_day': np.arange(0, 360, 30)}
+_YEAR_DAYS = {'noleap': 365, 'all_leap': 366, '360_day': 360}
+_CALENDAR_ALIASES = {'365_day': 'noleap', '366_day': 'all_leap'}
+
+# Reference of the time offsets of non-standard calendars
+_CALENDAR_EPOCH = 'seconds since 0001-01-01 00:00:00'
+
+
+def get_calendar(times):
+    ''' Find the calendar of time values.
+
+    :param times: Python datetime or cftime datetime objects.
+    :type times: :class:`numpy.ndarray`
+
+    :returns: The CF calendar name of the times. Python datetime objects are
+        in the 'standard' calendar.
+    '''
+    if len(times) == 0:
+        return 'standard'
+    calendar = getattr(times[0], 'calendar', '') or 'standard'
+    calendar = calendar.lower()
+    return _CALENDAR_ALIASES.get(calendar, calendar)
+
+
+def times_to_offsets(times, calendar=None):
+    ''' Convert time values to integer offsets in seconds.
+
+    Offsets of the standard calendars are seconds since 1970-01-01, the same
+    as ``numpy.datetime64[s]``. Offsets of the other calendars are seconds
+    since 0001-01-01 in that calendar.
+
+    :param times: Python datetime or cftime datetime objects.
+    :type times: :class:`numpy.ndarray`
+
+    :param calendar: (Optional) The calendar of times. By default it is found
+        with :func:`get_calendar`.
+    :type calendar: :mod:`string`
+
+    :returns: Array of :class:`numpy.int64` offsets.
+    '''
+    times = np.asarray(times)
+    if calendar is None:
+        calendar = get_calendar(times)
+    if times.size == 0:
+        return np.zeros(times.shape, dtype=np.int64)
+
+    if calendar in STANDARD_CALENDARS:
+        try:
+            return times.astype('datetime64[s]').astype(np.int64)
+        except (TypeError, ValueError):
+            units = 'seconds since 1970-01-01 00:00:00'
+    else:
+        units = _CALENDAR_EPOCH
+    offsets = date2num(times, units, calendar=calendar)
+    return np.round(np.asarray(offsets, dtype=float)).astype(np.int64)
+
+
+def offsets_to_times(offsets, calendar='standard'):
+    ''' Convert integer offsets from :func:`times_to_offsets` to times.
+
+    :param offsets: Offsets in seconds.
+    :type offsets: :class:`numpy.ndarray`
+
+    :param calendar: The calendar of the offsets.
+    :type calendar: :mod:`string`
+
+    :returns: Object array of Python datetime objects for the standard
+        calendars and of cftime datetime objects for the others.
+    '''
+    offsets = np.asarray(offsets, dtype=np.int64)
+    if calendar in STANDARD_CALENDARS:
+        return offsets.astype('datetime64[s]').astype(object)
+    return np.asarray(num2date(offsets, _CALENDAR_EPOCH, calendar=calendar),
+                      dtype=object)
+
+
+def time_fields(offsets, calendar='standard'):
+    ''' Split time offsets into years, months and days.
+
+    :param offsets: Offsets in seconds from :func:`times_to_offsets`.
+    :type offsets: :class:`numpy.ndarray`
+
+    :param calendar: The calendar of the offsets.
+    :type calendar: :mod:`string`
+
+    :returns: Integer arrays of years, months (from 1) and days (from 1)
+    '''
+    offsets = np.asarray(offsets, dtype=np.int64)
+    if calendar in STANDARD_CALENDARS:
+        days = offsets.astype('datetime64[s]').astype('datetime64[D]')
+        months = days.astype('datetime64[M]')
+        years = months.astype('datetime64[Y]')
+        return (years.astype(np.int64) + 1970,
+                (months - years).astype(np.int64) + 1,
+                (days - months).astype(np.int64) + 1)
+
+    if calendar in _YEAR_DAYS:
+        day_number = offsets // 86400
+        month_start = _MONTH_START_DAYS[calendar]
+        years = day_number // _YEAR_DAYS[calendar] + 1
+        day_of_year = day_number % _YEAR_DAYS[calendar]
+        months = np.searchsorted(month_start, day_of_year, side='right')
+        return years, months, day_of_year - month_start[months - 1] + 1
+
+    # Calendars without fixed month lengths, such as julian
+    times = offsets_to_times(offsets, calendar)
+    return (np.array([t.year for t in times], dtype=np.int64),
+            np.array([t.month for t in times], dtype=np.int64),
+            np.array([t.day for t in times], dtype=np.int64))
+
+
+def fields_to_times(years, months, days, calendar='standard'):
+    ''' Build times at midnight from arrays of years, months and days.
+
+    :param years: Years of the times.
+    :type years: :class:`numpy.ndarray`
+
+    :param months: Months (from 1) of the times.
+    :type months: :class:`numpy.ndarray`
+
+    :param days: Days (from 1) of the times.
+    :type days: :class:`numpy.ndarray`
+
+    :param calendar: The calendar of the times.
+    :type calendar: :mod:`string`
+
+    :returns: Object array of times, as from :func:`offsets_to_times`.
+    '''
+    years = np.asarray(years, dtype=np.int64)
+    months = np.asarray(months, dtype=np.int64)
+    days = np.asarray(days, dtype=np.int64)
+    if calendar in STANDARD_CALENDARS:
+        dates = ((years - 1970).astype('datetime64[Y]').astype(
+            'datetime64[M]') + (months - 1).astype('timedelta64[M]'))
+        dates = dates.astype('datetime64[D]') + (days - 1).astype(
+            'timedelta64[D]')
+        return dates.astype('datetime64[s]').astype(object)
+
+    if calendar in _YEAR_DAYS:
+        day_number = ((years - 1) * _YEAR_DAYS[calendar] +
+                      _MONTH_START_DAYS[calendar][months - 1] + days - 1)
+        return offsets_to_times(day_number * 86400, calendar)
+
+    epoch = num2date(0, _CALENDAR_EPOCH, calendar=calendar)
+    return np.array([epoch.replace(year=int(year), month=int(month),
+                                   day=int(day))
+                     for year, month, day in zip(years, months, days)],
+                    dtype=object)
+
+
 def normalize_lat_lon_values(lats, lons, values):
     ''' Normalize lat/lon values
 